@@ -0,0 +1,99 @@
+import asyncio
+import random
+import time
+
+import httpx
+
+# Load drivers: fire `requests` calls at a fixed concurrency and summarize latency,
+# time to first byte/chunk and throughput.
+
+WORDS = (
+    "apple bridge candle desert engine forest garden harbor island jungle kettle ladder "
+    "meadow needle orchard pepper quarry river saddle tunnel valley window yellow zebra "
+    "train bucket marble tiger violin rocket pencil basket castle dragon feather glacier"
+).split()
+
+
+def unique_problem(rng):
+    """A problem text that shares little with any other, so it misses every KG lookup."""
+    words = " ".join(rng.choice(WORDS) for _ in range(8))
+    return f"A {words} costs {rng.randint(2, 999)} and weighs {rng.randint(2, 999)}; find {rng.randint(2, 99)}x."
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+def summarize(values):
+    values = sorted(values)
+    return {
+        "p50": percentile(values, 0.50),
+        "p95": percentile(values, 0.95),
+        "p99": percentile(values, 0.99),
+        "max": values[-1] if values else None,
+    }
+
+
+async def timed_request(client, method, url, json=None, stream=False):
+    """Returns (seconds to first chunk, total seconds, chunks, bytes) for one request."""
+    start = time.perf_counter()
+    first_chunk_at = None
+    chunks = size = 0
+    async with client.stream(method, url, json=json) as response:
+        response.raise_for_status()
+        iterator = response.aiter_text() if stream else response.aiter_bytes()
+        async for chunk in iterator:
+            if first_chunk_at is None:
+                first_chunk_at = time.perf_counter()
+            chunks += 1
+            size += len(chunk)
+    end = time.perf_counter()
+    return (first_chunk_at or end) - start, end - start, chunks, size
+
+
+async def run_load(make_request, concurrency, requests, stream=False, timeout=300.0):
+    """
+    make_request(i) returns (method, url, json_body) for the i-th call.
+    Returns a result dict with latency and TTFT percentiles in milliseconds.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(timeout=httpx.Timeout(timeout), limits=limits) as client:
+        async def bounded(i):
+            method, url, body = make_request(i)
+            async with semaphore:
+                return await timed_request(client, method, url, body, stream)
+
+        start = time.perf_counter()
+        results = await asyncio.gather(*(bounded(i) for i in range(requests)), return_exceptions=True)
+        wall = time.perf_counter() - start
+
+    ok = [result for result in results if not isinstance(result, Exception)]
+    errors = [result for result in results if isinstance(result, Exception)]
+    return {
+        "concurrency": concurrency,
+        "requests": requests,
+        "errors": len(errors),
+        "first_error": repr(errors[0]) if errors else None,
+        "wall_s": wall,
+        "throughput_rps": len(ok) / wall if wall > 0 else None,
+        "chunks_per_s": sum(result[2] for result in ok) / wall if wall > 0 else None,
+        "latency_ms": summarize([result[1] * 1000 for result in ok]),
+        "ttft_ms": summarize([result[0] * 1000 for result in ok]),
+    }
+
+
+def problem_requests(url, texts=None, seed=7):
+    """make_request for POST /solve: cycles through texts, or unique problems when texts is None."""
+    rng = random.Random(seed)
+    def make_request(i):
+        problem = texts[i % len(texts)] if texts else unique_problem(rng)
+        return "POST", url, {"problem": problem}
+    return make_request
+
+
+def get_requests(url):
+    return lambda i: ("GET", url, None)
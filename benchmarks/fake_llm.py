@@ -0,0 +1,153 @@
+import argparse
+import asyncio
+import json
+import os
+import re
+import time
+import uuid
+
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+
+# Local stand-in for the OpenAI-compatible inference endpoints (completions and chat).
+# Every response is a canned step-by-step solution, streamed at a fixed token rate after a
+# fixed time to first token, so service latency can be measured without a GPU or network.
+#
+#   python fake_llm.py --port 9000 --tokens-per-second 50 --ttft-ms 300
+#   HF_BASE_URL=http://127.0.0.1:9000/v1/ OPENAI_API_KEY=fake uvicorn solution_engine:app
+
+FAKE_LLM_TOKENS_PER_SECOND = float(os.getenv("FAKE_LLM_TOKENS_PER_SECOND", "50"))
+FAKE_LLM_TTFT_MS = float(os.getenv("FAKE_LLM_TTFT_MS", "300"))
+FAKE_LLM_STEPS = int(os.getenv("FAKE_LLM_STEPS", "4"))
+
+app = FastAPI(title="Fake LLM", version="0.1")
+
+
+def canned_solution(steps):
+    """A markdown solution in the shape the engine's StepParser expects."""
+    parts = []
+    for number in range(1, steps + 1):
+        parts.append(
+            f"### Step {number}: Simplify the expression\n"
+            f"We rewrite the equation by moving the constant term to the right-hand side, "
+            f"which keeps both sides balanced.\n"
+            f"\\[ 2x + {number} = 7 \\implies 2x = {7 - number} \\]\n"
+        )
+    parts.append(f"The final answer is \\( x = {(7 - steps) / 2} \\).\n")
+    return "".join(parts)
+
+
+def tokens(text):
+    """Splits text into word-sized tokens that concatenate back to the original text."""
+    return re.findall(r"\S+\s*|\s+", text)
+
+
+async def paced(pieces):
+    """Yields pieces on the configured schedule: TTFT first, then a steady token rate."""
+    start = time.perf_counter()
+    for i, piece in enumerate(pieces):
+        due = start + FAKE_LLM_TTFT_MS / 1000 + i / FAKE_LLM_TOKENS_PER_SECOND
+        delay = due - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        yield piece
+
+
+def sse(payload):
+    return f"data: {json.dumps(payload)}\n\n"
+
+
+def usage(prompt, pieces):
+    prompt_tokens = len(tokens(prompt))
+    return {"prompt_tokens": prompt_tokens, "completion_tokens": len(pieces),
+            "total_tokens": prompt_tokens + len(pieces)}
+
+
+@app.post("/v1/completions")
+async def completions(request: Request):
+    body = await request.json()
+    model = body.get("model", "fake")
+    prompt = body.get("prompt", "")
+    prompt = prompt[0] if isinstance(prompt, list) else prompt
+    pieces = tokens(canned_solution(FAKE_LLM_STEPS))
+    completion_id = f"cmpl-{uuid.uuid4().hex}"
+
+    if not body.get("stream"):
+        async for _ in paced(pieces):
+            pass
+        return {
+            "id": completion_id, "object": "text_completion", "created": int(time.time()), "model": model,
+            "choices": [{"text": "".join(pieces), "index": 0, "logprobs": None, "finish_reason": "stop"}],
+            "usage": usage(prompt, pieces),
+        }
+
+    async def stream():
+        async for piece in paced(pieces):
+            yield sse({
+                "id": completion_id, "object": "text_completion", "created": int(time.time()), "model": model,
+                "choices": [{"text": piece, "index": 0, "logprobs": None, "finish_reason": None}],
+            })
+        yield sse({
+            "id": completion_id, "object": "text_completion", "created": int(time.time()), "model": model,
+            "choices": [{"text": "", "index": 0, "logprobs": None, "finish_reason": "stop"}],
+        })
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(stream(), media_type="text/event-stream")
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    model = body.get("model", "fake")
+    prompt = " ".join(str(message.get("content", "")) for message in body.get("messages", []))
+    pieces = tokens(canned_solution(FAKE_LLM_STEPS))
+    completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+
+    if not body.get("stream"):
+        async for _ in paced(pieces):
+            pass
+        return {
+            "id": completion_id, "object": "chat.completion", "created": int(time.time()), "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": "".join(pieces)},
+                         "finish_reason": "stop"}],
+            "usage": usage(prompt, pieces),
+        }
+
+    def chunk(delta, finish_reason=None):
+        return sse({
+            "id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()), "model": model,
+            "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+        })
+
+    async def stream():
+        yield chunk({"role": "assistant", "content": ""})
+        async for piece in paced(pieces):
+            yield chunk({"content": piece})
+        yield chunk({}, "stop")
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(stream(), media_type="text/event-stream")
+
+
+@app.get("/v1/models")
+def models():
+    return {"object": "list", "data": [{"id": "fake", "object": "model", "owned_by": "benchmarks"}]}
+
+
+@app.get("/")
+def read_root():
+    return {"message": "Fake LLM is running."}
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Serve a fake OpenAI-compatible LLM with fixed pacing.")
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--tokens-per-second", type=float, default=FAKE_LLM_TOKENS_PER_SECOND)
+    parser.add_argument("--ttft-ms", type=float, default=FAKE_LLM_TTFT_MS)
+    parser.add_argument("--steps", type=int, default=FAKE_LLM_STEPS)
+    args = parser.parse_args()
+    FAKE_LLM_TOKENS_PER_SECOND, FAKE_LLM_TTFT_MS, FAKE_LLM_STEPS = args.tokens_per_second, args.ttft_ms, args.steps
+    uvicorn.run(app, host="127.0.0.1", port=args.port, log_level="warning")
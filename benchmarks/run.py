@@ -0,0 +1,315 @@
+import argparse
+import asyncio
+import datetime
+import glob
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+import yaml
+
+from drivers import get_requests, problem_requests, run_load
+
+# End-to-end benchmark: starts the fake LLM, the solution engine and the gateway (on the
+# in-memory KG backend) as local processes, drives them at each concurrency level, and
+# writes results/<commit>.json. Each run is compared with the latest run of another commit.
+#
+#   python run.py --concurrency 1,8,32 --tokens-per-second 50 --ttft-ms 300
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+SERVICES = os.path.join(ROOT, "services")
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+PROBLEMS_YAML = os.path.join(ROOT, "data", "knowledge_graph", "problems.yaml")
+
+SCENARIOS = ["engine_solve", "gateway_solve_miss", "gateway_solve_hit", "gateway_concepts", "gateway_problems"]
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def git(*args):
+    try:
+        return subprocess.run(["git", *args], cwd=ROOT, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+class Service:
+    """A local service process with its log file and memory readings."""
+
+    def __init__(self, name, args, cwd, port, env, log_dir, ready_path="/ready"):
+        self.name = name
+        self.args = args
+        self.cwd = cwd
+        self.port = port
+        self.env = dict(os.environ, **env)
+        self.log_path = os.path.join(log_dir, f"{name}.log")
+        self.ready_path = ready_path  # Answers 200 once the service can take requests
+        self.process = None
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.port}"
+
+    def start(self):
+        self.log = open(self.log_path, "w")
+        self.process = subprocess.Popen(
+            [sys.executable, *self.args], cwd=self.cwd, env=self.env, stdout=self.log, stderr=subprocess.STDOUT
+        )
+
+    def wait_ready(self, timeout=120):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                break
+            try:
+                if httpx.get(self.url + self.ready_path, timeout=2).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            time.sleep(0.5)
+        raise RuntimeError(f"{self.name} did not start; see {self.log_path}")
+
+    def memory_mb(self):
+        """Current and peak resident set size from /proc (Linux only)."""
+        values = {}
+        try:
+            with open(f"/proc/{self.process.pid}/status") as status:
+                for line in status:
+                    key, _, value = line.partition(":")
+                    if key in ("VmRSS", "VmHWM"):
+                        values["rss" if key == "VmRSS" else "peak_rss"] = int(value.split()[0]) / 1024
+        except OSError:
+            pass
+        return values
+
+    def stop(self):
+        if self.process and self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(10)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+        if self.process:
+            self.log.close()
+
+
+def uvicorn_args(module, port):
+    return ["-m", "uvicorn", f"{module}:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"]
+
+
+def run_loader(args, log_path):
+    """Runs load_data.py once, output to log_path; returns wall time, peak RSS and exit code."""
+    start = time.perf_counter()
+    # Output goes to a file, not a pipe: nothing reads a pipe while wait4 blocks, so a
+    # chatty loader would fill it and never exit.
+    with open(log_path, "w") as log:
+        process = subprocess.Popen(
+            [sys.executable, "load_data.py", *args], cwd=os.path.join(SERVICES, "knowledge_graph"),
+            stdout=log, stderr=subprocess.STDOUT,
+        )
+        _, status, usage = os.wait4(process.pid, 0)
+    process.returncode = os.waitstatus_to_exitcode(status)
+    return {
+        "wall_s": time.perf_counter() - start,
+        "peak_rss_mb": usage.ru_maxrss / 1024,
+        "exit_code": process.returncode,
+    }
+
+
+def bench_loader(snapshot_path, with_neo4j, log_dir):
+    def log(name):
+        return os.path.join(log_dir, f"loader_{name}.log")
+
+    results = {"compile_snapshot": run_loader(["--compile-snapshot", snapshot_path], log("compile_snapshot"))}
+    if with_neo4j:
+        results["bulk"] = run_loader(["--bulk"], log("bulk"))
+        results["sync_unchanged"] = run_loader(["--sync"], log("sync_unchanged"))
+    for name, result in results.items():
+        print(f"loader {name:<18} | {result['wall_s']:7.2f}s | peak RSS {result['peak_rss_mb']:7.1f}MB | exit {result['exit_code']}")
+    return results
+
+
+def print_level(name, result):
+    latency, ttft = result["latency_ms"], result["ttft_ms"]
+    if latency["p50"] is None:
+        print(f"{name:<20} c={result['concurrency']:<4} | all {result['errors']} requests failed: {result['first_error']}")
+        return
+    print(
+        f"{name:<20} c={result['concurrency']:<4} | {result['throughput_rps']:8.2f} req/s | "
+        f"latency p50 {latency['p50']:8.1f} p95 {latency['p95']:8.1f} p99 {latency['p99']:8.1f}ms | "
+        f"TTFT p50 {ttft['p50']:8.1f} p95 {ttft['p95']:8.1f}ms | errors {result['errors']}"
+    )
+
+
+async def bench_services(engine, gateway, scenarios, levels, requests_per_level):
+    with open(PROBLEMS_YAML) as file:
+        known_problems = [problem["text"] for problem in yaml.safe_load(file)["problems"]]
+    targets = {
+        "engine_solve": (problem_requests(engine.url + "/solve"), True),
+        "gateway_solve_miss": (problem_requests(gateway.url + "/solve", seed=11), True),
+        "gateway_solve_hit": (problem_requests(gateway.url + "/solve", known_problems), False),
+        "gateway_concepts": (get_requests(gateway.url + "/concepts?limit=100"), False),
+        "gateway_problems": (get_requests(gateway.url + "/problems?limit=100"), False),
+    }
+    results = {}
+    for name in scenarios:
+        make_request, stream = targets[name]
+        results[name] = []
+        for level in levels:
+            result = await run_load(make_request, level, requests_per_level or max(4 * level, 20), stream)
+            result["memory_mb"] = {service.name: service.memory_mb() for service in (engine, gateway)}
+            print_level(name, result)
+            results[name].append(result)
+    return results
+
+
+# --- Regression check ---
+
+def latest_baseline(commit):
+    """Most recent results file recorded for a different commit."""
+    candidates = []
+    for path in glob.glob(os.path.join(RESULTS_DIR, "*.json")):
+        with open(path) as file:
+            data = json.load(file)
+        if data.get("commit") != commit:
+            candidates.append((data.get("timestamp", ""), path, data))
+    return max(candidates)[1:] if candidates else (None, None)
+
+
+def compare(current, baseline, threshold):
+    """Prints metric changes beyond threshold (a fraction); returns the number of regressions."""
+    regressions = 0
+    def check(label, now, before, higher_is_better):
+        nonlocal regressions
+        if now is None or not before:
+            return
+        change = (now - before) / before
+        worse = change < -threshold if higher_is_better else change > threshold
+        better = change > threshold if higher_is_better else change < -threshold
+        if worse or better:
+            regressions += worse
+            print(f"  {'REGRESSION' if worse else 'improved  '} {label}: {before:.2f} -> {now:.2f} ({change:+.0%})")
+
+    for name, levels in current["scenarios"].items():
+        previous = {result["concurrency"]: result for result in baseline.get("scenarios", {}).get(name, [])}
+        for result in levels:
+            before = previous.get(result["concurrency"])
+            if not before:
+                continue
+            label = f"{name} c={result['concurrency']}"
+            check(f"{label} latency p95 ms", result["latency_ms"]["p95"], before["latency_ms"]["p95"], False)
+            check(f"{label} TTFT p95 ms", result["ttft_ms"]["p95"], before["ttft_ms"]["p95"], False)
+            check(f"{label} throughput req/s", result["throughput_rps"], before["throughput_rps"], True)
+    for name, result in current.get("loader", {}).items():
+        before = baseline.get("loader", {}).get(name)
+        if before:
+            check(f"loader {name} wall s", result["wall_s"], before["wall_s"], False)
+            check(f"loader {name} peak RSS MB", result["peak_rss_mb"], before["peak_rss_mb"], False)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the gateway, engine and loader against local stand-ins.")
+    parser.add_argument("--concurrency", default="1,8,32", help="Comma-separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=0, help="Requests per level (default: max(4 x concurrency, 20))")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="Comma-separated subset of " + ", ".join(SCENARIOS))
+    parser.add_argument("--tokens-per-second", type=float, default=50, help="Fake LLM token rate per stream")
+    parser.add_argument("--ttft-ms", type=float, default=300, help="Fake LLM time to first token")
+    parser.add_argument("--steps", type=int, default=4, help="Steps in the fake LLM's canned solution")
+    parser.add_argument("--neo4j", action="store_true", help="Also time bulk and sync loads against the live Neo4j")
+    parser.add_argument("--baseline", help="Results file to compare with (default: latest run of another commit)")
+    parser.add_argument("--threshold", type=float, default=0.15, help="Relative change reported as a regression")
+    parser.add_argument("--fail-on-regression", action="store_true")
+    args = parser.parse_args()
+
+    levels = [int(level) for level in args.concurrency.split(",")]
+    scenarios = [name for name in args.scenarios.split(",") if name]
+    workdir = tempfile.mkdtemp(prefix="math-tutor-bench-")
+    snapshot_path = os.path.join(workdir, "graph.snapshot")
+
+    loader = bench_loader(snapshot_path, args.neo4j, workdir)
+    if loader["compile_snapshot"]["exit_code"] != 0:
+        sys.exit(f"❌ Could not compile the KG snapshot for the gateway; see {workdir}/loader_compile_snapshot.log")
+
+    llm_port, engine_port, gateway_port = free_port(), free_port(), free_port()
+    llm = Service(
+        "fake_llm",
+        ["fake_llm.py", "--port", str(llm_port), "--tokens-per-second", str(args.tokens_per_second),
+         "--ttft-ms", str(args.ttft_ms), "--steps", str(args.steps)],
+        os.path.dirname(os.path.abspath(__file__)), llm_port, {}, workdir, ready_path="/",
+    )
+    engine = Service(
+        "solution_engine", uvicorn_args("solution_engine", engine_port),
+        os.path.join(SERVICES, "solution_engine"), engine_port,
+        # No completion cache: fixed-seed problems would be replayed from earlier runs.
+        {"HF_BASE_URL": f"{llm.url}/v1/", "OPENAI_API_KEY": "fake", "LLM_CACHE_PATH": ""}, workdir,
+    )
+    gateway = Service(
+        "api_gateway", uvicorn_args("app", gateway_port),
+        os.path.join(SERVICES, "api_gateway"), gateway_port,
+        {"KG_BACKEND": "memory", "KG_SNAPSHOT_PATH": snapshot_path,
+         "SOLUTION_ENGINE_URL": f"http://127.0.0.1:{engine_port}/solve", "GRAPH_VERSION_POLL_SECONDS": "1"},
+        workdir,
+    )
+    services = [llm, engine, gateway]
+    try:
+        for service in services:
+            service.start()
+            service.wait_ready()
+        results = asyncio.run(bench_services(engine, gateway, scenarios, levels, args.requests))
+        memory = {service.name: service.memory_mb() for service in services}
+    finally:
+        for service in reversed(services):
+            service.stop()
+    print(f"Service logs: {workdir}")
+
+    commit = git("rev-parse", "--short", "HEAD") or "unknown"
+    current = {
+        "commit": commit,
+        "dirty": bool(git("status", "--porcelain", "--untracked-files=no")),
+        "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+        "config": {
+            "concurrency": levels, "requests": args.requests, "tokens_per_second": args.tokens_per_second,
+            "ttft_ms": args.ttft_ms, "steps": args.steps, "python": sys.version.split()[0],
+        },
+        "loader": loader,
+        "scenarios": results,
+        "memory_mb": memory,
+    }
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline_path, baseline = args.baseline, json.load(file)
+    else:
+        baseline_path, baseline = latest_baseline(commit)
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    results_path = os.path.join(RESULTS_DIR, f"{commit}.json")
+    with open(results_path, "w") as file:
+        json.dump(current, file, indent=2)
+    print(f"Results written to {results_path}")
+
+    if baseline is None:
+        print("No baseline from another commit yet; nothing to compare.")
+        return
+    if baseline.get("config") != current["config"]:
+        print("Warning: Baseline was recorded with a different configuration.")
+    print(f"Compared with {baseline.get('commit')} ({baseline_path}):")
+    regressions = compare(current, baseline, args.threshold)
+    if not regressions:
+        print("  No regressions beyond the threshold.")
+    if regressions and args.fail_on_regression:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,65 +1,401 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-import requests
+from typing import List, Optional
+from contextlib import asynccontextmanager
+import asyncio
+import datetime
+import httpx
 import os
-from kg import get_solution_from_kg, get_all_concepts, get_all_problems, close_driver
-# Optionally, import store_solution_in_kg if you plan to use it later.
+import threading
+# KG_BACKEND=memory serves reads from a compiled in-process snapshot instead of Neo4j.
+if os.getenv("KG_BACKEND", "neo4j") == "memory":
+    from memory_kg import (
+        get_solution_from_kg, get_solution_by_problem_id, get_solved_problems,
+        get_all_problems, get_concepts_page, get_problems_page, get_graph_version, get_concept_dependencies,
+        store_solutions_in_kg, close_driver, warm_up as warm_up_kg,
+    )
+else:
+    from kg import (
+        get_solution_from_kg, get_solution_by_problem_id, get_solved_problems,
+        get_all_problems, get_concepts_page, get_problems_page, get_graph_version, get_concept_dependencies,
+        store_solutions_in_kg, close_driver, warm_up as warm_up_kg,
+    )
+from concept_graph import PrerequisiteClosure
+from fingerprint import problem_fingerprint
+from steps import StepParser
+from annotator import ConceptAnnotator, DEFAULT_CONCEPTS_DIR
+from solution_filter import SolvedProblemFilter
+from similarity import ProblemSimilarityIndex
+from solution_writer import SolutionWriter
+from prometheus_client import Counter
+from telemetry import (
+    REQUEST_ID_HEADER, UPSTREAM_ERRORS, TelemetryMiddleware, current_request_id,
+    instrument_stream, metrics_response, span,
+)
 
-app = FastAPI(title="Math Tutor API", version="0.1")
+@asynccontextmanager
+async def lifespan(app):
+    """Warms up and starts the background tasks before serving; flushes and closes on shutdown."""
+    await startup()
+    yield
+    await shutdown()
+
+app = FastAPI(title="Math Tutor API", version="0.1", lifespan=lifespan)
+app.add_middleware(TelemetryMiddleware)
+
+# Outcome of the stored-solution lookup for each /solve: filtered (skipped by the
+# negative-lookup filter), unfiltered (looked up before the filter was built), hit, similar (sent to the engine, with a near-duplicate's stored
+# solution appended as a worked example) or miss (sent to the engine).
+KG_LOOKUPS = Counter("kg_lookups_total", "Stored-solution lookups by outcome", ["result"])
 
 # Dummy URL for the solution engine service (update as needed)
 SOLUTION_ENGINE_URL = os.getenv("SOLUTION_ENGINE_URL", "http://solution_engine:8000/solve")
 
+# Timeouts (seconds) and pool size for the shared solution engine client.
+# The read timeout bounds the gap between two streamed chunks, not the whole generation.
+ENGINE_CONNECT_TIMEOUT = float(os.getenv("ENGINE_CONNECT_TIMEOUT", "5"))
+ENGINE_READ_TIMEOUT = float(os.getenv("ENGINE_READ_TIMEOUT", "60"))
+ENGINE_MAX_CONNECTIONS = int(os.getenv("ENGINE_MAX_CONNECTIONS", "500"))
+
+# Shared, pooled async HTTP client; created on startup and closed on shutdown.
+# Startup opens ENGINE_WARMUP_CONNECTIONS keep-alive connections so early requests skip the handshake.
+engine_client = None
+ENGINE_WARMUP_CONNECTIONS = int(os.getenv("ENGINE_WARMUP_CONNECTIONS", "4"))
+
+# Whether the KG answered the warm-up and the latest graph-version poll; reported by /ready.
+kg_ready = False
+
+# Negative-lookup filter and similarity index over solved problems,
+# rebuilt periodically to pick up loader changes.
+SOLUTION_FILTER_REFRESH_SECONDS = float(os.getenv("SOLUTION_FILTER_REFRESH_SECONDS", "300"))
+solution_filter = SolvedProblemFilter()
+solution_filter_task = None
+
+# Minimum estimated similarity for returning a stored solution as a similar worked example.
+SIMILAR_PROBLEM_THRESHOLD = float(os.getenv("SIMILAR_PROBLEM_THRESHOLD", "0.6"))
+similarity_index = ProblemSimilarityIndex()
+# Serializes write-back registrations with the swap of a rebuilt filter and index. While a
+# rebuild is running, registrations are also kept in pending_registrations and re-applied
+# to the rebuilt structures, since its KG fetch may have been taken before they were stored.
+index_lock = threading.Lock()
+pending_registrations = None
+
+# Background write-back of engine-generated solutions (bounded queue, batched transactions).
+SOLUTION_WRITER_QUEUE_SIZE = int(os.getenv("SOLUTION_WRITER_QUEUE_SIZE", "1000"))
+SOLUTION_WRITER_BATCH_SIZE = int(os.getenv("SOLUTION_WRITER_BATCH_SIZE", "50"))
+solution_writer = None
+
+# Graph version token, polled from the KG; /concepts and /problems use it as their ETag
+# so unchanged data is revalidated with 304 Not Modified without a Neo4j query.
+GRAPH_VERSION_POLL_SECONDS = float(os.getenv("GRAPH_VERSION_POLL_SECONDS", "5"))
+MAX_PAGE_SIZE = int(os.getenv("MAX_PAGE_SIZE", "1000"))
+graph_version = None
+graph_version_task = None
+
+# Transitive REQUIRES closure and the exercise recommender built on it,
+# rebuilt whenever the graph version changes.
+prerequisite_closure = None
+recommender = None
+MAX_RECOMMENDATIONS = int(os.getenv("MAX_RECOMMENDATIONS", "100"))
+
+# Local concept tagger for the steps of written-back solutions; built on startup.
+annotator = None
+
 # Pydantic model for problem submission
 class ProblemRequest(BaseModel):
     problem: str
 
+class StudentProfile(BaseModel):
+    id: str
+    weak_concepts: List[str]
+    solved_problems: List[str] = []
+
+class RecommendationRequest(BaseModel):
+    students: List[StudentProfile]
+    k: int = 10
+
 @app.post("/solve")
-def solve_problem(req: ProblemRequest):
+async def solve_problem(req: ProblemRequest):
     """
     Endpoint to solve a math problem.
     First, it queries the KG for a precomputed solution.
-    If no solution is found, it calls the solution engine to generate one.
+    If no solution is found, it streams the solution engine's output straight to the client.
     """
     # Attempt to retrieve a solution from the KG using the problem text.
-    solution = get_solution_from_kg(req.problem)
-    if solution:
-        return {"solution": solution}
-    
+    # Problems the filter has never seen solved skip the Neo4j round trip.
+    # The Neo4j driver is blocking, so the lookup runs in the threadpool.
+    # Before the filter is built every problem is let through; those misses are not the
+    # filter's false positives.
+    filter_ready = solution_filter.ready
+    if solution_filter.might_have_solution(req.problem):
+        if not filter_ready:
+            KG_LOOKUPS.labels("unfiltered").inc()
+        with span("kg_lookup"):
+            solution = await run_in_threadpool(get_solution_from_kg, req.problem)
+        if solution:
+            KG_LOOKUPS.labels("hit").inc()
+            return {"solution": solution}
+        if filter_ready:
+            solution_filter.record_false_positive()
+    else:
+        KG_LOOKUPS.labels("filtered").inc()
+
+    # A near-duplicate (same textbook problem, other numbers or wording) is not an answer to
+    # this problem: it is looked up alongside the engine call and appended as a worked example.
+    with span("similarity_query"):
+        similar = await run_in_threadpool(similarity_index.query, req.problem, SIMILAR_PROBLEM_THRESHOLD)
+    similar_lookup = None
+    if similar:
+        similar_lookup = asyncio.create_task(run_in_threadpool(get_solution_by_problem_id, similar[0]))
+
     # If no solution is found in the KG, call the solution engine.
+    # The request id travels along so both services' spans can be correlated.
+    KG_LOOKUPS.labels("similar" if similar else "miss").inc()
+    request = engine_client.build_request(
+        "POST", SOLUTION_ENGINE_URL, json={"problem": req.problem},
+        headers={REQUEST_ID_HEADER: current_request_id()},
+    )
     try:
-        engine_response = requests.post(SOLUTION_ENGINE_URL, json={"problem": req.problem})
-        if engine_response.status_code != 200:
-            raise HTTPException(status_code=engine_response.status_code, detail="Solution engine error")
-        solution_data = engine_response.json()
-        # Optionally, store the new solution in the KG.
-        # store_solution_in_kg(problem_data, solution_data)
-        return {"solution": solution_data}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        # The engine sends headers with its first chunk, so this includes the LLM's TTFT.
+        with span("engine_response_headers"):
+            engine_response = await engine_client.send(request, stream=True)
+    except httpx.HTTPError as e:
+        UPSTREAM_ERRORS.labels("solution_engine", "unreachable").inc()
+        if similar_lookup:
+            similar_lookup.cancel()
+        raise HTTPException(status_code=502, detail=f"Solution engine unreachable: {e}")
+    if engine_response.status_code != 200:
+        UPSTREAM_ERRORS.labels("solution_engine", f"status_{engine_response.status_code}").inc()
+        await engine_response.aclose()
+        if similar_lookup:
+            similar_lookup.cancel()
+        raise HTTPException(status_code=engine_response.status_code, detail="Solution engine error")
+
+    async def relay_stream():
+        # Forward each chunk as soon as it arrives; closing returns the connection to the pool.
+        # Steps are split while streaming, so the write-back item is ready when the stream ends.
+        chunks = []
+        parser = StepParser()
+        streamed = False
+        try:
+            async for chunk in instrument_stream(engine_response.aiter_text(), "engine"):
+                chunks.append(chunk)
+                parser.feed(chunk)
+                yield chunk
+            streamed = True
+        except httpx.HTTPError:
+            UPSTREAM_ERRORS.labels("solution_engine", "stream").inc()
+            raise
+        finally:
+            await engine_response.aclose()
+            if similar_lookup and not streamed:
+                similar_lookup.cancel()
+        # Only reached when the whole solution was streamed; queue it for the KG.
+        # The worked example below is not part of the solution and is not stored.
+        parser.close()
+        solution_writer.submit(generated_solution_item(req.problem, "".join(chunks), parser.steps))
+        if similar_lookup:
+            try:
+                example = await similar_lookup
+            except Exception as e:
+                print(f"Warning: Could not fetch the similar problem's solution: {e}")
+                example = None
+            # Without steps there is nothing to show; the headers still name the problem.
+            if example and example.get("steps"):
+                yield worked_example_text(similar, example)
+
+    headers = {}
+    if similar:
+        headers["X-Similar-Problem-Id"] = str(similar[0])
+        headers["X-Similar-Problem-Similarity"] = f"{similar[1]:.3f}"
+    return StreamingResponse(relay_stream(), media_type="text/plain", headers=headers)
+
+def worked_example_text(similar, solution):
+    """Labelled trailer with the stored steps of a similar (not the same) problem."""
+    problem_id, score = similar
+    lines = [
+        "",
+        "",
+        "---",
+        f"Worked example: the solution of a similar problem ({problem_id}, similarity {score:.2f}).",
+        "It is a different problem: compare the method, not the answer.",
+    ]
+    for step in solution.get("steps") or []:
+        lines += ["", f"Step {step['step_number']}: {step['step_explanation']}"]
+        if step.get("math_transformation"):
+            lines.append(step["math_transformation"].strip())
+    return "\n".join(lines) + "\n"
+
+def generated_solution_item(problem_text: str, solution_text: str, steps: list):
+    """Builds the solution_store item for a solution produced by the engine."""
+    fingerprint = problem_fingerprint(problem_text)
+    problem_id = f"G_{fingerprint[:16]}"
+    for step in steps:
+        annotator.annotate_step(step)
+    date = datetime.date.today().isoformat()
+    return {
+        "problem": {"id": problem_id, "text": problem_text, "difficulty": None, "fingerprint": fingerprint},
+        "solution": {
+            "id": f"{problem_id}_solution_engine_{date}",
+            "source": "solution_engine",
+            "date": date,
+            "text": solution_text,
+            "steps": steps,
+        },
+    }
+
+def register_stored_solutions(items):
+    """Makes freshly stored solutions visible to the filter and similarity index."""
+    global graph_version
+    with index_lock:
+        for item in items:
+            problem = item["problem"]
+            solution_filter.add(problem["fingerprint"])
+            similarity_index.add(problem["id"], problem["text"])
+        if pending_registrations is not None:
+            pending_registrations.extend(items)
+    graph_version = None  # Written through this gateway: no ETags until the next version poll
+
+def parse_fields(fields: Optional[str]):
+    return [field.strip() for field in fields.split(",") if field.strip()] if fields else None
+
+def not_modified(request: Request, response: Response):
+    """
+    Sets the graph-version ETag on the response and tells whether the client's copy is current.
+    """
+    if graph_version is None:
+        return False
+    etag = f'W/"{graph_version}"'
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = "no-cache"
+    return request.headers.get("if-none-match") == etag
 
 @app.get("/concepts")
-def list_concepts():
+def list_concepts(request: Request, response: Response, limit: int = 100,
+                  cursor: Optional[str] = None, fields: Optional[str] = None):
     """
-    Endpoint to retrieve all math concepts from the knowledge graph.
+    Endpoint to retrieve math concepts from the knowledge graph, one page at a time.
+    Pass the returned next_cursor as `cursor` for the next page; `fields` is a
+    comma-separated subset of name, description, example, dependents.
     """
+    if not_modified(request, response):
+        return Response(status_code=304, headers=dict(response.headers))
     try:
-        concepts = get_all_concepts()
-        return {"concepts": concepts}
+        concepts, next_cursor = get_concepts_page(min(max(limit, 1), MAX_PAGE_SIZE), cursor, parse_fields(fields))
+        return {"concepts": concepts, "next_cursor": next_cursor}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/problems")
-def list_problems():
+def list_problems(request: Request, response: Response, limit: int = 100,
+                  cursor: Optional[str] = None, fields: Optional[str] = None):
     """
-    Endpoint to retrieve all math problems from the knowledge graph.
+    Endpoint to retrieve math problems from the knowledge graph, one page at a time.
+    Pass the returned next_cursor as `cursor` for the next page; `fields` is a
+    comma-separated subset of id, text, difficulty.
     """
+    if not_modified(request, response):
+        return Response(status_code=304, headers=dict(response.headers))
     try:
-        problems = get_all_problems()
-        return {"problems": problems}
+        problems, next_cursor = get_problems_page(min(max(limit, 1), MAX_PAGE_SIZE), cursor, parse_fields(fields))
+        return {"problems": problems, "next_cursor": next_cursor}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/concepts/{name}/closure")
+def concept_closure(name: str, request: Request, response: Response):
+    """
+    Endpoint returning every concept the given concept builds on, in learning order
+    (prerequisites first, the concept itself last).
+    """
+    closure = prerequisite_closure  # The refresher may swap the global; use one snapshot
+    if closure is None:
+        raise HTTPException(status_code=503, detail="Prerequisite index is not built yet")
+    if not_modified(request, response):
+        return Response(status_code=304, headers=dict(response.headers))
+    path = closure.concept_closure(name)
+    if path is None:
+        raise HTTPException(status_code=404, detail=f"Unknown concept '{name}'")
+    return {"concept": name, "learning_path": path}
+
+@app.get("/problems/{problem_id}/prerequisites")
+def problem_prerequisites(problem_id: str, request: Request, response: Response):
+    """
+    Endpoint returning the concepts applied in a problem's solutions together with all their
+    prerequisites, in learning order.
+    """
+    closure = prerequisite_closure  # The refresher may swap the global; use one snapshot
+    if closure is None:
+        raise HTTPException(status_code=503, detail="Prerequisite index is not built yet")
+    if not_modified(request, response):
+        return Response(status_code=304, headers=dict(response.headers))
+    path = closure.problem_prerequisites(problem_id)
+    if path is None:
+        raise HTTPException(status_code=404, detail=f"No concepts recorded for problem '{problem_id}'")
+    return {
+        "problem_id": problem_id,
+        "concepts": closure.problem_concepts[problem_id],
+        "learning_path": path,
+    }
+
+@app.post("/recommendations")
+def recommend_exercises(req: RecommendationRequest):
+    """
+    Endpoint ranking practice problems for a whole class at once: for every student, the
+    top-k problems exercising their weak concepts (or concepts built on them), easiest
+    and most focused first.
+    """
+    if recommender is None:
+        raise HTTPException(status_code=503, detail="Recommender is not built yet")
+    k = min(max(req.k, 1), MAX_RECOMMENDATIONS)
+    ranked = recommender.recommend([student.model_dump() for student in req.students], k)
+    return {
+        "recommendations": [
+            {"student": student.id, "problems": problems}
+            for student, problems in zip(req.students, ranked)
+        ]
+    }
+
+@app.get("/stats/solution-filter")
+def solution_filter_stats():
+    """
+    Endpoint exposing the negative-lookup filter's size and hit/miss/false-positive counters.
+    """
+    return solution_filter.stats()
+
+@app.get("/stats/solution-writer")
+def solution_writer_stats():
+    """
+    Endpoint exposing the background solution writer's queue depth and counters.
+    """
+    return solution_writer.stats()
+
+@app.get("/metrics")
+def metrics():
+    """
+    Endpoint exposing Prometheus metrics: per-stage and HTTP latency histograms, KG lookup
+    outcomes, engine stream TTFT and chunk rate, open streams and upstream errors.
+    """
+    return metrics_response()
+
+@app.get("/ready")
+def readiness(response: Response):
+    """
+    Readiness probe: 200 once the KG is reachable and the solution filter and prerequisite
+    index are built, 503 before (the root endpoint stays the liveness probe).
+    """
+    checks = {
+        "kg": kg_ready,
+        "solution_filter": solution_filter.ready,
+        "prerequisite_index": prerequisite_closure is not None,
+    }
+    ready = all(checks.values())
+    if not ready:
+        response.status_code = 503
+    return {"ready": ready, "checks": checks}
+
 @app.get("/")
 def read_root():
     """
@@ -67,6 +403,118 @@ def read_root():
     """
     return {"message": "Math Tutor API is running."}
 
-@app.on_event("shutdown")
-def shutdown_event():
+def rebuild_solution_indexes():
+    """
+    Rebuilds the solution filter and similarity index from the KG; runs in the threadpool so
+    requests keep using the old ones. Solutions registered since the fetch started are
+    re-applied before both are swapped in under index_lock.
+    """
+    global similarity_index, pending_registrations
+    with index_lock:
+        pending_registrations = pending = []
+    try:
+        problems = get_solved_problems()
+        index = ProblemSimilarityIndex()
+        for problem in problems:
+            index.add(problem["id"], problem["text"])
+        fingerprints = [problem["fingerprint"] for problem in problems]
+        with index_lock:
+            fetched = {problem["id"] for problem in problems}
+            for item in pending:
+                problem = item["problem"]
+                fingerprints.append(problem["fingerprint"])
+                if problem["id"] not in fetched:
+                    index.add(problem["id"], problem["text"])
+            solution_filter.rebuild(fingerprints)
+            similarity_index = index
+    finally:
+        with index_lock:
+            pending_registrations = None
+
+async def refresh_solution_filter():
+    """
+    Rebuilds the solution filter and similarity index from the KG now and then
+    every SOLUTION_FILTER_REFRESH_SECONDS.
+    """
+    while True:
+        try:
+            await run_in_threadpool(rebuild_solution_indexes)
+        except Exception as e:
+            print(f"Warning: Could not rebuild the solution filter: {e}")
+        await asyncio.sleep(SOLUTION_FILTER_REFRESH_SECONDS)
+
+def build_recommender(closure, problems):
+    """Builds the recommender; NumPy/SciPy are imported here, on first use, not at startup."""
+    from recommender import ExerciseRecommender
+    return ExerciseRecommender(closure, problems)
+
+async def watch_graph_version():
+    """
+    Polls the graph version token every GRAPH_VERSION_POLL_SECONDS and rebuilds the
+    prerequisite closure and the recommender when it changes.
+    """
+    global graph_version, prerequisite_closure, recommender, kg_ready
+    closure_version = None
+    while True:
+        try:
+            version = await run_in_threadpool(get_graph_version)
+            if version != closure_version or prerequisite_closure is None:
+                requires, problem_concepts = await run_in_threadpool(get_concept_dependencies)
+                prerequisite_closure = PrerequisiteClosure(requires, problem_concepts)
+                problems = [dict(problem) for problem in await run_in_threadpool(get_all_problems)]
+                recommender = await run_in_threadpool(build_recommender, prerequisite_closure, problems)
+                closure_version = version
+            graph_version = version
+            kg_ready = True
+        except Exception as e:
+            graph_version = None  # Unknown version: serve without ETags rather than stale 304s
+            kg_ready = False
+            print(f"Warning: Could not read the graph version: {e}")
+        await asyncio.sleep(GRAPH_VERSION_POLL_SECONDS)
+
+async def warm_up_engine_connections():
+    """Opens pooled keep-alive connections to the engine with concurrent readiness probes."""
+    url = httpx.URL(SOLUTION_ENGINE_URL).copy_with(path="/ready")
+    results = await asyncio.gather(
+        *(engine_client.get(url) for _ in range(ENGINE_WARMUP_CONNECTIONS)), return_exceptions=True
+    )
+    errors = [result for result in results if isinstance(result, Exception)]
+    if errors:
+        print(f"Warning: Could not pre-connect to the solution engine: {errors[0]}")
+
+async def startup():
+    global engine_client, solution_filter_task, solution_writer, graph_version_task, annotator, kg_ready
+    engine_client = httpx.AsyncClient(
+        timeout=httpx.Timeout(ENGINE_READ_TIMEOUT, connect=ENGINE_CONNECT_TIMEOUT),
+        limits=httpx.Limits(
+            max_connections=ENGINE_MAX_CONNECTIONS,
+            max_keepalive_connections=ENGINE_MAX_CONNECTIONS,
+        ),
+    )
+    annotator = await run_in_threadpool(
+        ConceptAnnotator.from_yaml_dir, os.getenv("CONCEPTS_DIR", DEFAULT_CONCEPTS_DIR)
+    )
+    # Connectivity check and connection pre-fill; a failure is reported by /ready, not fatal.
+    try:
+        await run_in_threadpool(warm_up_kg)
+        kg_ready = True
+    except Exception as e:
+        print(f"Warning: Knowledge graph warm-up failed: {e}")
+    await warm_up_engine_connections()
+    solution_filter_task = asyncio.create_task(refresh_solution_filter())
+    graph_version_task = asyncio.create_task(watch_graph_version())
+    solution_writer = SolutionWriter(
+        store_solutions_in_kg,
+        on_stored=register_stored_solutions,
+        max_queue=SOLUTION_WRITER_QUEUE_SIZE,
+        batch_size=SOLUTION_WRITER_BATCH_SIZE,
+    )
+    solution_writer.start()
+
+async def shutdown():
+    solution_filter_task.cancel()
+    graph_version_task.cancel()
+    await engine_client.aclose()
+    # Flush queued solutions before the driver goes away.
+    await solution_writer.stop()
     close_driver()
@@ -1,36 +1,109 @@
 import os
-import json
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from neo4j import GraphDatabase
 
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "common"))
+from fingerprint import problem_fingerprint
+from solution_store import store_solutions
+
 # Configure Neo4j connection parameters from environment variables (or default values)
 NEO4J_URI = os.getenv("NEO4J_URI", "bolt://localhost:7687")
 NEO4J_USER = os.getenv("NEO4J_USER", "neo4j")
 NEO4J_PASSWORD = os.getenv("NEO4J_PASSWORD", "password")
 
-# Create a Neo4j driver instance
-driver = GraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USER, NEO4J_PASSWORD))
+# Connections opened by warm_up, so the first requests do not pay for the handshake.
+NEO4J_WARMUP_CONNECTIONS = int(os.getenv("NEO4J_WARMUP_CONNECTIONS", "8"))
+
+# The Neo4j driver is created on first use, so importing this module stays cheap.
+driver = None
+driver_lock = threading.Lock()
+
+def get_driver():
+    """
+    Returns the shared Neo4j driver, creating it on first use.
+    """
+    global driver
+    if driver is None:
+        with driver_lock:
+            if driver is None:
+                driver = GraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USER, NEO4J_PASSWORD))
+    return driver
+
+def _ping():
+    with get_driver().session() as session:
+        session.run("RETURN 1").consume()
+
+def warm_up():
+    """
+    Checks that Neo4j is reachable and opens NEO4J_WARMUP_CONNECTIONS pooled connections
+    by running concurrent trivial queries. Raises if the database cannot be reached.
+    """
+    get_driver().verify_connectivity()
+    with ThreadPoolExecutor(max_workers=max(1, NEO4J_WARMUP_CONNECTIONS)) as pool:
+        list(pool.map(lambda _: _ping(), range(NEO4J_WARMUP_CONNECTIONS)))
+
+# Solution properties returned to clients; content_hash and generated are loader bookkeeping.
+SOLUTION_FIELDS = ("id", "problem_id", "source", "date", "text")
+
+def _public_solution(node):
+    return {key: value for key, value in dict(node).items() if key in SOLUTION_FIELDS}
 
 def get_solution_from_kg(problem_text: str):
     """
     Query the KG for a solution corresponding to a given problem text.
+    The lookup is an index seek on the problem's canonical fingerprint, so trivially
+    reformatted texts (whitespace, case, Unicode or LaTeX delimiters) also match.
     """
-    with driver.session() as session:
+    with get_driver().session() as session:
         query = """
-            MATCH (p:Problem {text: $text})-[:HAS_SOLUTION]->(s:Solution)
+            MATCH (p:Problem {fingerprint: $fingerprint})-[:HAS_SOLUTION]->(s:Solution)
             RETURN s
+            LIMIT 1
         """
-        result = session.run(query, text=problem_text)
+        result = session.run(query, fingerprint=problem_fingerprint(problem_text))
         record = result.single()
         if record:
-            return record["s"]
+            return _public_solution(record["s"])
+    return None
+
+def get_solution_by_problem_id(problem_id: str):
+    """
+    Query the KG for a solution of the problem with the given id, with its ordered steps.
+    """
+    with get_driver().session() as session:
+        query = """
+            MATCH (p:Problem {id: $id})-[:HAS_SOLUTION]->(s:Solution)
+            WITH s LIMIT 1
+            OPTIONAL MATCH (s)-[:HAS_STEP]->(st:Step)
+            WITH s, st ORDER BY st.step_number
+            RETURN s, collect(st {.step_number, .step_explanation, .math_transformation}) AS steps
+        """
+        record = session.run(query, id=problem_id).single()
+        if record:
+            return dict(_public_solution(record["s"]), steps=record["steps"])
     return None
 
+def get_solved_problems():
+    """
+    Retrieve id, text and fingerprint of every problem that has at least one solution.
+    """
+    with get_driver().session() as session:
+        result = session.run(
+            """
+            MATCH (p:Problem)-[:HAS_SOLUTION]->(:Solution)
+            RETURN DISTINCT p.id AS id, p.text AS text, p.fingerprint AS fingerprint
+            """
+        )
+        return [record.data() for record in result]
+
 def get_all_concepts():
     """
     Retrieve all concept nodes from the KG, along with a list of names of nodes
     that require (depend on) each concept.
     """
-    with driver.session() as session:
+    with get_driver().session() as session:
         query = """
             MATCH (c:Concept)
             OPTIONAL MATCH (d)-[:REQUIRES]->(c)
@@ -52,84 +125,119 @@ def get_all_problems():
     """
     Retrieve all problem nodes from the KG.
     """
-    with driver.session() as session:
+    with get_driver().session() as session:
         result = session.run("MATCH (p:Problem) RETURN p")
         problems = [record["p"] for record in result]
     return problems
 
-def store_solution_in_kg(problem_data: dict, solution_data: dict):
+# Properties a client may request through the `fields` parameter.
+CONCEPT_FIELDS = ("name", "description", "example")
+PROBLEM_FIELDS = ("id", "text", "difficulty")
+
+def _projection(variable, fields, allowed):
+    """Cypher map projection for the requested fields; unknown names are ignored."""
+    selected = [field for field in allowed if field in fields]
+    return variable + " {" + ", ".join(f".{field}" for field in selected) + "}"
+
+def get_concepts_page(limit: int, cursor: str = None, fields=None):
     """
-    Store a new solution (and its steps) into the KG and link it to the associated problem.
-    This is a stub implementation for later expansion.
+    Retrieve up to `limit` concepts ordered by name, starting after `cursor` (keyset pagination
+    on the unique name index). Only the requested fields are returned; the dependents list is
+    computed for the page alone and only when requested.
+    Returns (concepts, next_cursor); next_cursor is None on the last page.
+    """
+    fields = set(fields or CONCEPT_FIELDS + ("dependents",))
+    query = f"""
+        MATCH (c:Concept)
+        WHERE $cursor IS NULL OR c.name > $cursor
+        WITH c ORDER BY c.name LIMIT $limit
+        {"OPTIONAL MATCH (d)-[:REQUIRES]->(c)" if "dependents" in fields else ""}
+        RETURN c.name AS cursor, {_projection("c", fields, CONCEPT_FIELDS)} AS data
+            {", collect(d.name) AS dependents" if "dependents" in fields else ""}
+        ORDER BY cursor
+    """
+    with get_driver().session() as session:
+        records = list(session.run(query, cursor=cursor, limit=limit + 1))
+    concepts = []
+    for record in records[:limit]:
+        concept_data = record["data"]
+        if "dependents" in fields:
+            concept_data["dependents"] = record["dependents"]
+        concepts.append(concept_data)
+    next_cursor = records[limit - 1]["cursor"] if len(records) > limit else None
+    return concepts, next_cursor
+
+def get_problems_page(limit: int, cursor: str = None, fields=None):
+    """
+    Retrieve up to `limit` problems ordered by id, starting after `cursor`.
+    Returns (problems, next_cursor); next_cursor is None on the last page.
     """
-    with driver.session() as session:
-        # Merge the problem node
-        session.run(
+    fields = set(fields or PROBLEM_FIELDS)
+    query = f"""
+        MATCH (p:Problem)
+        WHERE $cursor IS NULL OR p.id > $cursor
+        RETURN p.id AS cursor, {_projection("p", fields, PROBLEM_FIELDS)} AS data
+        ORDER BY p.id
+        LIMIT $limit
+    """
+    with get_driver().session() as session:
+        records = list(session.run(query, cursor=cursor, limit=limit + 1))
+    problems = [record["data"] for record in records[:limit]]
+    next_cursor = records[limit - 1]["cursor"] if len(records) > limit else None
+    return problems, next_cursor
+
+def get_concept_dependencies():
+    """
+    Retrieve the inputs of the prerequisite closure: {concept: [required concepts]} and
+    {problem_id: [concepts applied in its solutions' steps]}.
+    """
+    with get_driver().session() as session:
+        result = session.run(
             """
-            MERGE (p:Problem {id: $id})
-            SET p.text = $text, p.difficulty = $difficulty
-            """,
-            id=problem_data["id"],
-            text=problem_data["text"],
-            difficulty=problem_data["difficulty"]
-        )
-        # Merge the solution node
-        session.run(
+            MATCH (c:Concept)
+            OPTIONAL MATCH (c)-[:REQUIRES]->(pr:Concept)
+            RETURN c.name AS name, collect(pr.name) AS requires
             """
-            MERGE (s:Solution {id: $id})
-            SET s.problem_id = $problem_id, s.source = $source, s.date = $date
-            """,
-            id=solution_data["id"],
-            problem_id=solution_data["problem_id"],
-            source=solution_data["source"],
-            date=solution_data["date"]
         )
-        # Create relationship between Problem and Solution
-        session.run(
+        requires = {record["name"]: record["requires"] for record in result}
+        result = session.run(
+            """
+            MATCH (p:Problem)-[:HAS_SOLUTION]->(:Solution)-[:HAS_STEP]->(:Step)-[:APPLIES_CONCEPT]->(c:Concept)
+            RETURN p.id AS id, collect(DISTINCT c.name) AS concepts
             """
-            MATCH (p:Problem {id: $problem_id}), (s:Solution {id: $solution_id})
-            MERGE (p)-[:HAS_SOLUTION]->(s)
-            """,
-            problem_id=solution_data["problem_id"],
-            solution_id=solution_data["id"]
         )
-        # Insert steps and create relationships
-        for step in solution_data.get("steps", []):
-            step_id = step.get("id") or f"{solution_data['id']}_step_{step['step_number']}"
-            session.run(
-                """
-                MERGE (st:Step {id: $id})
-                SET st.step_explanation = $step_explanation,
-                    st.math_transformation = $math_transformation,
-                    st.related_concept = $related_concept,
-                    st.step_number = $step_number
-                """,
-                id=step_id,
-                step_explanation=step["step_explanation"],
-                math_transformation=step["math_transformation"],
-                related_concept=json.dumps(step["related_concepts"]),
-                step_number=step["step_number"]
-            )
-            session.run(
-                """
-                MATCH (s:Solution {id: $solution_id}), (st:Step {id: $step_id})
-                MERGE (s)-[:HAS_STEP]->(st)
-                """,
-                solution_id=solution_data["id"],
-                step_id=step_id
-            )
-            for concept_name in step.get("related_concepts", []):
-                session.run(
-                    """
-                    MATCH (st:Step {id: $step_id}), (c:Concept {name: $concept_name})
-                    MERGE (st)-[:APPLIES_CONCEPT]->(c)
-                    """,
-                    step_id=step_id,
-                    concept_name=concept_name
-                )
+        problem_concepts = {record["id"]: record["concepts"] for record in result}
+    return requires, problem_concepts
+
+def get_graph_version():
+    """
+    Retrieve the graph version token, changed by every load, sync and solution write.
+    """
+    with get_driver().session() as session:
+        record = session.run("MATCH (m:GraphMeta {id: 'graph'}) RETURN m.version AS version").single()
+        return record["version"] if record else None
+
+def store_solutions_in_kg(items):
+    """
+    Store a batch of solutions (and their steps) in one write transaction.
+    Each item is {"problem": problem_data, "solution": solution_data}; see solution_store.solution_rows.
+    """
+    with get_driver().session() as session:
+        session.execute_write(store_solutions, items)
+
+def store_solution_in_kg(problem_data: dict, solution_data: dict):
+    """
+    Store a new solution (and its steps) into the KG and link it to the associated problem.
+    """
+    problem_data = dict(problem_data)
+    problem_data.setdefault("fingerprint", problem_fingerprint(problem_data["text"]))
+    store_solutions_in_kg([{"problem": problem_data, "solution": solution_data}])
 
 def close_driver():
     """
-    Closes the Neo4j driver.
+    Closes the Neo4j driver if it was created.
     """
-    driver.close()
+    global driver
+    if driver is not None:
+        driver.close()
+        driver = None
@@ -0,0 +1,320 @@
+import argparse
+import heapq
+import itertools
+import os
+import statistics
+import sys
+import threading
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "common"))
+from fingerprint import problem_fingerprint
+from snapshot import GraphSnapshot
+
+# In-process knowledge graph with the same read/write API as kg.py, selected with
+# KG_BACKEND=memory. Reads come from a compiled snapshot (load_data.py --compile-snapshot);
+# the snapshot is swapped atomically when the file changes.
+KG_SNAPSHOT_PATH = os.getenv(
+    "KG_SNAPSHOT_PATH",
+    os.path.join(os.path.dirname(__file__), "..", "..", "data", "knowledge_graph", "graph.snapshot"),
+)
+
+# Properties a client may request through the `fields` parameter.
+CONCEPT_FIELDS = ("name", "description", "example")
+PROBLEM_FIELDS = ("id", "text", "difficulty")
+# Solution properties returned to clients; content_hash and generated are loader bookkeeping.
+SOLUTION_FIELDS = ("id", "problem_id", "source", "date", "text")
+STEP_FIELDS = ("step_number", "step_explanation", "math_transformation")
+
+def _file_stat(path):
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+# Loaded on first use (or by warm_up), so importing this module stays cheap.
+snapshot = None
+snapshot_stat = None
+reload_lock = threading.Lock()
+
+# Solutions written through this gateway, keyed by problem fingerprint. They are not in the
+# snapshot, survive snapshot swaps and are lost on restart.
+generated_solutions = {}
+generated_problems = {}  # Problem id -> problem dict, for problems not in the snapshot
+generated_version = 0
+store_lock = threading.Lock()
+
+def reload_if_changed():
+    """
+    Loads the snapshot again if the file changed. The new snapshot is fully built before it
+    replaces the module-level reference, so every reader sees either the old or the new graph.
+    """
+    global snapshot, snapshot_stat
+    try:
+        stat = _file_stat(KG_SNAPSHOT_PATH)
+    except OSError as e:
+        print(f"Warning: Could not stat the KG snapshot: {e}")
+        return False
+    if stat == snapshot_stat:
+        return False
+    with reload_lock:
+        if stat == snapshot_stat:
+            return False
+        try:
+            fresh = GraphSnapshot.load(KG_SNAPSHOT_PATH)
+        except (OSError, ValueError) as e:
+            print(f"Warning: Keeping the current KG snapshot, could not load the new one: {e}")
+            return False
+        snapshot, snapshot_stat = fresh, stat
+    print(f"Loaded KG snapshot {snapshot.version}")
+    return True
+
+def get_snapshot():
+    """
+    Returns the current snapshot, loading it on first use.
+    """
+    if snapshot is None:
+        reload_if_changed()
+        if snapshot is None:
+            raise RuntimeError(f"KG snapshot {KG_SNAPSHOT_PATH} could not be loaded")
+    return snapshot
+
+def warm_up():
+    """
+    Loads the snapshot; raises if it is missing or invalid.
+    """
+    get_snapshot()
+
+def _public_solution(solution):
+    return {key: value for key, value in solution.items() if key in SOLUTION_FIELDS}
+
+def _first_solution(graph, problem_position, with_steps=False):
+    solutions = graph.neighbors("HAS_SOLUTION", problem_position)
+    if not len(solutions):
+        return None
+    solution = _public_solution(graph.labels["Solution"].node(solutions[0]))
+    if with_steps:
+        steps = [graph.labels["Step"].node(i, STEP_FIELDS) for i in graph.neighbors("HAS_STEP", solutions[0])]
+        solution["steps"] = sorted(steps, key=lambda step: step.get("step_number") or 0)
+    return solution
+
+def get_solution_from_kg(problem_text: str):
+    """
+    Look up a stored solution by the problem's canonical fingerprint.
+    """
+    fingerprint = problem_fingerprint(problem_text)
+    graph = get_snapshot()
+    position = graph.problem_by_fingerprint.get(fingerprint)
+    if position is not None:
+        solution = _first_solution(graph, position)
+        if solution:
+            return solution
+    generated = generated_solutions.get(fingerprint)
+    return _public_solution(generated["solution"]) if generated else None
+
+def get_solution_by_problem_id(problem_id: str):
+    """
+    Look up a stored solution of the problem with the given id, with its ordered steps.
+    """
+    graph = get_snapshot()
+    position = graph.labels["Problem"].positions.get(problem_id)
+    if position is not None:
+        solution = _first_solution(graph, position, with_steps=True)
+        if solution:
+            return solution
+    for generated in list(generated_solutions.values()):
+        if generated["solution"]["problem_id"] == problem_id:
+            return dict(_public_solution(generated["solution"]), steps=generated["steps"])
+    return None
+
+def get_solved_problems():
+    """
+    Id, text and fingerprint of every problem that has at least one solution.
+    """
+    graph = get_snapshot()
+    problems = graph.labels["Problem"]
+    solved = [
+        {"id": problems.keys[i], "text": problems.value("text", i), "fingerprint": problems.value("fingerprint", i)}
+        for i in range(problems.count)
+        if len(graph.neighbors("HAS_SOLUTION", i))
+    ]
+    solved_ids = {problem["id"] for problem in solved}
+    for generated in list(generated_solutions.values()):
+        problem = generated["problem"]
+        if problem["id"] not in solved_ids:
+            solved_ids.add(problem["id"])
+            solved.append({"id": problem["id"], "text": problem["text"], "fingerprint": problem["fingerprint"]})
+    return solved
+
+def _concept(graph, position, fields=None):
+    concepts = graph.labels["Concept"]
+    concept_data = concepts.node(position, fields)
+    if fields is None or "dependents" in fields:
+        concept_data["dependents"] = [
+            concepts.keys[i] for i in graph.neighbors("REQUIRES", position, reverse=True)
+        ]
+    return concept_data
+
+def get_all_concepts():
+    """
+    All concepts, each with the names of the concepts that require it.
+    """
+    graph = get_snapshot()
+    return [_concept(graph, i) for i in range(graph.labels["Concept"].count)]
+
+def get_all_problems():
+    """
+    All problems, including those created for generated solutions.
+    """
+    graph = get_snapshot()
+    problems = graph.labels["Problem"]
+    return [problems.node(i) for i in range(problems.count)] + [
+        dict(problem) for problem in list(generated_problems.values())
+    ]
+
+def get_concepts_page(limit: int, cursor: str = None, fields=None):
+    """
+    Up to `limit` concepts ordered by name, starting after `cursor`.
+    Returns (concepts, next_cursor); next_cursor is None on the last page.
+    """
+    graph = get_snapshot()
+    concepts = graph.labels["Concept"]
+    fields = set(fields or CONCEPT_FIELDS + ("dependents",))
+    projection = [field for field in CONCEPT_FIELDS if field in fields] + (["dependents"] if "dependents" in fields else [])
+    start = concepts.after(cursor)
+    page = [_concept(graph, i, projection) for i in range(start, min(start + limit, concepts.count))]
+    next_cursor = concepts.keys[start + limit - 1] if start + limit < concepts.count else None
+    return page, next_cursor
+
+def get_problems_page(limit: int, cursor: str = None, fields=None):
+    """
+    Up to `limit` problems ordered by id, starting after `cursor`; snapshot and generated
+    problems are merged in id order. Returns (problems, next_cursor).
+    """
+    graph = get_snapshot()
+    problems = graph.labels["Problem"]
+    projection = [field for field in PROBLEM_FIELDS if field in set(fields or PROBLEM_FIELDS)]
+    extra = sorted(problem_id for problem_id in list(generated_problems) if cursor is None or problem_id > cursor)
+    snapshot_ids = (problems.keys[i] for i in range(problems.after(cursor), problems.count))
+    ids = list(itertools.islice(heapq.merge(snapshot_ids, extra), limit + 1))
+    page = []
+    for problem_id in ids[:limit]:
+        position = problems.positions.get(problem_id)
+        if position is not None:
+            page.append(problems.node(position, projection))
+        else:
+            problem = generated_problems[problem_id]
+            page.append({field: problem[field] for field in projection if field in problem})
+    next_cursor = ids[limit - 1] if len(ids) > limit else None
+    return page, next_cursor
+
+def get_concept_dependencies():
+    """
+    {concept: [required concepts]} and {problem_id: [concepts applied in its solutions' steps]}.
+    """
+    graph = get_snapshot()
+    concepts, problems = graph.labels["Concept"], graph.labels["Problem"]
+    requires = {
+        concepts.keys[i]: [concepts.keys[j] for j in graph.neighbors("REQUIRES", i)]
+        for i in range(concepts.count)
+    }
+    problem_concepts = {}
+    for i in range(problems.count):
+        applied = {
+            concepts.keys[c]
+            for s in graph.neighbors("HAS_SOLUTION", i)
+            for st in graph.neighbors("HAS_STEP", s)
+            for c in graph.neighbors("APPLIES_CONCEPT", st)
+        }
+        if applied:
+            problem_concepts[problems.keys[i]] = sorted(applied)
+    for generated in list(generated_solutions.values()):
+        if generated["concepts"]:
+            problem_id = generated["problem"]["id"]
+            problem_concepts[problem_id] = sorted(set(problem_concepts.get(problem_id, [])) | generated["concepts"])
+    return requires, problem_concepts
+
+def get_graph_version():
+    """
+    Version token covering the snapshot and the solutions written since startup.
+    Also picks up a changed snapshot file, so the gateway's version poll drives hot swaps.
+    """
+    reload_if_changed()
+    return f"{get_snapshot().version}-{generated_version}"
+
+def store_solutions_in_kg(items):
+    """
+    Keep a batch of generated solutions in memory, attached like solution_store does:
+    a solution for a known problem fingerprint links to that problem.
+    """
+    global generated_version
+    graph = get_snapshot()
+    with store_lock:
+        for item in items:
+            problem, solution = dict(item["problem"]), item["solution"]
+            position = graph.problem_by_fingerprint.get(problem["fingerprint"])
+            existing = generated_solutions.get(problem["fingerprint"])
+            if position is not None:
+                problem["id"] = graph.labels["Problem"].keys[position]
+            elif existing:
+                problem = existing["problem"]
+            else:
+                problem["generated"] = True
+                generated_problems[problem["id"]] = problem
+            generated_solutions[problem["fingerprint"]] = {
+                "problem": problem,
+                "solution": {
+                    "id": solution["id"],
+                    "problem_id": problem["id"],
+                    "source": solution["source"],
+                    "date": solution["date"],
+                    "text": solution.get("text"),
+                    "generated": True,
+                },
+                "steps": [
+                    {field: step.get(field) for field in STEP_FIELDS} for step in solution.get("steps", [])
+                ],
+                "concepts": {
+                    name for step in solution.get("steps", []) for name in step.get("related_concepts", [])
+                    if name in graph.labels["Concept"].positions
+                },
+            }
+        generated_version += 1
+
+def store_solution_in_kg(problem_data: dict, solution_data: dict):
+    """
+    Store a new solution for a problem.
+    """
+    problem_data = dict(problem_data)
+    problem_data.setdefault("fingerprint", problem_fingerprint(problem_data["text"]))
+    store_solutions_in_kg([{"problem": problem_data, "solution": solution_data}])
+
+def close_driver():
+    """
+    Nothing to close; kept for API parity with kg.py.
+    """
+
+
+def benchmark(lookups):
+    """Reports the latency of the main read paths against the loaded snapshot."""
+    warm_up()
+    problems = [snapshot.labels["Problem"].value("text", i) for i in range(snapshot.labels["Problem"].count)]
+    cases = [
+        ("get_solution_from_kg", lambda i: get_solution_from_kg(problems[i % len(problems)])),
+        ("get_solution_by_problem_id", lambda i: get_solution_by_problem_id(snapshot.labels["Problem"].keys[i % len(problems)])),
+        ("get_concepts_page(100)", lambda i: get_concepts_page(100)),
+        ("get_all_concepts", lambda i: get_all_concepts()),
+    ]
+    for name, call in cases:
+        timings = []
+        for i in range(lookups):
+            start = time.perf_counter()
+            call(i)
+            timings.append((time.perf_counter() - start) * 1e6)
+        timings.sort()
+        print(f"{name}: p50 {statistics.median(timings):.1f}us, p99 {timings[int(len(timings) * 0.99)]:.1f}us")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Report read latency of the in-memory KG backend.")
+    parser.add_argument("--lookups", type=int, default=10000)
+    args = parser.parse_args()
+    benchmark(args.lookups)
@@ -0,0 +1,126 @@
+import argparse
+import random
+import statistics
+import time
+
+import numpy as np
+from scipy import sparse
+
+from concept_graph import PrerequisiteClosure
+
+# Incidence weight of a concept a problem only needs as a prerequisite of one it applies.
+PREREQUISITE_WEIGHT = 0.5
+# Easier problems rank higher for the same coverage: weak students polish the basics first.
+DIFFICULTY_WEIGHTS = {"Easy": 1.0, "Medium": 0.85, "Hard": 0.7}
+DEFAULT_DIFFICULTY_WEIGHT = 0.85
+
+
+class ExerciseRecommender:
+    """
+    Ranks problems for students from their weak concepts with sparse matrix products.
+
+    The problem x concept matrix has weight 1 for every concept applied in a problem's
+    solution steps and PREREQUISITE_WEIGHT for the rest of its REQUIRES closure. Each row is
+    scaled by the problem's difficulty weight over the square root of its total weight, so
+    problems focused on the weak concepts outrank broad ones that only touch them.
+    """
+
+    def __init__(self, closure: PrerequisiteClosure, problems, prerequisite_weight=PREREQUISITE_WEIGHT):
+        self.concept_columns = closure.positions
+        self.problem_ids = []
+        difficulty = []
+        rows, cols, data = [], [], []
+        for problem in problems:
+            names = closure.problem_concepts.get(problem["id"])
+            if not names:
+                continue
+            row = len(self.problem_ids)
+            self.problem_ids.append(problem["id"])
+            difficulty.append(DIFFICULTY_WEIGHTS.get(problem.get("difficulty"), DEFAULT_DIFFICULTY_WEIGHT))
+            applied = {closure.positions[name] for name in names}
+            bits = 0
+            for column in applied:
+                bits |= closure.closures[column]
+            for name in closure.path(bits):
+                column = closure.positions[name]
+                rows.append(row)
+                cols.append(column)
+                data.append(1.0 if column in applied else prerequisite_weight)
+        self.problem_rows = {problem_id: i for i, problem_id in enumerate(self.problem_ids)}
+
+        incidence = sparse.csr_matrix(
+            (np.asarray(data, dtype=np.float32), (rows, cols)),
+            shape=(len(self.problem_ids), len(closure.names)),
+        )
+        row_weight = np.asarray(incidence.sum(axis=1), dtype=np.float32).ravel()
+        scale = np.asarray(difficulty, dtype=np.float32) / np.sqrt(np.maximum(row_weight, 1e-9))
+        self.matrix = sparse.diags(scale).dot(incidence).tocsr()
+
+    def recommend(self, students, k=10):
+        """
+        students is a list of {"weak_concepts": [...], "solved_problems": [...]} dicts.
+        Scores the whole class with one sparse product and returns, per student, up to k
+        {"id", "score"} dicts, best first, skipping problems the student already solved.
+        """
+        rows, cols = [], []
+        for j, student in enumerate(students):
+            for name in set(student.get("weak_concepts", [])):
+                column = self.concept_columns.get(name)
+                if column is not None:
+                    rows.append(column)
+                    cols.append(j)
+        weak = sparse.csr_matrix(
+            (np.ones(len(rows), dtype=np.float32), (rows, cols)),
+            shape=(self.matrix.shape[1], len(students)),
+        )
+        scores = self.matrix.dot(weak).toarray()  # problems x students
+
+        recommendations = []
+        for j, student in enumerate(students):
+            column = scores[:, j]
+            solved = [self.problem_rows[p] for p in student.get("solved_problems", []) if p in self.problem_rows]
+            column[solved] = 0
+            candidates = np.flatnonzero(column > 0)
+            if len(candidates) > k:
+                candidates = candidates[np.argpartition(-column[candidates], k - 1)[:k]]
+            best = candidates[np.argsort(-column[candidates], kind="stable")]
+            recommendations.append([
+                {"id": self.problem_ids[i], "score": round(float(column[i]), 4)} for i in best
+            ])
+        return recommendations
+
+
+def benchmark(problems=10000, concepts=500, students=30, k=10, rounds=50, seed=7):
+    rng = random.Random(seed)
+    names = [f"C{i}" for i in range(concepts)]
+    # Each concept requires up to three earlier ones, giving a layered curriculum.
+    requires = {name: rng.sample(names[:i], min(i, rng.randint(0, 3))) for i, name in enumerate(names)}
+    problem_concepts = {f"P{i}": rng.sample(names, rng.randint(1, 4)) for i in range(problems)}
+    rows = [{"id": f"P{i}", "difficulty": rng.choice(list(DIFFICULTY_WEIGHTS))} for i in range(problems)]
+
+    start = time.perf_counter()
+    recommender = ExerciseRecommender(PrerequisiteClosure(requires, problem_concepts), rows)
+    build_seconds = time.perf_counter() - start
+
+    latencies = []
+    for _ in range(rounds):
+        batch = [{"weak_concepts": rng.sample(names, 5)} for _ in range(students)]
+        start = time.perf_counter()
+        recommender.recommend(batch, k)
+        latencies.append((time.perf_counter() - start) * 1000)
+    latencies.sort()
+    print(
+        f"{problems} problems, {concepts} concepts, nnz {recommender.matrix.nnz} | build {build_seconds:.2f}s | "
+        f"top-{k} for {students} students p50 {statistics.median(latencies):.2f}ms "
+        f"p99 {latencies[int(len(latencies) * 0.99) - 1]:.2f}ms"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Report recommender build and batch ranking latency.")
+    parser.add_argument("--problems", type=int, default=10000)
+    parser.add_argument("--concepts", type=int, default=500)
+    parser.add_argument("--students", type=int, default=30)
+    parser.add_argument("--k", type=int, default=10)
+    args = parser.parse_args()
+    benchmark(args.problems, args.concepts, args.students, args.k)
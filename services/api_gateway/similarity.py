@@ -0,0 +1,152 @@
+import argparse
+import operator
+import random
+import statistics
+import threading
+import time
+import zlib
+from array import array
+
+from fingerprint import canonical_problem_text
+
+# Mersenne prime 2^31 - 1 keeps every MinHash value in 4 bytes.
+MERSENNE_PRIME = (1 << 31) - 1
+
+
+class ProblemSimilarityIndex:
+    """
+    MinHash / LSH index over character n-grams of canonical problem texts.
+    Runs entirely on CPU in-process: inserts are incremental, and a query only scores
+    the problems that share at least one LSH band with it.
+    """
+
+    def __init__(self, num_perm=64, bands=16, ngram=3, max_bucket_size=32, seed=1):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.ngram = ngram
+        # Near-duplicates only need a few representatives per bucket; capping keeps
+        # queries fast when thousands of variants of one template are indexed.
+        self.max_bucket_size = max_bucket_size
+        rng = random.Random(seed)
+        self._perms = [
+            (rng.randrange(1, MERSENNE_PRIME), rng.randrange(0, MERSENNE_PRIME))
+            for _ in range(num_perm)
+        ]
+        self._buckets = [dict() for _ in range(bands)]
+        self._signatures = array("I")  # num_perm values per indexed problem
+        self._problem_ids = []
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._problem_ids)
+
+    @staticmethod
+    def _shingle_hash(shingle):
+        # CRC32 rather than hash(): str hashes change with PYTHONHASHSEED, so signatures
+        # would differ between processes and restarts.
+        return zlib.crc32(shingle.encode("utf-8")) & MERSENNE_PRIME
+
+    def _shingles(self, text):
+        text = canonical_problem_text(text)
+        if len(text) <= self.ngram:
+            return {self._shingle_hash(text)}
+        return {self._shingle_hash(text[i:i + self.ngram]) for i in range(len(text) - self.ngram + 1)}
+
+    def signature(self, text):
+        """MinHash signature of a problem text."""
+        shingles = self._shingles(text)
+        return array("I", (
+            min((a * shingle + b) % MERSENNE_PRIME for shingle in shingles)
+            for a, b in self._perms
+        ))
+
+    def _band_keys(self, signature):
+        for band in range(self.bands):
+            yield band, signature[band * self.rows:(band + 1) * self.rows].tobytes()
+
+    def add(self, problem_id, text):
+        """Indexes one problem; safe to call while queries are running."""
+        signature = self.signature(text)
+        with self._lock:
+            doc = len(self._problem_ids)
+            self._problem_ids.append(problem_id)
+            self._signatures.extend(signature)
+            for band, key in self._band_keys(signature):
+                bucket = self._buckets[band].setdefault(key, [])
+                if len(bucket) < self.max_bucket_size:
+                    bucket.append(doc)
+
+    def query(self, text, threshold=0.0):
+        """
+        Returns (problem_id, estimated Jaccard similarity) of the most similar indexed
+        problem at or above threshold, or None.
+        """
+        signature = self.signature(text)
+        with self._lock:
+            candidates = set()
+            for band, key in self._band_keys(signature):
+                candidates.update(self._buckets[band].get(key, ()))
+            best = None
+            best_score = threshold
+            for doc in candidates:
+                start = doc * self.num_perm
+                other = self._signatures[start:start + self.num_perm]
+                score = sum(map(operator.eq, signature, other)) / self.num_perm
+                if score >= best_score:
+                    best, best_score = doc, score
+            if best is None:
+                return None
+            return self._problem_ids[best], best_score
+
+
+# --- Latency report: python similarity.py --sizes 10000,100000,1000000 ---
+TEMPLATES = [
+    "Find the least common multiple (LCM) of {a} and {b}.",
+    "What percentage of the number {a} is represented by the sum of its digits?",
+    "Solve {a}x + {b} = {c} for x.",
+    "The perimeter of a rectangle is {a}. Its length is {b} more than its width. Find the sides.",
+    "In a certain school, {a} more boys than girls took the exam. Boys constituted {b}% of the exam takers.",
+    "A rectangle with dimensions {a}√3 cm and {b}√3 cm was divided into {c} equal squares.",
+]
+
+
+def synthetic_problem(rng):
+    template = rng.choice(TEMPLATES)
+    return template.format(a=rng.randint(2, 999), b=rng.randint(2, 99), c=rng.randint(2, 99))
+
+
+def benchmark(size, queries=1000, threshold=0.7, seed=7):
+    rng = random.Random(seed)
+    index = ProblemSimilarityIndex()
+    start = time.perf_counter()
+    for problem_id in range(size):
+        index.add(problem_id, synthetic_problem(rng))
+    build_seconds = time.perf_counter() - start
+
+    latencies = []
+    matched = 0
+    for _ in range(queries):
+        text = synthetic_problem(rng)
+        start = time.perf_counter()
+        if index.query(text, threshold) is not None:
+            matched += 1
+        latencies.append((time.perf_counter() - start) * 1000)
+    latencies.sort()
+    print(
+        f"{size:>9} problems | build {build_seconds:7.1f}s ({size / build_seconds:,.0f}/s) | "
+        f"query p50 {statistics.median(latencies):.3f}ms p99 {latencies[int(len(latencies) * 0.99) - 1]:.3f}ms | "
+        f"matched {matched}/{queries}"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Report similarity index build and query latency.")
+    parser.add_argument("--sizes", default="10000,100000", help="Comma-separated index sizes")
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--threshold", type=float, default=0.7)
+    args = parser.parse_args()
+    for size in args.sizes.split(","):
+        benchmark(int(size), args.queries, args.threshold)
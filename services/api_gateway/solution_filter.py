@@ -0,0 +1,65 @@
+import threading
+
+from fingerprint import problem_fingerprint
+
+
+class SolvedProblemFilter:
+    """
+    In-memory set of problem fingerprints known to have a solution in the KG.
+    A negative answer lets /solve skip the Neo4j lookup entirely.
+    Until the first build completes every lookup is let through, so a cold or failed
+    build can only cost a query, never hide a stored solution.
+    """
+
+    def __init__(self):
+        self._hashes = set()
+        self._lock = threading.Lock()
+        self.ready = False
+        self.hits = 0
+        self.misses = 0
+        self.false_positives = 0
+
+    @staticmethod
+    def _digest(fingerprint: str) -> bytes:
+        # 8-byte prefixes keep the set small; collisions only cost an extra KG query.
+        return bytes.fromhex(fingerprint)[:8]
+
+    def rebuild(self, fingerprints):
+        """Replaces the set with the given problem fingerprints."""
+        hashes = {self._digest(fingerprint) for fingerprint in fingerprints if fingerprint}
+        with self._lock:
+            self._hashes = hashes
+            self.ready = True
+
+    def add(self, fingerprint: str):
+        """Registers a problem whose solution was just stored."""
+        digest = self._digest(fingerprint)
+        with self._lock:
+            self._hashes.add(digest)
+
+    def might_have_solution(self, text: str) -> bool:
+        """Returns False only when the problem is certainly not solved in the KG."""
+        if not self.ready:
+            return True
+        found = self._digest(problem_fingerprint(text)) in self._hashes
+        with self._lock:
+            if found:
+                self.hits += 1
+            else:
+                self.misses += 1
+        return found
+
+    def record_false_positive(self):
+        """Called when the filter said yes but the KG lookup found nothing."""
+        with self._lock:
+            self.false_positives += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "ready": self.ready,
+                "size": len(self._hashes),
+                "hits": self.hits,
+                "misses": self.misses,
+                "false_positives": self.false_positives,
+            }
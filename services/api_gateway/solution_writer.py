@@ -0,0 +1,99 @@
+import asyncio
+
+from fastapi.concurrency import run_in_threadpool
+from telemetry import span
+try:
+    from neo4j.exceptions import ServiceUnavailable, SessionExpired, TransientError
+except ImportError:  # KG_BACKEND=memory does not need the Neo4j driver
+    ServiceUnavailable = SessionExpired = TransientError = None
+
+# Errors worth retrying: the database is briefly unreachable or asked us to retry.
+TRANSIENT_ERRORS = tuple(e for e in (ServiceUnavailable, SessionExpired, TransientError) if e)
+
+
+class SolutionWriter:
+    """
+    Persists generated solutions off the request path.
+    /solve submits items to a bounded in-process queue; a background task drains it and
+    writes them in batches with store_batch (a blocking callable run in the threadpool).
+    """
+
+    def __init__(self, store_batch, on_stored=None, max_queue=1000, batch_size=50,
+                 flush_interval=1.0, max_retries=5, retry_backoff=0.5):
+        self.store_batch = store_batch
+        self.on_stored = on_stored
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self._queue = asyncio.Queue(maxsize=max_queue)
+        self._task = None
+        self._stopping = False
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    def submit(self, item) -> bool:
+        """Queues an item without waiting; drops it when the queue is full to bound memory."""
+        try:
+            self._queue.put_nowait(item)
+            return True
+        except asyncio.QueueFull:
+            self.dropped += 1
+            return False
+
+    async def stop(self):
+        """Flushes everything still queued, then stops the background task."""
+        self._stopping = True
+        if self._task:
+            await self._task
+
+    async def _next_batch(self):
+        try:
+            batch = [await asyncio.wait_for(self._queue.get(), self.flush_interval)]
+        except asyncio.TimeoutError:
+            return []
+        while len(batch) < self.batch_size and not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+        return batch
+
+    async def _run(self):
+        while not (self._stopping and self._queue.empty()):
+            batch = await self._next_batch()
+            if batch:
+                await self._write(batch)
+
+    async def _write(self, batch):
+        for attempt in range(self.max_retries + 1):
+            try:
+                with span("kg_write_batch"):
+                    await run_in_threadpool(self.store_batch, batch)
+                break
+            except TRANSIENT_ERRORS as e:
+                if attempt == self.max_retries:
+                    print(f"Warning: Dropping {len(batch)} solutions after {attempt + 1} attempts: {e}")
+                    self.failed += len(batch)
+                    return
+                await asyncio.sleep(self.retry_backoff * 2 ** attempt)
+            except Exception as e:
+                print(f"Warning: Could not store {len(batch)} solutions: {e}")
+                self.failed += len(batch)
+                return
+        self.written += len(batch)
+        if self.on_stored:
+            # The batch is stored; a failing callback must not stop the writer task.
+            try:
+                await run_in_threadpool(self.on_stored, batch)
+            except Exception as e:
+                print(f"Warning: Could not register {len(batch)} stored solutions: {e}")
+
+    def stats(self):
+        return {
+            "queued": self._queue.qsize(),
+            "written": self.written,
+            "dropped": self.dropped,
+            "failed": self.failed,
+        }
@@ -0,0 +1,251 @@
+import argparse
+import os
+import re
+import time
+from collections import defaultdict, deque
+
+import yaml
+
+DEFAULT_CONCEPTS_DIR = os.path.join(os.path.dirname(__file__), "..", "..", "data", "knowledge_graph", "concepts")
+
+# Everyday wordings of concept names, used when the concept exists in the KG.
+# Words are compared after stem(), so plurals and -ing/-ied forms need no entry.
+SYNONYMS = {
+    "Addition": ["add", "adding", "added", "sum", "plus"],
+    "Subtraction": ["subtract", "subtracting", "subtracted", "minus", "difference"],
+    "Multiplication": ["multiply", "times"],
+    "Division": ["divide"],
+    "Divisibility": ["divisible"],
+    "Square Roots": ["square root", "sqrt"],
+    "Cube Roots": ["cube root"],
+    "Exponentiation": ["power", "exponent", "squared", "cubed"],
+    "Prime Factorization": ["prime factor", "factorize", "factorise"],
+    "Percentages": ["percent", "percentage"],
+    "Calculating Percentage of a Number": ["percentage of", "% of"],
+    "Variables": ["variable", "unknown"],
+    "Equations": ["equation"],
+    "Solving Equations": ["solve the equation", "solve for", "solving for"],
+    "Transposition": ["both sides"],
+    "Fractions": ["fraction", "numerator", "denominator"],
+    "Reciprocal": ["reciprocal"],
+    "Rounding": ["round to", "rounded"],
+    "Unit Conversion": ["convert", "conversion"],
+}
+
+# Derivational endings mapped onto a shared stem, first match wins, after the plural is
+# removed: "division", "dividing" and "divided" all become "divide"; "divisibility" becomes
+# "divisible" but never "divide".
+STEM_SUFFIXES = [
+    ("ication", "y"), ("ying", "y"), ("ied", "y"),
+    ("ision", "ide"), ("iding", "ide"), ("ided", "ide"),
+    ("ibility", "ible"),
+    ("ization", "ize"), ("izing", "ize"), ("isation", "ise"), ("ising", "ise"),
+]
+# Words left as they are: "times" is multiplication, not the plural of "time".
+UNSTEMMED = {"times"}
+
+# Name forms too common in solution prose to say anything about the concept.
+GENERIC_FORMS = {("number",), ("unit",)}
+
+# Units with a superscript (cm², m³) are not powers; removed before the notation rules.
+UNIT_POWER = re.compile(r"\b(?:mm|cm|dm|km|m|in|ft|yd)[²³]")
+
+# Math notation rules: (pattern, concept name, weight).
+PATTERN_RULES = [
+    (r"\^|[²³⁴⁵⁶⁷⁸⁹]", "Exponentiation", 1.0),
+    (r"√|\\sqrt", "Square Roots", 1.5),
+    (r"∛", "Cube Roots", 1.5),
+    (r"%", "Percentages", 1.0),
+    (r"\bLCM\b", "Least Common Multiple", 2.0),
+    (r"\b(?:GCD|GCF|HCF)\b", "Greatest Common Divisor", 2.0),
+    (r"\d\s*/\s*\d", "Fractions", 0.5),
+    (r"[×∙·]|\\times|\\cdot|\d\s*\*\s*\d", "Multiplication", 1.0),
+    (r"÷|\\div", "Division", 1.0),
+    (r"[\w)]\s*\+\s*[\w(]", "Addition", 1.0),
+    (r"\d\s*[-−]\s*\d", "Subtraction", 1.0),
+    (r"\|[^|\n]+\|", "Absolute Value", 1.0),
+    (r"\b\d*[a-zA-Z]\s*[+\-−]\s*\d+\s*=|=\s*\d*[a-zA-Z]\b|\b[a-zA-Z]\s*=\s*[-−]?\d", "Equations", 1.0),
+]
+
+NAME_WEIGHT = 2.0      # Concept name (or a variant of it) appears in the text
+SYNONYM_WEIGHT = 1.0   # Everyday wording of a concept appears in the text
+
+
+class AhoCorasick:
+    """
+    Multi-pattern matcher over any sequence (here: lists of word stems); one pass over
+    the sequence finds every pattern occurrence.
+    """
+
+    def __init__(self, patterns):
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [[]]  # (pattern length, payload) per state
+        for pattern, payload in patterns:
+            state = 0
+            for char in pattern:
+                if char not in self._goto[state]:
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._output.append([])
+                    self._goto[state][char] = len(self._goto) - 1
+                state = self._goto[state][char]
+            self._output[state].append((len(pattern), payload))
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, child in self._goto[state].items():
+                queue.append(child)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(char, 0)
+                self._fail[child] = target if target != child else 0
+                self._output[child] = self._output[child] + self._output[self._fail[child]]
+
+    def find_all(self, sequence):
+        """Yields (start, end, payload) for every occurrence of every pattern."""
+        state = 0
+        goto, fail, output = self._goto, self._fail, self._output
+        for index, char in enumerate(sequence):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for length, payload in output[state]:
+                yield index - length + 1, index + 1, payload
+
+
+def stem(word):
+    """Light stemmer for concept wording: drops the plural, then one derivational ending."""
+    if word in UNSTEMMED or len(word) <= 3:
+        return word
+    if word.endswith("ies"):
+        word = word[:-3] + "y"
+    elif word.endswith(("sses", "xes", "ches", "shes")):
+        word = word[:-2]
+    elif word.endswith("s") and not word.endswith(("ss", "us", "is")):
+        word = word[:-1]
+    for suffix, replacement in STEM_SUFFIXES:
+        if word.endswith(suffix) and len(word) > len(suffix) + 2:
+            return word[:-len(suffix)] + replacement
+    return word
+
+
+def stems(text):
+    """Lower-case word stems of a text; "%" counts as a word so "% of" can be matched."""
+    return tuple(stem(word) for word in re.findall(r"\w+|%", text.lower()))
+
+
+def surface_forms(name):
+    """
+    Stemmed spellings of a concept name: as written and, for names such as
+    "Square (Exponentiation)", the qualifier alone (the bare "square" is too ambiguous).
+    """
+    base = name.lower()
+    forms = {stems(base)}
+    forms.update(stems(inner) for inner in re.findall(r"\((.*?)\)", base))
+    return {form for form in forms if form and form not in GENERIC_FORMS}
+
+
+def acronyms(concept):
+    """Acronyms of multi-word names that the concept's own description or example uses (e.g. LCM)."""
+    words = re.findall(r"[A-Za-z]+", concept["name"])
+    if len(words) < 2:
+        return set()
+    acronym = "".join(word[0] for word in words).lower()
+    context = f"{concept.get('description', '')} {concept.get('example', '')}"
+    return {(acronym,)} if re.search(rf"\b{acronym}\b", context, re.IGNORECASE) else set()
+
+
+class ConceptAnnotator:
+    """
+    Deterministic, local tagger of solution steps with KG concepts.
+    Concept names and synonyms are matched as whole stemmed words in one Aho-Corasick
+    pass over the text's word stems (longest match wins where matches overlap);
+    math-notation rules add weight for symbols such as ^, √, % or LCM. The best-scoring
+    concepts are returned.
+    """
+
+    def __init__(self, concepts, max_concepts=3, min_score=1.0):
+        self.max_concepts = max_concepts
+        self.min_score = min_score
+        names = {concept["name"] for concept in concepts}
+        patterns = {}
+        for concept in concepts:
+            for form in surface_forms(concept["name"]) | acronyms(concept):
+                patterns.setdefault(form, (concept["name"], NAME_WEIGHT))
+        for name, synonyms in SYNONYMS.items():
+            if name in names:
+                for synonym in synonyms:
+                    patterns.setdefault(stems(synonym), (name, SYNONYM_WEIGHT))
+        self._matcher = AhoCorasick(patterns.items())
+        self._rules = [
+            (re.compile(pattern), name, weight)
+            for pattern, name, weight in PATTERN_RULES
+            if name in names
+        ]
+
+    @classmethod
+    def from_yaml_dir(cls, concepts_dir=DEFAULT_CONCEPTS_DIR, **kwargs):
+        concepts = []
+        for filename in sorted(os.listdir(concepts_dir)):
+            if filename.endswith(".yaml"):
+                with open(os.path.join(concepts_dir, filename), "r") as file:
+                    concepts.extend((yaml.safe_load(file) or {}).get("concepts", []))
+        return cls(concepts, **kwargs)
+
+    def _name_matches(self, text):
+        # Matching runs on word stems, so "add" can never match inside "address".
+        matches = list(self._matcher.find_all(stems(text)))
+        # Leftmost-longest: "divisible by 9" beats "divisible" on the same span.
+        matches.sort(key=lambda match: (match[0], -(match[1] - match[0])))
+        covered_until = -1
+        for start, end, payload in matches:
+            if start >= covered_until:
+                covered_until = end
+                yield payload
+
+    def annotate(self, text):
+        """Returns the names of the concepts a piece of solution text applies, best first."""
+        scores = defaultdict(float)
+        for name, weight in self._name_matches(text):
+            scores[name] += weight
+        notation = UNIT_POWER.sub("", text)
+        for pattern, name, weight in self._rules:
+            if pattern.search(notation):
+                scores[name] += weight
+        ranked = sorted(scores.items(), key=lambda item: -item[1])
+        return [name for name, score in ranked if score >= self.min_score][:self.max_concepts]
+
+    def annotate_step(self, step):
+        """Fills a step's related_concepts from its explanation and transformation when it has none."""
+        if not step.get("related_concepts"):
+            step["related_concepts"] = self.annotate(
+                f"{step.get('step_explanation', '')}\n{step.get('math_transformation', '')}"
+            )
+        return step
+
+
+# --- Benchmark: python annotator.py --repeat 2000 ---
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Annotate the steps in solutions.yaml and report throughput.")
+    parser.add_argument("--solutions", default=os.path.join(DEFAULT_CONCEPTS_DIR, "..", "solutions.yaml"))
+    parser.add_argument("--repeat", type=int, default=1000)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    annotator = ConceptAnnotator.from_yaml_dir()
+    print(f"Built annotator in {(time.perf_counter() - start) * 1000:.1f}ms")
+    with open(args.solutions, "r") as file:
+        steps = [step for solution in yaml.safe_load(file)["solutions"] for step in solution.get("steps", [])]
+    for step in steps:
+        found = annotator.annotate(f"{step['step_explanation']}\n{step['math_transformation']}")
+        print(f"  {step['related_concepts']} -> {found}")
+
+    texts = [f"{step['step_explanation']}\n{step['math_transformation']}" for step in steps] * args.repeat
+    start = time.perf_counter()
+    for text in texts:
+        annotator.annotate(text)
+    elapsed = time.perf_counter() - start
+    print(f"{len(texts)} steps in {elapsed:.2f}s: {len(texts) / elapsed:,.0f} steps/s, "
+          f"{elapsed / len(texts) * 1e6:.1f}µs per step")
@@ -0,0 +1,223 @@
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+# Persistent cache of streamed LLM completions, keyed by model, prompt template, sampling
+# parameters and prompt inputs. Each entry keeps the chunks as they were streamed, with
+# their offsets from the start of the request, so a hit is replayed through the same
+# streaming interface (immediately, or at the recorded pace with a replay speed).
+# Sampled requests (temperature unset or above 0) are never cached: a replay would hide
+# the variety the caller asked for.
+# Kept in the user's cache directory, outside the source tree.
+DEFAULT_CACHE_PATH = os.path.join(
+    os.getenv("XDG_CACHE_HOME", os.path.join(os.path.expanduser("~"), ".cache")), "math-tutor", "completions.sqlite3"
+)
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", DEFAULT_CACHE_PATH)  # "" disables the cache
+LLM_CACHE_MAX_MB = float(os.getenv("LLM_CACHE_MAX_MB", "256"))
+LLM_CACHE_MAX_AGE_DAYS = float(os.getenv("LLM_CACHE_MAX_AGE_DAYS", "30"))
+# 0 replays as fast as the client reads; 1 reproduces the recorded pacing.
+LLM_CACHE_REPLAY_SPEED = float(os.getenv("LLM_CACHE_REPLAY_SPEED", "0"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS completions (
+    key TEXT PRIMARY KEY,
+    model TEXT NOT NULL,
+    chunks TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    created REAL NOT NULL,
+    last_used REAL NOT NULL,
+    hits INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS completions_last_used ON completions (last_used);
+"""
+
+
+def is_sampled(params):
+    """True when the request samples: no temperature (the provider default) or one above 0."""
+    temperature = params.get("temperature")
+    return temperature is None or temperature > 0
+
+
+def completion_key(model, template, params, inputs):
+    """Stable key of one request: model, template text, sampling parameters and prompt inputs."""
+    payload = json.dumps(
+        {"model": model, "template": template, "params": params, "inputs": inputs},
+        sort_keys=True, ensure_ascii=False, default=str,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class CompletionCache:
+    """
+    SQLite-backed store of streamed completions with age- and size-based eviction.
+    Entries older than max_age_seconds are misses and are deleted; once the chunks take more
+    than max_bytes, the least recently used entries are deleted. One connection is shared by
+    all threads behind a lock; every operation is a single short statement or transaction.
+    """
+
+    def __init__(self, path=LLM_CACHE_PATH, max_bytes=LLM_CACHE_MAX_MB * 1024 * 1024,
+                 max_age_seconds=LLM_CACHE_MAX_AGE_DAYS * 86400, replay_speed=LLM_CACHE_REPLAY_SPEED):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.max_age_seconds = max_age_seconds
+        self.replay_speed = replay_speed
+        self.hits = self.misses = self.bypassed = self.stored = self.evicted = 0
+        self._lock = threading.Lock()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(SCHEMA)
+
+    @classmethod
+    def from_env(cls):
+        """The cache configured by LLM_CACHE_PATH, or None when it is disabled or cannot be opened."""
+        if not LLM_CACHE_PATH:
+            return None
+        try:
+            return cls(LLM_CACHE_PATH)
+        except (OSError, sqlite3.Error) as e:
+            print(f"Warning: LLM completion cache disabled ({LLM_CACHE_PATH}): {e}")
+            return None
+
+    def get(self, key):
+        """The recorded [(offset_seconds, chunk), ...] for key, or None on a miss."""
+        now = time.time()
+        with self._lock:
+            row = self._db.execute("SELECT chunks, created FROM completions WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            if now - row[1] > self.max_age_seconds:
+                self._db.execute("DELETE FROM completions WHERE key = ?", (key,))
+                self.misses += 1
+                self.evicted += 1
+                return None
+            self._db.execute("UPDATE completions SET last_used = ?, hits = hits + 1 WHERE key = ?", (now, key))
+            self.hits += 1
+        return [tuple(chunk) for chunk in json.loads(row[0])]
+
+    def put(self, key, model, chunks):
+        """Stores a complete stream, then evicts expired and least recently used entries."""
+        data = json.dumps(chunks, ensure_ascii=False)
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO completions (key, model, chunks, size, created, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, model, data, len(data.encode("utf-8")), now, now),
+            )
+            self.stored += 1
+            self._evict(now)
+
+    def _evict(self, now):
+        expired = self._db.execute("DELETE FROM completions WHERE created < ?", (now - self.max_age_seconds,))
+        self.evicted += max(expired.rowcount, 0)
+        total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM completions").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        victims = []
+        for key, size in self._db.execute("SELECT key, size FROM completions ORDER BY last_used"):
+            if total <= self.max_bytes:
+                break
+            victims.append((key,))
+            total -= size
+        self._db.execute("BEGIN")
+        self._db.executemany("DELETE FROM completions WHERE key = ?", victims)
+        self._db.execute("COMMIT")
+        self.evicted += len(victims)
+
+    def stats(self):
+        with self._lock:
+            entries, size = self._db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM completions").fetchone()
+        return {
+            "entries": entries,
+            "bytes": size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "bypassed": self.bypassed,
+            "stored": self.stored,
+            "evicted": self.evicted,
+        }
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    # --- Streaming wrappers ---
+    def stream(self, model, template, params, inputs, generate):
+        """
+        Sync chunk iterator for one request: replays a cached completion, or runs generate()
+        (a sync chunk iterator), records it and stores it once it finished without error.
+        """
+        if is_sampled(params):
+            self.bypassed += 1
+            yield from generate()
+            return
+        key = completion_key(model, template, params, inputs)
+        cached = self.get(key)
+        if cached is not None:
+            start = time.perf_counter()
+            for offset, chunk in cached:
+                if self.replay_speed > 0:
+                    delay = start + offset / self.replay_speed - time.perf_counter()
+                    if delay > 0:
+                        time.sleep(delay)
+                yield chunk
+            return
+        start = time.perf_counter()
+        chunks = []
+        for chunk in generate():
+            chunks.append((round(time.perf_counter() - start, 4), chunk))
+            yield chunk
+        if chunks:
+            self.put(key, model, chunks)
+
+    async def astream(self, model, template, params, inputs, generate):
+        """
+        Async counterpart of stream(): generate() returns an async chunk iterator. The
+        SQLite reads and writes run in a worker thread. A stream closed part way (client
+        gone, upstream error) is not stored.
+        """
+        if is_sampled(params):
+            self.bypassed += 1
+            stream = generate()
+            try:
+                async for chunk in stream:
+                    yield chunk
+            finally:
+                await _aclose(stream)
+            return
+        key = completion_key(model, template, params, inputs)
+        cached = await asyncio.to_thread(self.get, key)
+        if cached is not None:
+            start = time.perf_counter()
+            for offset, chunk in cached:
+                if self.replay_speed > 0:
+                    delay = start + offset / self.replay_speed - time.perf_counter()
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+                yield chunk
+            return
+        start = time.perf_counter()
+        chunks = []
+        stream = generate()
+        try:
+            async for chunk in stream:
+                chunks.append((round(time.perf_counter() - start, 4), chunk))
+                yield chunk
+        finally:
+            await _aclose(stream)
+        if chunks:
+            await asyncio.to_thread(self.put, key, model, chunks)
+
+
+async def _aclose(stream):
+    aclose = getattr(stream, "aclose", None)
+    if aclose is not None:
+        await aclose()
@@ -0,0 +1,194 @@
+from collections import defaultdict, deque
+
+
+class ConceptGraphReport:
+    """Result of validating the concept DAG built from the YAML files."""
+
+    def __init__(self, order, cycles, dangling_requires, dangling_related, duplicates):
+        self.order = order                          # Concept names, prerequisites before dependents
+        self.cycles = cycles                        # Lists of concept names forming a REQUIRES cycle
+        self.dangling_requires = dangling_requires  # (concept_name, missing_prereq_name)
+        self.dangling_related = dangling_related    # (step_id, missing_concept_name)
+        self.duplicates = duplicates                # Concept names defined more than once
+
+    @property
+    def ok(self):
+        return not (self.cycles or self.dangling_requires or self.dangling_related or self.duplicates)
+
+    def print_summary(self):
+        """Prints every problem found, in the loader's warning format."""
+        for name in self.duplicates:
+            print(f"Warning: Concept '{name}' is defined more than once.")
+        for concept_name, prereq_name in self.dangling_requires:
+            print(f"Warning: Concept '{concept_name}' requires unknown concept '{prereq_name}'.")
+        for step_id, concept_name in self.dangling_related:
+            print(f"Warning: Related concept '{concept_name}' in step '{step_id}' not found.")
+        for cycle in self.cycles:
+            print("Warning: Prerequisite cycle:", " -> ".join(cycle + [cycle[0]]))
+
+
+def prerequisite_map(concepts):
+    """Returns {concept_name: [prerequisite names]} for the parsed concept list."""
+    requires = {}
+    for concept in concepts:
+        requires.setdefault(concept["name"], []).extend(concept.get("requires", []))
+    return requires
+
+
+def topological_order(requires):
+    """
+    Kahn's algorithm over {name: [prerequisites]}, ignoring unknown prerequisites.
+    Returns (order, remaining) where remaining holds the names that sit on or behind a cycle.
+    Ties keep the input order, so an acyclic YAML tree loads in a stable order.
+    """
+    indegree = {name: 0 for name in requires}
+    dependents = defaultdict(list)
+    for name, prereqs in requires.items():
+        for prereq in set(prereqs):
+            if prereq in indegree:
+                indegree[name] += 1
+                dependents[prereq].append(name)
+
+    queue = deque(name for name, degree in indegree.items() if degree == 0)
+    order = []
+    while queue:
+        name = queue.popleft()
+        order.append(name)
+        for dependent in dependents[name]:
+            indegree[dependent] -= 1
+            if indegree[dependent] == 0:
+                queue.append(dependent)
+    remaining = [name for name, degree in indegree.items() if degree > 0]
+    return order, remaining
+
+
+def find_cycles(requires, candidates):
+    """Returns one cycle (as a list of names) per strongly connected group reachable among candidates."""
+    candidate_set = set(candidates)
+    state = {}  # name -> 1 while on the DFS stack, 2 when finished
+    cycles = []
+    for root in candidates:
+        if root in state:
+            continue
+        stack = [(root, iter(requires.get(root, [])))]
+        path = [root]
+        state[root] = 1
+        while stack:
+            name, prereqs = stack[-1]
+            for prereq in prereqs:
+                if prereq not in candidate_set:
+                    continue
+                if state.get(prereq) == 1:
+                    cycles.append(path[path.index(prereq):])
+                elif prereq not in state:
+                    state[prereq] = 1
+                    stack.append((prereq, iter(requires.get(prereq, []))))
+                    path.append(prereq)
+                    break
+            else:
+                state[name] = 2
+                stack.pop()
+                path.pop()
+    return cycles
+
+
+def validate_concept_graph(concepts, solutions, step_ids):
+    """
+    Builds the concept DAG in memory and checks it in one linear pass.
+    step_ids is a callable (solution, step) -> step id used in the report.
+    """
+    seen = set()
+    duplicates = []
+    for concept in concepts:
+        if concept["name"] in seen:
+            duplicates.append(concept["name"])
+        seen.add(concept["name"])
+
+    requires = prerequisite_map(concepts)
+    dangling_requires = [
+        (name, prereq)
+        for name, prereqs in requires.items()
+        for prereq in prereqs
+        if prereq not in requires
+    ]
+    dangling_related = [
+        (step_ids(solution, step), concept_name)
+        for solution in solutions
+        for step in solution.get("steps", [])
+        for concept_name in step.get("related_concepts", [])
+        if concept_name not in requires
+    ]
+
+    order, remaining = topological_order(requires)
+    cycles = find_cycles(requires, remaining) if remaining else []
+    # Concepts stuck behind a cycle are still loaded, after everything else.
+    order.extend(remaining)
+    return ConceptGraphReport(order, cycles, dangling_requires, dangling_related, duplicates)
+
+
+class PrerequisiteClosure:
+    """
+    Transitive closure of REQUIRES as one bitset (a Python int) per concept.
+    Bit positions follow the topological order, so reading the set bits from low to high
+    yields a learning path with every prerequisite before the concepts built on it.
+    """
+
+    def __init__(self, requires, problem_concepts=None):
+        order, remaining = topological_order(requires)
+        self.names = order + remaining
+        self.positions = {name: i for i, name in enumerate(self.names)}
+        self.closures = [0] * len(self.names)
+        for name in order:
+            bits = 1 << self.positions[name]
+            for prereq in requires[name]:
+                if prereq in self.positions:
+                    bits |= self.closures[self.positions[prereq]]
+            self.closures[self.positions[name]] = bits
+        # Concepts on or behind a cycle: iterate to a fixpoint instead of a single pass.
+        changed = bool(remaining)
+        while changed:
+            changed = False
+            for name in remaining:
+                i = self.positions[name]
+                bits = self.closures[i] | (1 << i)
+                for prereq in requires[name]:
+                    if prereq in self.positions:
+                        bits |= self.closures[self.positions[prereq]]
+                if bits != self.closures[i]:
+                    self.closures[i] = bits
+                    changed = True
+        self.problem_concepts = {
+            problem_id: [name for name in names if name in self.positions]
+            for problem_id, names in (problem_concepts or {}).items()
+        }
+        self.paths = {}  # Memoized learning paths; the closure never changes after construction
+
+    def path(self, bits):
+        """Concept names for the set bits, in learning order."""
+        names = []
+        while bits:
+            low = bits & -bits
+            names.append(self.names[low.bit_length() - 1])
+            bits ^= low
+        return names
+
+    def concept_closure(self, name):
+        """Learning path ending in the concept, or None for an unknown concept."""
+        i = self.positions.get(name)
+        if i is None:
+            return None
+        if ("concept", name) not in self.paths:
+            self.paths[("concept", name)] = self.path(self.closures[i])
+        return list(self.paths[("concept", name)])
+
+    def problem_prerequisites(self, problem_id):
+        """Learning path covering every concept applied in the problem's solutions, or None."""
+        names = self.problem_concepts.get(problem_id)
+        if names is None:
+            return None
+        if ("problem", problem_id) not in self.paths:
+            bits = 0
+            for name in names:
+                bits |= self.closures[self.positions[name]]
+            self.paths[("problem", problem_id)] = self.path(bits)
+        return list(self.paths[("problem", problem_id)])
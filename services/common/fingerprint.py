@@ -0,0 +1,47 @@
+import hashlib
+import re
+import unicodedata
+
+# Superscript digits would otherwise be folded into plain digits by NFKC (x² -> x2).
+SUPERSCRIPTS = str.maketrans({
+    "⁰": "^0", "¹": "^1", "²": "^2", "³": "^3", "⁴": "^4",
+    "⁵": "^5", "⁶": "^6", "⁷": "^7", "⁸": "^8", "⁹": "^9",
+})
+
+# Unicode and LaTeX spellings of the same operator, mapped to one ASCII form.
+SYMBOLS = [
+    (re.compile(r"\\(?:times|cdot)(?![a-zA-Z])|[×·⋅∙]"), "*"),
+    (re.compile(r"\\div(?![a-zA-Z])|÷"), "/"),
+    (re.compile(r"\\sqrt(?![a-zA-Z])|√"), "sqrt"),
+    (re.compile(r"\\(?:leqslant|leq|le)(?![a-zA-Z])|≤"), "<="),
+    (re.compile(r"\\(?:geqslant|geq|ge)(?![a-zA-Z])|≥"), ">="),
+    (re.compile(r"\\(?:neq|ne)(?![a-zA-Z])|≠"), "!="),
+    (re.compile(r"\\pi(?![a-zA-Z])|π"), "pi"),
+    (re.compile(r"[−–—]"), "-"),
+    (re.compile(r"\\frac\s*\{([^{}]*)\}\s*\{([^{}]*)\}"), r"(\1)/(\2)"),
+]
+
+# Delimiters and spacing commands that do not change the problem.
+LATEX_NOISE = re.compile(r"\\[()\[\]]|\$|\\left(?![a-zA-Z])|\\right(?![a-zA-Z])|\\[,;:! ]|[{}]")
+SPACE_AROUND_SYMBOL = re.compile(r"\s*([^\w\s])\s*")
+TRAILING_PUNCTUATION = re.compile(r"[.?!\s]+$")
+
+
+def canonical_problem_text(text: str) -> str:
+    """
+    Canonical form of a problem text: LaTeX delimiters dropped, operators unified,
+    Unicode NFKC-normalized, casefolded, and whitespace only kept between words.
+    """
+    text = text.translate(SUPERSCRIPTS)
+    for pattern, replacement in SYMBOLS:
+        text = pattern.sub(replacement, text)
+    text = LATEX_NOISE.sub("", text)
+    text = unicodedata.normalize("NFKC", text).casefold()
+    text = " ".join(text.split())
+    text = SPACE_AROUND_SYMBOL.sub(r"\1", text)
+    return TRAILING_PUNCTUATION.sub("", text)
+
+
+def problem_fingerprint(text: str) -> str:
+    """Hex SHA-1 of the canonical problem text; stored and indexed as Problem.fingerprint."""
+    return hashlib.sha1(canonical_problem_text(text).encode("utf-8")).hexdigest()
@@ -0,0 +1,88 @@
+import gzip
+import json
+
+# Exported node labels with their natural key, in import order.
+NODE_KEYS = [
+    ("Concept", "name"),
+    ("Problem", "id"),
+    ("Solution", "id"),
+    ("Step", "id"),
+]
+# Exported relationship types with their (start, end) labels; edges are stored as key pairs.
+RELATIONSHIPS = [
+    ("REQUIRES", "Concept", "Concept"),
+    ("HAS_SOLUTION", "Problem", "Solution"),
+    ("HAS_STEP", "Solution", "Step"),
+    ("APPLIES_CONCEPT", "Step", "Concept"),
+]
+FORMAT = "math-tutor-graph"
+FORMAT_VERSION = 1
+
+
+# --- Records ---
+# A graph export is a stream of records: one header, every node once, then every edge
+# as a pair of node keys. Writers and readers work one record at a time, so memory
+# stays constant regardless of graph size.
+
+def header_record():
+    return {"type": "header", "format": FORMAT, "version": FORMAT_VERSION}
+
+def node_record(label, key, properties):
+    return {"type": "node", "label": label, "key": key, "properties": properties}
+
+def relationship_record(rel_type, start, end):
+    return {"type": "relationship", "rel": rel_type, "start": start, "end": end}
+
+
+# --- NDJSON (one JSON object per line) ---
+
+def ndjson_line(record):
+    return json.dumps(record, ensure_ascii=False, default=str) + "\n"
+
+
+# --- Compact snapshot ---
+# Gzipped lines of JSON arrays: nodes drop the label-implied key name and edges drop
+# the type-implied labels, e.g. ["n", "Concept", {...}] and ["r", "REQUIRES", "A", "B"].
+
+def compact_record(record):
+    if record["type"] == "node":
+        return ["n", record["label"], record["properties"]]
+    if record["type"] == "relationship":
+        return ["r", record["rel"], record["start"], record["end"]]
+    return record
+
+def expand_record(line):
+    """Inverse of compact_record."""
+    if isinstance(line, dict):
+        return line
+    if line[0] == "n":
+        label, properties = line[1], line[2]
+        return node_record(label, properties[dict(NODE_KEYS)[label]], properties)
+    return relationship_record(line[1], line[2], line[3])
+
+def snapshot_line(record):
+    return json.dumps(compact_record(record), ensure_ascii=False, separators=(",", ":"), default=str) + "\n"
+
+def open_snapshot(path, mode="wt"):
+    return gzip.open(path, mode, encoding="utf-8", compresslevel=6)
+
+
+def read_records(path):
+    """
+    Yields the records of an NDJSON export or a compact snapshot (detected by the gzip
+    magic bytes), validating the header first.
+    """
+    with open(path, "rb") as raw:
+        compressed = raw.read(2) == b"\x1f\x8b"
+    with (open_snapshot(path, "rt") if compressed else open(path, "r", encoding="utf-8")) as file:
+        header = None
+        for line in file:
+            if not line.strip():
+                continue
+            record = expand_record(json.loads(line))
+            if header is None:
+                header = record
+                if header.get("format") != FORMAT or header.get("version") != FORMAT_VERSION:
+                    raise ValueError(f"{path} is not a version {FORMAT_VERSION} {FORMAT} export")
+                continue
+            yield record
@@ -0,0 +1,163 @@
+import argparse
+import bisect
+import hashlib
+import marshal
+import os
+import sys
+from array import array
+
+from graph_export import NODE_KEYS, RELATIONSHIPS, read_records
+
+# A compiled snapshot is MAGIC followed by one marshal payload:
+#   values         every distinct property value once (strings are interned on load)
+#   labels         per label, nodes sorted by key, one array of value indexes per property
+#   relationships  per type, forward and reverse adjacency in CSR form (offsets + targets)
+MAGIC = b"MTKGSNP1"
+MISSING = 0xFFFFFFFF  # Value index of an absent property
+
+
+def _index_array(values=()):
+    return array("I", values)
+
+
+def _csr(pairs, count):
+    """Packs (source, target) index pairs into CSR offsets/targets arrays."""
+    adjacency = [[] for _ in range(count)]
+    for source, target in pairs:
+        adjacency[source].append(target)
+    offsets, targets = _index_array([0]), _index_array()
+    for neighbors in adjacency:
+        targets.extend(sorted(neighbors))
+        offsets.append(len(targets))
+    return offsets.tobytes(), targets.tobytes()
+
+
+def compile_snapshot(records, path):
+    """
+    Compiles graph export records (see graph_export) into a binary snapshot at path.
+    The file is written next to path and renamed over it, so readers never see a partial snapshot.
+    Returns the snapshot's version string.
+    """
+    keys = dict(NODE_KEYS)
+    nodes = {label: {} for label in keys}
+    edges = {rel_type: [] for rel_type, _, _ in RELATIONSHIPS}
+    for record in records:
+        if record["type"] == "node" and record["label"] in nodes:
+            nodes[record["label"]][record["key"]] = record["properties"]
+        elif record["type"] == "relationship" and record["rel"] in edges:
+            edges[record["rel"]].append((record["start"], record["end"]))
+
+    values, value_ids = [], {}
+    def value_id(value):
+        if value is None:
+            return MISSING
+        token = (type(value).__name__, repr(value))
+        if token not in value_ids:
+            value_ids[token] = len(values)
+            values.append(value)
+        return value_ids[token]
+
+    labels, positions = {}, {}
+    for label, by_key in nodes.items():
+        ordered = sorted(by_key)
+        positions[label] = {key: i for i, key in enumerate(ordered)}
+        properties = sorted({name for props in by_key.values() for name in props})
+        labels[label] = {
+            "count": len(ordered),
+            "columns": {
+                name: _index_array(value_id(by_key[key].get(name)) for key in ordered).tobytes()
+                for name in properties
+            },
+        }
+
+    relationships = {}
+    for rel_type, start_label, end_label in RELATIONSHIPS:
+        pairs = [
+            (positions[start_label][start], positions[end_label][end])
+            for start, end in edges[rel_type]
+            if start in positions[start_label] and end in positions[end_label]
+        ]
+        forward = _csr(pairs, labels[start_label]["count"])
+        reverse = _csr([(end, start) for start, end in pairs], labels[end_label]["count"])
+        relationships[rel_type] = {"forward": forward, "reverse": reverse}
+
+    payload = MAGIC + marshal.dumps({"values": values, "labels": labels, "relationships": relationships})
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as file:
+        file.write(payload)
+    os.replace(tmp_path, path)
+    return hashlib.sha1(payload).hexdigest()[:16]
+
+
+class LabelTable:
+    """The nodes of one label: property columns plus a key -> position index."""
+
+    def __init__(self, label, table, values):
+        self.label = label
+        self.count = table["count"]
+        self.values = values
+        self.columns = {name: array("I", data) for name, data in table["columns"].items()}
+        key_column = self.columns.get(dict(NODE_KEYS)[label], _index_array())
+        self.keys = [values[i] for i in key_column]  # Sorted, for keyset paging with bisect
+        self.positions = {key: i for i, key in enumerate(self.keys)}
+
+    def value(self, name, position):
+        column = self.columns.get(name)
+        if column is None or column[position] == MISSING:
+            return None
+        return self.values[column[position]]
+
+    def node(self, position, fields=None):
+        """Properties of the node at position as a dict, limited to fields when given."""
+        names = self.columns if fields is None else [name for name in fields if name in self.columns]
+        node = {}
+        for name in names:
+            index = self.columns[name][position]
+            if index != MISSING:
+                node[name] = self.values[index]
+        return node
+
+    def after(self, cursor):
+        """First position whose key sorts after cursor (or 0 without a cursor)."""
+        return 0 if cursor is None else bisect.bisect_right(self.keys, cursor)
+
+
+class GraphSnapshot:
+    """Read-only, in-process copy of the knowledge graph loaded from a compiled snapshot."""
+
+    def __init__(self, data):
+        if not data.startswith(MAGIC):
+            raise ValueError("Not a compiled knowledge graph snapshot")
+        payload = marshal.loads(data[len(MAGIC):])
+        self.version = hashlib.sha1(data).hexdigest()[:16]
+        values = [sys.intern(value) if isinstance(value, str) else value for value in payload["values"]]
+        self.labels = {label: LabelTable(label, table, values) for label, table in payload["labels"].items()}
+        self.relationships = {
+            rel_type: {direction: (array("I", offsets), array("I", targets))
+                       for direction, (offsets, targets) in adjacency.items()}
+            for rel_type, adjacency in payload["relationships"].items()
+        }
+        problems = self.labels["Problem"]
+        self.problem_by_fingerprint = {
+            problems.value("fingerprint", i): i for i in range(problems.count)
+            if problems.value("fingerprint", i) is not None
+        }
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "rb") as file:
+            return cls(file.read())
+
+    def neighbors(self, rel_type, position, reverse=False):
+        """Positions adjacent to position over rel_type (incoming edges when reverse)."""
+        offsets, targets = self.relationships[rel_type]["reverse" if reverse else "forward"]
+        return targets[offsets[position]:offsets[position + 1]]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compile an NDJSON export or snapshot into a binary KG snapshot.")
+    parser.add_argument("export", help="Output of load_data.py --export or --snapshot")
+    parser.add_argument("output", help="Binary snapshot to write")
+    args = parser.parse_args()
+    version = compile_snapshot(read_records(args.export), args.output)
+    print(f"Compiled {args.output} (version {version}, {os.path.getsize(args.output)} bytes)")
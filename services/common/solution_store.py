@@ -0,0 +1,100 @@
+import json
+
+# Batched write of generated solutions; every statement UNWINDs the whole batch.
+# Problems are merged on their fingerprint so a solution generated for a reformatted
+# YAML problem attaches to that problem instead of creating a duplicate.
+STORE_PROBLEMS_QUERY = """
+    UNWIND $rows AS row
+    MERGE (p:Problem {fingerprint: row.fingerprint})
+    ON CREATE SET p.id = row.id, p.text = row.text, p.difficulty = row.difficulty, p.generated = true
+"""
+STORE_SOLUTIONS_QUERY = """
+    UNWIND $rows AS row
+    MATCH (p:Problem {fingerprint: row.fingerprint})
+    MERGE (s:Solution {id: row.id})
+    SET s.problem_id = p.id, s.source = row.source, s.date = row.date, s.text = row.text,
+        s.generated = true
+    MERGE (p)-[:HAS_SOLUTION]->(s)
+"""
+STORE_STEPS_QUERY = """
+    UNWIND $rows AS row
+    MATCH (s:Solution {id: row.solution_id})
+    MERGE (st:Step {id: row.id})
+    SET st.step_explanation = row.step_explanation,
+        st.math_transformation = row.math_transformation,
+        st.related_concept = row.related_concept,
+        st.step_number = row.step_number,
+        st.generated = true
+    MERGE (s)-[:HAS_STEP]->(st)
+"""
+STORE_APPLIES_CONCEPT_QUERY = """
+    UNWIND $rows AS row
+    MATCH (st:Step {id: row.step_id}), (c:Concept {name: row.concept_name})
+    MERGE (st)-[:APPLIES_CONCEPT]->(c)
+"""
+# Ids already taken by a problem with another fingerprint: MERGE on the fingerprint would
+# create a second Problem with that id and fail the whole transaction on the id constraint.
+CONFLICTING_PROBLEM_IDS_QUERY = """
+    UNWIND $rows AS row
+    MATCH (p:Problem {id: row.id})
+    WHERE coalesce(p.fingerprint, '') <> row.fingerprint
+    RETURN row.id AS id
+"""
+# Every write to the graph replaces the version token readers use for cache validation.
+BUMP_GRAPH_VERSION_QUERY = """
+    MERGE (m:GraphMeta {id: 'graph'})
+    SET m.version = randomUUID(), m.updated_at = datetime()
+"""
+
+
+def solution_rows(items):
+    """
+    Flattens [{"problem": {...}, "solution": {...}}] into parameter rows per statement.
+    Problems need id, text, difficulty and fingerprint; solutions need id, source, date,
+    and optionally text and steps in the solutions.yaml step format.
+    """
+    rows = {"problems": [], "solutions": [], "steps": [], "applies_concept": []}
+    for item in items:
+        problem, solution = item["problem"], item["solution"]
+        rows["problems"].append({
+            "id": problem["id"],
+            "text": problem["text"],
+            "difficulty": problem.get("difficulty"),
+            "fingerprint": problem["fingerprint"],
+        })
+        rows["solutions"].append({
+            "id": solution["id"],
+            "fingerprint": problem["fingerprint"],
+            "source": solution["source"],
+            "date": solution["date"],
+            "text": solution.get("text"),
+        })
+        for step in solution.get("steps", []):
+            step_id = step.get("id") or f"{solution['id']}_step_{step['step_number']}"
+            rows["steps"].append({
+                "id": step_id,
+                "solution_id": solution["id"],
+                "step_explanation": step["step_explanation"],
+                "math_transformation": step["math_transformation"],
+                "related_concept": json.dumps(step.get("related_concepts", [])),
+                "step_number": step["step_number"],
+            })
+            for concept_name in step.get("related_concepts", []):
+                rows["applies_concept"].append({"step_id": step_id, "concept_name": concept_name})
+    return rows
+
+
+def conflicting_problem_ids(tx, problems):
+    """Transaction function returning the ids of problems ({"id", "fingerprint"}) taken by another problem."""
+    rows = [{"id": problem["id"], "fingerprint": problem["fingerprint"]} for problem in problems]
+    return {record["id"] for record in tx.run(CONFLICTING_PROBLEM_IDS_QUERY, rows=rows)}
+
+
+def store_solutions(tx, items):
+    """Transaction function writing a batch of generated solutions with four UNWIND statements."""
+    rows = solution_rows(items)
+    tx.run(STORE_PROBLEMS_QUERY, rows=rows["problems"]).consume()
+    tx.run(STORE_SOLUTIONS_QUERY, rows=rows["solutions"]).consume()
+    tx.run(STORE_STEPS_QUERY, rows=rows["steps"]).consume()
+    tx.run(STORE_APPLIES_CONCEPT_QUERY, rows=rows["applies_concept"]).consume()
+    tx.run(BUMP_GRAPH_VERSION_QUERY).consume()
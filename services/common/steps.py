@@ -0,0 +1,105 @@
+import re
+
+# "Step1", "Step 2:", "**Step 3.**", "### Step 4 -" at the start of a line.
+STEP_HEADING = re.compile(
+    r"^[ \t]*(?:#{1,6}[ \t]*)?(?:\*\*|__)?[ \t]*step[ \t]*(\d+)[ \t]*(?:\*\*|__)?[ \t]*[:.)\-–]?[ \t]*(?:\*\*|__)?",
+    re.IGNORECASE | re.MULTILINE,
+)
+DISPLAY_MATH = re.compile(r"\\\[(.+?)\\\]|\$\$(.+?)\$\$", re.DOTALL)
+
+
+def split_step_body(body: str):
+    """
+    Splits the text of one step into (step_explanation, math_transformation).
+    Display math blocks form the transformation; without any, lines containing '=' do.
+    """
+    blocks = [(a or b).strip() for a, b in DISPLAY_MATH.findall(body)]
+    prose = DISPLAY_MATH.sub(" ", body)
+    if not blocks:
+        lines = [line.strip() for line in prose.splitlines()]
+        blocks = [line for line in lines if "=" in line]
+        prose = "\n".join(line for line in lines if "=" not in line)
+    explanation = " ".join(prose.split())
+    return explanation, "; ".join(blocks)
+
+
+def build_step(step_number: int, body: str, heading: str = ""):
+    """Step dict in the solutions.yaml format, plus the raw markdown of the step as "text"."""
+    explanation, transformation = split_step_body(body)
+    return {
+        "step_number": step_number,
+        "step_explanation": explanation,
+        "math_transformation": transformation,
+        "related_concepts": [],
+        "text": (heading + body).strip(),
+    }
+
+
+class StepParser:
+    """
+    Incremental splitter for a streamed "Step1, Step2, ..." solution.
+    feed() takes chunks as they arrive and returns the steps completed by them: a step is
+    complete as soon as the next step heading has arrived. close() returns the last step.
+    Only whole lines are matched against the heading pattern, so a heading split across
+    chunks ("Ste" + "p 2:") is still recognized.
+    """
+
+    def __init__(self):
+        self._partial_line = ""
+        self._step_number = None
+        self._heading = ""
+        self._body = []
+        self._preamble = []
+        self.steps = []
+
+    def _finish_step(self):
+        if self._step_number is None:
+            return []
+        step = build_step(self._step_number, "".join(self._body), self._heading)
+        self.steps.append(step)
+        return [step]
+
+    def _process_line(self, line):
+        match = STEP_HEADING.match(line)
+        if not match:
+            (self._body if self._step_number is not None else self._preamble).append(line)
+            return []
+        completed = self._finish_step()
+        self._step_number = int(match.group(1))
+        self._heading = line[:match.end()]
+        self._body = [line[match.end():]]
+        return completed
+
+    def feed(self, chunk: str):
+        """Consumes a chunk of streamed text; returns the list of steps it completed."""
+        lines = (self._partial_line + chunk).split("\n")
+        self._partial_line = lines.pop()
+        completed = []
+        for line in lines:
+            completed.extend(self._process_line(line + "\n"))
+        return completed
+
+    def close(self):
+        """Flushes the end of the stream; returns the remaining step(s)."""
+        completed = []
+        if self._partial_line:
+            completed.extend(self._process_line(self._partial_line))
+            self._partial_line = ""
+        if self._step_number is None and self._preamble:
+            # No headings at all: the whole text is a single step.
+            self._step_number = 1
+            self._body = self._preamble
+        completed.extend(self._finish_step())
+        self._step_number = None
+        return completed
+
+
+def split_steps(text: str):
+    """
+    Splits a complete "Step1, Step2, ..." solution into steps in the solutions.yaml format.
+    Text before the first step heading is ignored; a text without headings is one step.
+    """
+    parser = StepParser()
+    parser.feed(text)
+    parser.close()
+    return parser.steps
@@ -0,0 +1,153 @@
+import contextvars
+import logging
+import os
+import time
+import uuid
+from contextlib import contextmanager
+
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+from starlette.responses import Response
+
+# Request correlation, per-stage timing spans and Prometheus metrics shared by the gateway
+# and the engine. Recording a span costs one histogram observation (a few microseconds);
+# the per-span log line is only formatted when DEBUG logging is enabled.
+REQUEST_ID_HEADER = "x-request-id"
+SLOW_REQUEST_SECONDS = float(os.getenv("SLOW_REQUEST_SECONDS", "30"))
+
+logger = logging.getLogger("telemetry")
+
+request_id_var = contextvars.ContextVar("request_id", default=None)
+spans_var = contextvars.ContextVar("spans", default=None)
+
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+RATE_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds", "Time until the response body is complete",
+    ["handler", "method", "status"], buckets=LATENCY_BUCKETS,
+)
+STAGE_SECONDS = Histogram("stage_duration_seconds", "Duration of one request stage", ["stage"], buckets=LATENCY_BUCKETS)
+STREAM_FIRST_CHUNK_SECONDS = Histogram(
+    "stream_first_chunk_seconds", "Time to the first chunk of a stream (TTFT for LLM streams)",
+    ["stream"], buckets=LATENCY_BUCKETS,
+)
+STREAM_CHUNK_RATE = Histogram(
+    "stream_chunks_per_second", "Chunks per second after the first one (tokens/sec for LLM streams)",
+    ["stream"], buckets=RATE_BUCKETS,
+)
+STREAM_CHUNKS = Counter("stream_chunks_total", "Chunks received", ["stream"])
+STREAMS_IN_FLIGHT = Gauge("streams_in_flight", "Streams currently open", ["stream"])
+STREAM_ERRORS = Counter("stream_errors_total", "Streams that failed part way", ["stream"])
+UPSTREAM_ERRORS = Counter("upstream_errors_total", "Failed calls to another service", ["upstream", "reason"])
+
+
+def current_request_id():
+    return request_id_var.get()
+
+
+def record_span(stage, seconds):
+    STAGE_SECONDS.labels(stage).observe(seconds)
+    spans = spans_var.get()
+    if spans is not None:
+        spans.append((stage, seconds))
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("request_id=%s stage=%s duration_ms=%.1f", request_id_var.get(), stage, seconds * 1000)
+
+
+@contextmanager
+def span(stage):
+    """Times the enclosed block as one stage of the current request."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_span(stage, time.perf_counter() - start)
+
+
+async def instrument_stream(stream, name):
+    """
+    Wraps an async chunk iterator: records the time to first chunk, the chunk rate after it,
+    the number of open streams and failures, plus `<name>_first_chunk` and `<name>_stream` spans.
+    """
+    start = time.perf_counter()
+    first_chunk_at = None
+    chunks = 0
+    in_flight = STREAMS_IN_FLIGHT.labels(name)
+    in_flight.inc()
+    try:
+        async for chunk in stream:
+            if first_chunk_at is None:
+                first_chunk_at = time.perf_counter()
+                STREAM_FIRST_CHUNK_SECONDS.labels(name).observe(first_chunk_at - start)
+                record_span(f"{name}_first_chunk", first_chunk_at - start)
+            chunks += 1
+            yield chunk
+    except Exception:
+        STREAM_ERRORS.labels(name).inc()
+        raise
+    finally:
+        in_flight.dec()
+        end = time.perf_counter()
+        record_span(f"{name}_stream", end - start)
+        STREAM_CHUNKS.labels(name).inc(chunks)
+        if chunks > 1 and end > first_chunk_at:
+            STREAM_CHUNK_RATE.labels(name).observe((chunks - 1) / (end - first_chunk_at))
+        aclose = getattr(stream, "aclose", None)
+        if aclose is not None:
+            await aclose()
+
+
+def _incoming_request_id(scope):
+    for name, value in scope.get("headers", []):
+        if name == b"x-request-id":
+            value = value.decode("latin-1")
+            if 0 < len(value) <= 128 and value.isprintable():
+                return value
+    return None
+
+
+class TelemetryMiddleware:
+    """
+    ASGI middleware: adopts the caller's X-Request-ID (or creates one), echoes it on the
+    response, collects the request's spans and observes the HTTP latency histogram once
+    the body is complete, so streamed responses are measured end to end.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        request_id = _incoming_request_id(scope) or uuid.uuid4().hex
+        request_token = request_id_var.set(request_id)
+        spans = []
+        spans_token = spans_var.set(spans)
+        status = 500
+        start = time.perf_counter()
+
+        async def send_with_request_id(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message["headers"] = list(message.get("headers", [])) + [(b"x-request-id", request_id.encode("latin-1"))]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_request_id)
+        finally:
+            elapsed = time.perf_counter() - start
+            handler = getattr(scope.get("endpoint"), "__name__", "unmatched")
+            HTTP_REQUEST_SECONDS.labels(handler, scope["method"], str(status)).observe(elapsed)
+            if elapsed >= SLOW_REQUEST_SECONDS:
+                breakdown = ", ".join(f"{stage}={seconds * 1000:.0f}ms" for stage, seconds in spans)
+                logger.warning("Slow request %s %s %s took %.1fs: %s",
+                               request_id, scope["method"], scope["path"], elapsed, breakdown)
+            request_id_var.reset(request_token)
+            spans_var.reset(spans_token)
+
+
+def metrics_response():
+    """Prometheus text exposition of every metric in this process."""
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
@@ -1,17 +1,36 @@
+from collections import defaultdict
 from neo4j import GraphDatabase
+import argparse
+import hashlib
 import yaml
 import json
 import os
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "common"))
+from concept_graph import validate_concept_graph
+from annotator import ConceptAnnotator
+from solution_store import BUMP_GRAPH_VERSION_QUERY
+from fingerprint import problem_fingerprint
+from graph_export import (
+    NODE_KEYS, RELATIONSHIPS, header_record, node_record, relationship_record,
+    ndjson_line, snapshot_line, open_snapshot, read_records,
+)
+from snapshot import compile_snapshot
 
 # Neo4j connection details
-NEO4J_URI = "bolt://localhost:7687"
-NEO4J_USER = "neo4j"
-NEO4J_PASSWORD = "password"
+NEO4J_URI = os.getenv("NEO4J_URI", "bolt://localhost:7687")
+NEO4J_USER = os.getenv("NEO4J_USER", "neo4j")
+NEO4J_PASSWORD = os.getenv("NEO4J_PASSWORD", "password")
 
 # Configure the data directory (adjust path as needed)
 DATA_SUBDIR = "knowledge_graph"  # Main directory containing YAML files
 BASE_DIR = os.path.join(os.path.dirname(__file__), "..", "..", "data", DATA_SUBDIR)
 
+# Number of rows sent per UNWIND statement in bulk mode
+DEFAULT_BATCH_SIZE = 1000
+
 def load_yaml(filepath):
     """Load a YAML file and return its contents."""
     if not os.path.exists(filepath):
@@ -19,43 +38,337 @@ def load_yaml(filepath):
     with open(filepath, "r") as file:
         return yaml.safe_load(file)
 
-# --- Load Concepts from BASE_DIR/concepts in alphabetical order ---
-concepts_dir = os.path.join(BASE_DIR, "concepts")
-data_concepts = []
-if os.path.isdir(concepts_dir):
-    for filename in sorted(os.listdir(concepts_dir)):  # Process files in alphabetical order
-        if filename.endswith(".yaml"):
-            filepath = os.path.join(concepts_dir, filename)
-            data = load_yaml(filepath)
-            if "concepts" in data:
-                data_concepts.extend(data["concepts"])
-else:
-    print("Warning: Concepts directory not found.")
-
-# --- Load Problems and Solutions from BASE_DIR ---
-data_problems = load_yaml(os.path.join(BASE_DIR, "problems.yaml"))
-data_solutions = load_yaml(os.path.join(BASE_DIR, "solutions.yaml"))
+def load_graph_data(base_dir=BASE_DIR):
+    """Reads the YAML files and returns (concepts, problems, solutions) as lists."""
+    # --- Load Concepts from base_dir/concepts in alphabetical order ---
+    concepts_dir = os.path.join(base_dir, "concepts")
+    data_concepts = []
+    if os.path.isdir(concepts_dir):
+        for filename in sorted(os.listdir(concepts_dir)):  # Process files in alphabetical order
+            if filename.endswith(".yaml"):
+                filepath = os.path.join(concepts_dir, filename)
+                data = load_yaml(filepath)
+                if "concepts" in data:
+                    data_concepts.extend(data["concepts"])
+    else:
+        print("Warning: Concepts directory not found.")
+
+    # --- Load Problems and Solutions from base_dir ---
+    data_problems = load_yaml(os.path.join(base_dir, "problems.yaml"))
+    data_solutions = load_yaml(os.path.join(base_dir, "solutions.yaml"))
+    return data_concepts, data_problems.get("problems", []), data_solutions.get("solutions", [])
+
+def solution_id(solution):
+    """Return the solution id, generating it from problem_id, source and date if not provided."""
+    sol_id = solution.get("id")
+    if not sol_id:
+        sol_id = f"{solution['problem_id']}_{solution['source'].replace(' ', '_')}_{solution['date']}"
+    return sol_id
+
+def step_id(sol_id, step):
+    """Return the step id, generating it from the solution id and step number if not provided."""
+    return step.get("id") or sol_id + "_step_" + str(step["step_number"])
+
+def duplicate_problem_fingerprints(problems):
+    """Returns [(problem_id, other_problem_id)] for problems whose texts share a fingerprint."""
+    seen = {}
+    duplicates = []
+    for problem in problems:
+        fingerprint = problem_fingerprint(problem["text"])
+        if fingerprint in seen:
+            duplicates.append((problem["id"], seen[fingerprint]))
+        else:
+            seen[fingerprint] = problem["id"]
+    return duplicates
+
+def order_concepts(concepts, order):
+    """Returns the concepts sorted by the given list of names (duplicates keep their relative order)."""
+    by_name = defaultdict(list)
+    for concept in concepts:
+        by_name[concept["name"]].append(concept)
+    return [concept for name in order for concept in by_name[name]]
+
+def content_hash(row):
+    """Stable hash of a row's properties, used by sync mode to detect changed entities."""
+    payload = json.dumps(row, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+def batched(rows, batch_size):
+    """Yield consecutive slices of at most batch_size rows."""
+    for start in range(0, len(rows), batch_size):
+        yield rows[start:start + batch_size]
+
+# --- Bulk load queries (one UNWIND statement per batch) ---
+BULK_CONCEPTS_QUERY = """
+    UNWIND $rows AS row
+    MERGE (c:Concept {name: row.name})
+    SET c.description = row.description, c.example = row.example, c.content_hash = row.content_hash
+"""
+BULK_REQUIRES_QUERY = """
+    UNWIND $rows AS row
+    MATCH (c:Concept {name: row.concept_name}), (pr:Concept {name: row.prereq_name})
+    MERGE (c)-[:REQUIRES]->(pr)
+"""
+BULK_PROBLEMS_QUERY = """
+    UNWIND $rows AS row
+    MERGE (p:Problem {id: row.id})
+    SET p.text = row.text, p.difficulty = row.difficulty, p.fingerprint = row.fingerprint,
+        p.content_hash = row.content_hash
+"""
+BULK_SOLUTIONS_QUERY = """
+    UNWIND $rows AS row
+    MERGE (s:Solution {id: row.id})
+    SET s.problem_id = row.problem_id, s.source = row.source, s.date = row.date,
+        s.content_hash = row.content_hash
+    WITH s, row
+    MATCH (p:Problem {id: row.problem_id})
+    MERGE (p)-[:HAS_SOLUTION]->(s)
+"""
+BULK_STEPS_QUERY = """
+    UNWIND $rows AS row
+    MERGE (st:Step {id: row.id})
+    SET st.step_explanation = row.step_explanation,
+        st.math_transformation = row.math_transformation,
+        st.related_concept = row.related_concept,
+        st.step_number = row.step_number,
+        st.content_hash = row.content_hash
+    WITH st, row
+    MATCH (s:Solution {id: row.solution_id})
+    MERGE (s)-[:HAS_STEP]->(st)
+"""
+BULK_APPLIES_CONCEPT_QUERY = """
+    UNWIND $rows AS row
+    MATCH (st:Step {id: row.step_id}), (c:Concept {name: row.concept_name})
+    MERGE (st)-[:APPLIES_CONCEPT]->(c)
+"""
+
+# --- Sync queries (only run for entities whose content hash changed) ---
+SYNC_RESET_REQUIRES_QUERY = """
+    UNWIND $rows AS row
+    MATCH (c:Concept {name: row.name})-[old:REQUIRES]->()
+    DELETE old
+"""
+# A solution written back by the gateway may have created a generated Problem with the
+# fingerprint of a problem that is now added to (or reworded in) the YAML files. Merging on
+# id would then create a second node with that fingerprint, so the YAML problem takes over
+# the generated node instead: folded into the YAML node when it already exists, adopted
+# under the YAML id otherwise. Its generated solutions stay attached either way.
+SYNC_FOLD_GENERATED_PROBLEMS_QUERY = """
+    UNWIND $rows AS row
+    MATCH (p:Problem {id: row.id}), (g:Problem {fingerprint: row.fingerprint})
+    WHERE g <> p AND coalesce(g.generated, false)
+    OPTIONAL MATCH (g)-[:HAS_SOLUTION]->(s:Solution)
+    FOREACH (solution IN CASE WHEN s IS NULL THEN [] ELSE [s] END |
+        MERGE (p)-[:HAS_SOLUTION]->(solution)
+        SET solution.problem_id = p.id)
+    WITH DISTINCT g
+    DETACH DELETE g
+"""
+SYNC_ADOPT_GENERATED_PROBLEMS_QUERY = """
+    UNWIND $rows AS row
+    MATCH (g:Problem {fingerprint: row.fingerprint})
+    WHERE coalesce(g.generated, false) AND NOT EXISTS { MATCH (:Problem {id: row.id}) }
+    SET g.id = row.id
+    REMOVE g.generated
+    WITH g
+    OPTIONAL MATCH (g)-[:HAS_SOLUTION]->(s:Solution)
+    SET s.problem_id = g.id
+"""
+# A problem removed from the YAML files that still has generated solutions is handed over
+# to the generated content instead of being deleted, so those solutions are not orphaned.
+SYNC_DELETE_PROBLEMS_QUERY = """
+    UNWIND $keys AS key
+    MATCH (p:Problem {id: key})
+    OPTIONAL MATCH (p)-[:HAS_SOLUTION]->(s:Solution)
+    WHERE coalesce(s.generated, false)
+    WITH p, count(s) AS generated_solutions
+    FOREACH (_ IN CASE WHEN generated_solutions > 0 THEN [1] ELSE [] END |
+        SET p.generated = true
+        REMOVE p.content_hash)
+    WITH p, generated_solutions
+    WHERE generated_solutions = 0
+    DETACH DELETE p
+"""
+SYNC_PROBLEM_LINKS_QUERY = """
+    UNWIND $rows AS row
+    MATCH (p:Problem {id: row.id}), (s:Solution {problem_id: row.id})
+    MERGE (p)-[:HAS_SOLUTION]->(s)
+"""
+SYNC_RESET_HAS_SOLUTION_QUERY = """
+    UNWIND $rows AS row
+    MATCH ()-[old:HAS_SOLUTION]->(s:Solution {id: row.id})
+    DELETE old
+"""
+SYNC_SOLUTION_LINKS_QUERY = """
+    UNWIND $rows AS row
+    UNWIND row.step_ids AS step_id
+    MATCH (s:Solution {id: row.id}), (st:Step {id: step_id})
+    MERGE (s)-[:HAS_STEP]->(st)
+"""
+SYNC_RESET_HAS_STEP_QUERY = """
+    UNWIND $rows AS row
+    MATCH ()-[old:HAS_STEP]->(st:Step {id: row.id})
+    DELETE old
+"""
+SYNC_RESET_APPLIES_CONCEPT_QUERY = """
+    UNWIND $rows AS row
+    MATCH (st:Step {id: row.id})-[old:APPLIES_CONCEPT]->()
+    DELETE old
+"""
+
+COUNT_GENERATED_SOLUTIONS_QUERY = "MATCH (s:Solution) WHERE coalesce(s.generated, false) RETURN count(s) AS count"
+
+# Label -> (key property, bulk row phase), in the order entities are deleted during sync
+SYNC_ENTITIES = [
+    ("Step", "id", "steps"),
+    ("Solution", "id", "solutions"),
+    ("Problem", "id", "problems"),
+    ("Concept", "name", "concepts"),
+]
+
+def build_bulk_rows(concepts, problems, solutions):
+    """
+    Flattens the parsed YAML into one list of parameter rows per load phase.
+    Links to unknown concepts are dropped here; validate_concept_graph has already reported them.
+    """
+    concept_names = {concept["name"] for concept in concepts}
+    rows = {
+        "concepts": [],
+        "requires": [],
+        "problems": [],
+        "solutions": [],
+        "steps": [],
+        "applies_concept": [],
+    }
+    for concept in concepts:
+        rows["concepts"].append({
+            "name": concept["name"],
+            "description": concept.get("description", ""),
+            "example": concept.get("example", ""),
+        })
+        for prereq in concept.get("requires", []):
+            if prereq in concept_names:
+                rows["requires"].append({"concept_name": concept["name"], "prereq_name": prereq})
+
+    for problem in problems:
+        rows["problems"].append({
+            "id": problem["id"],
+            "text": problem["text"],
+            "fingerprint": problem_fingerprint(problem["text"]),
+            "difficulty": problem["difficulty"],
+        })
+
+    for solution in solutions:
+        sol_id = solution_id(solution)
+        rows["solutions"].append({
+            "id": sol_id,
+            "problem_id": solution["problem_id"],
+            "source": solution["source"],
+            "date": solution["date"],
+        })
+        for step in solution.get("steps", []):
+            st_id = step_id(sol_id, step)
+            rows["steps"].append({
+                "id": st_id,
+                "solution_id": sol_id,
+                "step_explanation": step["step_explanation"],
+                "math_transformation": step["math_transformation"],
+                "related_concept": json.dumps(step["related_concepts"]),
+                "step_number": step["step_number"],
+            })
+            for concept_name in step.get("related_concepts", []):
+                if concept_name in concept_names:
+                    rows["applies_concept"].append({"step_id": st_id, "concept_name": concept_name})
+    attach_content_hashes(rows)
+    return rows
+
+def attach_content_hashes(rows):
+    """
+    Sets content_hash on every node row. The hash also covers the node's outgoing links,
+    so adding or removing a link marks the owning node as changed.
+    """
+    requires = defaultdict(list)
+    for row in rows["requires"]:
+        requires[row["concept_name"]].append(row["prereq_name"])
+    applies = defaultdict(list)
+    for row in rows["applies_concept"]:
+        applies[row["step_id"]].append(row["concept_name"])
+    step_ids = defaultdict(list)
+    for row in rows["steps"]:
+        step_ids[row["solution_id"]].append(row["id"])
+
+    for row in rows["concepts"]:
+        row["content_hash"] = content_hash(dict(row, requires=sorted(requires[row["name"]])))
+    for row in rows["problems"]:
+        row["content_hash"] = content_hash(row)
+    for row in rows["solutions"]:
+        row["step_ids"] = sorted(step_ids[row["id"]])
+        row["content_hash"] = content_hash(row)
+    for row in rows["steps"]:
+        row["content_hash"] = content_hash(dict(row, concepts=sorted(applies[row["id"]])))
+
+def yaml_records(rows):
+    """
+    Yields export records for the bulk rows, with the node properties the bulk load would
+    store, so a snapshot can be compiled from the YAML files without Neo4j.
+    """
+    yield header_record()
+    for row in rows["concepts"]:
+        yield node_record("Concept", row["name"], row)
+    for row in rows["problems"]:
+        yield node_record("Problem", row["id"], row)
+    for row in rows["solutions"]:
+        yield node_record("Solution", row["id"], {k: v for k, v in row.items() if k != "step_ids"})
+    for row in rows["steps"]:
+        yield node_record("Step", row["id"], {k: v for k, v in row.items() if k != "solution_id"})
+    for row in rows["requires"]:
+        yield relationship_record("REQUIRES", row["concept_name"], row["prereq_name"])
+    for row in rows["solutions"]:
+        yield relationship_record("HAS_SOLUTION", row["problem_id"], row["id"])
+    for row in rows["steps"]:
+        yield relationship_record("HAS_STEP", row["solution_id"], row["id"])
+    for row in rows["applies_concept"]:
+        yield relationship_record("APPLIES_CONCEPT", row["step_id"], row["concept_name"])
 
 class KnowledgeGraph:
-    def __init__(self, uri, user, password):
+    def __init__(self, uri, user, password, concepts=(), problems=(), solutions=()):
         self.driver = GraphDatabase.driver(uri, auth=(user, password))
+        # Parsed YAML data written by insert_data, insert_data_bulk and sync_data
+        self.concepts = list(concepts)
+        self.problems = list(problems)
+        self.solutions = list(solutions)
     
     def close(self):
         self.driver.close()
     
+    def count_generated_solutions(self):
+        """Number of solutions written back by the gateway (not part of the YAML files)."""
+        with self.driver.session() as session:
+            return session.execute_read(lambda tx: tx.run(COUNT_GENERATED_SOLUTIONS_QUERY).single()["count"])
+
     def clear_database(self):
-        """Deletes all nodes and relationships from the Neo4j database."""
+        """Deletes all nodes and relationships from the Neo4j database, generated solutions included."""
         with self.driver.session() as session:
             session.run("MATCH (n) DETACH DELETE n")
         print("✅ Previous data erased from Neo4j.")
     
+    def bump_graph_version(self):
+        """Replaces the graph version token so gateway caches revalidate."""
+        with self.driver.session() as session:
+            session.execute_write(lambda tx: tx.run(BUMP_GRAPH_VERSION_QUERY).consume())
+
     def create_constraints(self):
         """Defines uniqueness constraints for better performance."""
         queries = [
             "CREATE CONSTRAINT IF NOT EXISTS FOR (c:Concept) REQUIRE c.name IS UNIQUE",
             "CREATE CONSTRAINT IF NOT EXISTS FOR (p:Problem) REQUIRE p.id IS UNIQUE",
+            # Canonical problem text hash; the gateway looks solutions up by it
+            "CREATE CONSTRAINT IF NOT EXISTS FOR (p:Problem) REQUIRE p.fingerprint IS UNIQUE",
             "CREATE CONSTRAINT IF NOT EXISTS FOR (s:Solution) REQUIRE s.id IS UNIQUE",
-            "CREATE CONSTRAINT IF NOT EXISTS FOR (st:Step) REQUIRE st.id IS UNIQUE"
+            "CREATE CONSTRAINT IF NOT EXISTS FOR (st:Step) REQUIRE st.id IS UNIQUE",
+            "CREATE CONSTRAINT IF NOT EXISTS FOR (m:GraphMeta) REQUIRE m.id IS UNIQUE",
+            # Used by sync mode to relink existing solutions to a re-created problem
+            "CREATE INDEX IF NOT EXISTS FOR (s:Solution) ON (s.problem_id)"
         ]
         with self.driver.session() as session:
             for query in queries:
@@ -63,94 +376,86 @@ class KnowledgeGraph:
     
     def insert_data(self):
         """Inserts concepts, problems, solutions, and steps into Neo4j."""
+        # The same content hashes as the bulk path, so a later --sync sees nothing changed.
+        rows = build_bulk_rows(self.concepts, self.problems, self.solutions)
+        hashes = {
+            phase: {row[key]: row["content_hash"] for row in rows[phase]}
+            for phase, key in (("concepts", "name"), ("problems", "id"), ("solutions", "id"), ("steps", "id"))
+        }
         with self.driver.session() as session:
-            pending_links = []  # List of (concept_name, prereq_name) that failed initially
+            pending_links = []  # List of (concept_name, prereq_name) whose prerequisite is written later
             
-            # --- Insert Concepts ---
-            for concept in data_concepts:
+            # --- Insert Concepts (in topological order, so prerequisites already exist) ---
+            concept_names = {concept["name"] for concept in self.concepts}
+            written = set()
+            for concept in self.concepts:
                 session.run(
                     """
                     MERGE (c:Concept {name: $name})
-                    SET c.description = $description, c.example = $example
+                    SET c.description = $description, c.example = $example, c.content_hash = $content_hash
                     """,
                     name=concept["name"],
                     description=concept.get("description", ""),
-                    example=concept.get("example", "")
+                    example=concept.get("example", ""),
+                    content_hash=hashes["concepts"][concept["name"]]
                 )
-                # Process prerequisites
+                written.add(concept["name"])
+                # Process prerequisites; unknown names were already reported by validation
                 for prereq in concept.get("requires", []):
-                    result = session.run(
-                        "MATCH (pr:Concept {name: $prereq_name}) RETURN pr",
-                        prereq_name=prereq
-                    )
-                    if result.single() is None:
-                        # Memorize this link for later
+                    if prereq not in concept_names:
+                        continue
+                    if prereq not in written:
+                        # Only possible on a prerequisite cycle; link once every concept exists
                         pending_links.append((concept["name"], prereq))
-                    else:
-                        session.run(
-                            """
-                            MATCH (c:Concept {name: $concept_name}), (pr:Concept {name: $prereq_name})
-                            MERGE (c)-[:REQUIRES]->(pr)
-                            """,
-                            concept_name=concept["name"],
-                            prereq_name=prereq
-                        )
-            # --- Reattempt pending prerequisite links ---
-            changed = True
-            while pending_links and changed:
-                new_pending = []
-                changed = False
-                for concept_name, prereq_name in pending_links:
-                    result = session.run(
-                        "MATCH (pr:Concept {name: $prereq_name}) RETURN pr",
-                        prereq_name=prereq_name
+                        continue
+                    session.run(
+                        """
+                        MATCH (c:Concept {name: $concept_name}), (pr:Concept {name: $prereq_name})
+                        MERGE (c)-[:REQUIRES]->(pr)
+                        """,
+                        concept_name=concept["name"],
+                        prereq_name=prereq
                     )
-                    if result.single() is None:
-                        new_pending.append((concept_name, prereq_name))
-                    else:
-                        session.run(
-                            """
-                            MATCH (c:Concept {name: $concept_name}), (pr:Concept {name: $prereq_name})
-                            MERGE (c)-[:REQUIRES]->(pr)
-                            """,
-                            concept_name=concept_name,
-                            prereq_name=prereq_name
-                        )
-                        changed = True
-                if len(new_pending) == len(pending_links):
-                    # No progress made in this pass; break out.
-                    break
-                pending_links = new_pending
-            if pending_links:
-                print("Warning: Some prerequisite links could not be added:", pending_links)
-            
+            for concept_name, prereq_name in pending_links:
+                session.run(
+                    """
+                    MATCH (c:Concept {name: $concept_name}), (pr:Concept {name: $prereq_name})
+                    MERGE (c)-[:REQUIRES]->(pr)
+                    """,
+                    concept_name=concept_name,
+                    prereq_name=prereq_name
+                )
+
             # --- Insert Problems ---
-            for problem in data_problems.get("problems", []):
+            for problem in self.problems:
                 session.run(
                     """
                     MERGE (p:Problem {id: $id})
-                    SET p.text = $text, p.difficulty = $difficulty
+                    SET p.text = $text, p.difficulty = $difficulty, p.fingerprint = $fingerprint,
+                        p.content_hash = $content_hash
                     """,
                     id=problem["id"],
                     text=problem["text"],
-                    difficulty=problem["difficulty"]
+                    fingerprint=problem_fingerprint(problem["text"]),
+                    difficulty=problem["difficulty"],
+                    content_hash=hashes["problems"][problem["id"]]
                 )
             
             # --- Insert Solutions & Their Steps ---
-            for solution in data_solutions.get("solutions", []):
+            for solution in self.solutions:
                 # Generate solution id based on problem_id, source, and date if not provided.
-                sol_id = solution.get("id")
-                if not sol_id:
-                    sol_id = f"{solution['problem_id']}_{solution['source'].replace(' ', '_')}_{solution['date']}"
+                sol_id = solution_id(solution)
                 session.run(
                     """
                     MERGE (s:Solution {id: $id})
-                    SET s.problem_id = $problem_id, s.source = $source, s.date = $date
+                    SET s.problem_id = $problem_id, s.source = $source, s.date = $date,
+                        s.content_hash = $content_hash
                     """,
                     id=sol_id,
                     problem_id=solution["problem_id"],
                     source=solution["source"],
-                    date=solution["date"]
+                    date=solution["date"],
+                    content_hash=hashes["solutions"][sol_id]
                 )
                 # Link solution to its problem
                 session.run(
@@ -163,22 +468,22 @@ class KnowledgeGraph:
                 )
                 # Process each step
                 for step in solution.get("steps", []):
-                    step_id = step.get("id")
-                    if not step_id:
-                        step_id = sol_id + "_step_" + str(step["step_number"])
+                    st_id = step_id(sol_id, step)
                     session.run(
                         """
                         MERGE (st:Step {id: $id})
                         SET st.step_explanation = $step_explanation,
                             st.math_transformation = $math_transformation,
                             st.related_concept = $related_concept,
-                            st.step_number = $step_number
+                            st.step_number = $step_number,
+                            st.content_hash = $content_hash
                         """,
-                        id=step_id,
+                        id=st_id,
                         step_explanation=step["step_explanation"],
                         math_transformation=step["math_transformation"],
                         related_concept=json.dumps(step["related_concepts"]),
-                        step_number=step["step_number"]
+                        step_number=step["step_number"],
+                        content_hash=hashes["steps"][st_id]
                     )
                     # Link step to its solution
                     session.run(
@@ -187,53 +492,318 @@ class KnowledgeGraph:
                         MERGE (s)-[:HAS_STEP]->(st)
                         """,
                         solution_id=sol_id,
-                        step_id=step_id
+                        step_id=st_id
                     )
-                    # Link step to each related concept
+                    # Link step to each known related concept
                     for concept_name in step.get("related_concepts", []):
-                        result = session.run(
-                            "MATCH (c:Concept {name: $concept_name}) RETURN c",
+                        if concept_name not in concept_names:
+                            continue
+                        session.run(
+                            """
+                            MATCH (st:Step {id: $step_id}), (c:Concept {name: $concept_name})
+                            MERGE (st)-[:APPLIES_CONCEPT]->(c)
+                            """,
+                            step_id=st_id,
                             concept_name=concept_name
                         )
-                        if result.single() is None:
-                            print(f"Warning: Related concept '{concept_name}' in step '{step_id}' not found.")
-                        else:
-                            session.run(
-                                """
-                                MATCH (st:Step {id: $step_id}), (c:Concept {name: $concept_name})
-                                MERGE (st)-[:APPLIES_CONCEPT]->(c)
-                                """,
-                                step_id=step_id,
-                                concept_name=concept_name
-                            )
     
-    def get_entire_graph(self):
-        """Fetches and returns all nodes and relationships from the graph."""
+    def insert_data_bulk(self, batch_size=DEFAULT_BATCH_SIZE):
+        """
+        Inserts the same data as insert_data, but groups every phase into UNWIND batches.
+        Each batch runs in its own explicit write transaction.
+        """
+        rows = build_bulk_rows(self.concepts, self.problems, self.solutions)
+        # Phases run in dependency order: nodes before the relationships that match them.
+        phases = [
+            ("concepts", BULK_CONCEPTS_QUERY),
+            ("requires", BULK_REQUIRES_QUERY),
+            ("problems", BULK_PROBLEMS_QUERY),
+            ("solutions", BULK_SOLUTIONS_QUERY),
+            ("steps", BULK_STEPS_QUERY),
+            ("applies_concept", BULK_APPLIES_CONCEPT_QUERY),
+        ]
+        total_start = time.perf_counter()
+        with self.driver.session() as session:
+            for phase, query in phases:
+                self._run_batches(session, phase, query, rows[phase], batch_size)
+        total_elapsed = time.perf_counter() - total_start
+        total_rows = sum(len(phase_rows) for phase_rows in rows.values())
+        print(f"Bulk load: {total_rows} rows in {total_elapsed:.2f}s")
+
+    def sync_data(self, batch_size=DEFAULT_BATCH_SIZE):
+        """
+        Brings Neo4j in line with the YAML files without clearing it.
+        Compares content hashes, upserts only new or changed entities and deletes removed ones,
+        all in a single write transaction so readers never see a partially loaded graph.
+        """
+        rows = build_bulk_rows(self.concepts, self.problems, self.solutions)
+        with self.driver.session() as session:
+            existing = {
+                label: session.execute_read(self._fetch_content_hashes, label, key)
+                for label, key, _ in SYNC_ENTITIES
+            }
+
+        upserts = {}
+        deletes = {}
+        for label, key, phase in SYNC_ENTITIES:
+            wanted = {row[key]: row for row in rows[phase]}
+            upserts[phase] = [
+                row for row_key, row in wanted.items()
+                if existing[label].get(row_key) != row["content_hash"]
+            ]
+            deletes[label] = [row_key for row_key in existing[label] if row_key not in wanted]
+            added = sum(1 for row in upserts[phase] if row[key] not in existing[label])
+            print(f"  {label}: +{added} ~{len(upserts[phase]) - added} -{len(deletes[label])}")
+
+        if not any(upserts.values()) and not any(deletes.values()):
+            print("Knowledge Graph already up to date.")
+            return
+
+        upserted_concepts = {row["name"] for row in upserts["concepts"]}
+        upserted_steps = {row["id"] for row in upserts["steps"]}
+        statements = [
+            (BULK_CONCEPTS_QUERY, upserts["concepts"]),
+            (SYNC_RESET_REQUIRES_QUERY, upserts["concepts"]),
+            (BULK_REQUIRES_QUERY, [row for row in rows["requires"] if row["concept_name"] in upserted_concepts]),
+            (SYNC_FOLD_GENERATED_PROBLEMS_QUERY, upserts["problems"]),
+            (SYNC_ADOPT_GENERATED_PROBLEMS_QUERY, upserts["problems"]),
+            (BULK_PROBLEMS_QUERY, upserts["problems"]),
+            (SYNC_PROBLEM_LINKS_QUERY, upserts["problems"]),
+            (SYNC_RESET_HAS_SOLUTION_QUERY, upserts["solutions"]),
+            (BULK_SOLUTIONS_QUERY, upserts["solutions"]),
+            (SYNC_SOLUTION_LINKS_QUERY, upserts["solutions"]),
+            (SYNC_RESET_HAS_STEP_QUERY, upserts["steps"]),
+            (SYNC_RESET_APPLIES_CONCEPT_QUERY, upserts["steps"]),
+            (BULK_STEPS_QUERY, upserts["steps"]),
+            (BULK_APPLIES_CONCEPT_QUERY, [row for row in rows["applies_concept"] if row["step_id"] in upserted_steps]),
+        ]
+
+        def apply_changes(tx):
+            for label, key, _ in SYNC_ENTITIES:
+                if label == "Problem":
+                    query = SYNC_DELETE_PROBLEMS_QUERY
+                else:
+                    query = f"UNWIND $keys AS key MATCH (n:{label} {{{key}: key}}) DETACH DELETE n"
+                for batch in batched(deletes[label], batch_size):
+                    tx.run(query, keys=batch).consume()
+            for query, statement_rows in statements:
+                for batch in batched(statement_rows, batch_size):
+                    tx.run(query, rows=batch).consume()
+            tx.run(BUMP_GRAPH_VERSION_QUERY).consume()
+
+        start = time.perf_counter()
+        with self.driver.session() as session:
+            session.execute_write(apply_changes)
+        print(f"Sync transaction committed in {time.perf_counter() - start:.2f}s")
+
+    @staticmethod
+    def _fetch_content_hashes(tx, label, key):
+        """Returns {key: content_hash} for every YAML-managed node with the given label."""
+        # Solutions written back by the gateway are not in the YAML files and must survive a sync.
+        result = tx.run(
+            f"MATCH (n:{label}) WHERE NOT coalesce(n.generated, false) "
+            f"RETURN n.{key} AS key, n.content_hash AS hash"
+        )
+        return {record["key"]: record["hash"] for record in result}
+
+    @staticmethod
+    def _run_batches(session, phase, query, rows, batch_size):
+        """Runs query once per batch of rows, each batch in an explicit transaction, and reports throughput."""
+        start = time.perf_counter()
+        for batch in batched(rows, batch_size):
+            session.execute_write(lambda tx: tx.run(query, rows=batch).consume())
+        elapsed = time.perf_counter() - start
+        rate = len(rows) / elapsed if elapsed > 0 else float("inf")
+        print(f"  {phase}: {len(rows)} rows in {elapsed:.2f}s ({rate:.0f} rows/s)")
+
+    def iter_graph(self):
+        """
+        Yields the whole graph as export records: every node once, then every edge as a
+        pair of node keys. Results are streamed from Neo4j, so memory stays constant.
+        """
+        keys = dict(NODE_KEYS)
+        yield header_record()
+        with self.driver.session() as session:
+            for label, key in NODE_KEYS:
+                result = session.run(f"MATCH (n:{label}) RETURN n.{key} AS key, properties(n) AS properties")
+                for record in result:
+                    yield node_record(label, record["key"], record["properties"])
+            for rel_type, start_label, end_label in RELATIONSHIPS:
+                result = session.run(
+                    f"MATCH (a:{start_label})-[:{rel_type}]->(b:{end_label}) "
+                    f"RETURN a.{keys[start_label]} AS start, b.{keys[end_label]} AS end"
+                )
+                for record in result:
+                    yield relationship_record(rel_type, record["start"], record["end"])
+
+    def export_graph(self, ndjson_path=None, snapshot_path=None):
+        """Streams the graph once into an NDJSON file and/or a compact gzipped snapshot."""
+        start = time.perf_counter()
+        ndjson_file = open(ndjson_path, "w", encoding="utf-8") if ndjson_path else None
+        snapshot_file = open_snapshot(snapshot_path) if snapshot_path else None
+        count = 0
+        try:
+            for record in self.iter_graph():
+                if ndjson_file:
+                    ndjson_file.write(ndjson_line(record))
+                if snapshot_file:
+                    snapshot_file.write(snapshot_line(record))
+                count += 1
+        finally:
+            for file in (ndjson_file, snapshot_file):
+                if file:
+                    file.close()
+        elapsed = time.perf_counter() - start
+        print(f"📦 Exported {count - 1} records in {elapsed:.2f}s")
+        for path in (ndjson_path, snapshot_path):
+            if path:
+                print(f"  {path}: {os.path.getsize(path)} bytes")
+
+    def import_graph(self, path, batch_size=DEFAULT_BATCH_SIZE):
+        """
+        Loads an NDJSON export or snapshot into an empty database with batched CREATE
+        statements (no MERGE lookups). Rows are buffered per label and relationship type,
+        so memory is bounded by the batch size rather than the graph size.
+        """
+        keys = dict(NODE_KEYS)
+        endpoints = {rel_type: (start_label, end_label) for rel_type, start_label, end_label in RELATIONSHIPS}
+        pending = defaultdict(list)
+        counts = defaultdict(int)
+
+        def flush(session, kind, name):
+            rows = pending.pop((kind, name), None)
+            if not rows:
+                return
+            if kind == "node":
+                query = f"UNWIND $rows AS row CREATE (n:{name}) SET n = row"
+            else:
+                start_label, end_label = endpoints[name]
+                query = (
+                    f"UNWIND $rows AS row "
+                    f"MATCH (a:{start_label} {{{keys[start_label]}: row[0]}}), (b:{end_label} {{{keys[end_label]}: row[1]}}) "
+                    f"CREATE (a)-[:{name}]->(b)"
+                )
+            session.execute_write(lambda tx: tx.run(query, rows=rows).consume())
+            counts[name] += len(rows)
+
+        start = time.perf_counter()
         with self.driver.session() as session:
-            result = session.run(
-                """
-                MATCH (n)
-                OPTIONAL MATCH (n)-[r]->(m)
-                RETURN n, r, m
-                """
-            )
-            graph_data = []
-            for record in result:
-                node1 = dict(record["n"]) if record["n"] else None
-                rel = record["r"].type if record["r"] else None
-                node2 = dict(record["m"]) if record["m"] else None
-                graph_data.append({"node1": node1, "relationship": rel, "node2": node2})
-            return graph_data
+            for record in read_records(path):
+                if record["type"] == "node":
+                    if record["label"] not in keys:
+                        print(f"Warning: Skipping node with unknown label '{record['label']}'.")
+                        continue
+                    bucket, row = ("node", record["label"]), record["properties"]
+                else:
+                    if record["rel"] not in endpoints:
+                        print(f"Warning: Skipping relationship with unknown type '{record['rel']}'.")
+                        continue
+                    # Exports list every node before the first edge; write them all before matching endpoints
+                    for label in [name for kind, name in pending if kind == "node"]:
+                        flush(session, "node", label)
+                    bucket, row = ("relationship", record["rel"]), [record["start"], record["end"]]
+                pending[bucket].append(row)
+                if len(pending[bucket]) >= batch_size:
+                    flush(session, *bucket)
+            for bucket in list(pending):
+                flush(session, *bucket)
+        elapsed = time.perf_counter() - start
+        for name, count in counts.items():
+            print(f"  {name}: {count}")
+        print(f"Imported {sum(counts.values())} records in {elapsed:.2f}s")
 
 # --- Main Execution ---
-kg = KnowledgeGraph(NEO4J_URI, NEO4J_USER, NEO4J_PASSWORD)
-kg.clear_database()         # Clear previous data
-kg.create_constraints()
-kg.insert_data()              # Insert all data from YAML files
-print("🚀 Knowledge Graph initialized with fresh data!")
+def main():
+    parser = argparse.ArgumentParser(description="Load the YAML knowledge graph into Neo4j.")
+    parser.add_argument("--bulk", action="store_true", help="Load with batched UNWIND transactions")
+    parser.add_argument("--sync", action="store_true",
+                        help="Apply only the differences between the YAML files and Neo4j instead of reloading")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="Rows per batch in bulk and sync mode")
+    parser.add_argument("--drop-generated", action="store_true",
+                        help="Allow a full reload to delete the solutions the gateway wrote back (--sync keeps them)")
+    parser.add_argument("--strict", action="store_true",
+                        help="Abort before touching Neo4j if the concept graph has cycles or dangling links")
+    parser.add_argument("--annotate", action="store_true",
+                        help="Tag steps without related_concepts using the local concept annotator")
+    parser.add_argument("--export", metavar="PATH", help="Stream the current graph to an NDJSON file and exit")
+    parser.add_argument("--snapshot", metavar="PATH", help="Stream the current graph to a compact gzipped snapshot and exit")
+    parser.add_argument("--import", dest="import_path", metavar="PATH",
+                        help="Replace the graph with an NDJSON export or snapshot and exit")
+    parser.add_argument("--compile-snapshot", metavar="PATH",
+                        help="Compile the YAML files into a binary snapshot for KG_BACKEND=memory and exit")
+    args = parser.parse_args()
+
+    if args.export or args.snapshot:
+        kg = KnowledgeGraph(NEO4J_URI, NEO4J_USER, NEO4J_PASSWORD)
+        kg.export_graph(ndjson_path=args.export, snapshot_path=args.snapshot)
+        kg.close()
+        return
+
+    if args.import_path:
+        kg = KnowledgeGraph(NEO4J_URI, NEO4J_USER, NEO4J_PASSWORD)
+        kg.create_constraints()
+        kg.clear_database()
+        kg.import_graph(args.import_path, batch_size=args.batch_size)
+        kg.bump_graph_version()
+        print("🚀 Knowledge Graph restored from", args.import_path)
+        kg.close()
+        return
+
+    data_concepts, data_problems, data_solutions = load_graph_data()
+
+    if args.annotate:
+        annotator = ConceptAnnotator(data_concepts)
+        for solution in data_solutions:
+            for step in solution.get("steps", []):
+                annotator.annotate_step(step)
+
+    # Validate the concept DAG in memory before any database work
+    report = validate_concept_graph(
+        data_concepts,
+        data_solutions,
+        lambda solution, step: step_id(solution_id(solution), step),
+    )
+    report.print_summary()
+    if not report.ok and args.strict:
+        sys.exit("❌ Concept graph validation failed (--strict); Neo4j was not modified.")
+    data_concepts = order_concepts(data_concepts, report.order)
+
+    # Problem.fingerprint is unique, so reformatted duplicates would fail halfway through the load
+    for problem_id, other_id in duplicate_problem_fingerprints(data_problems):
+        print(f"Error: Problem '{problem_id}' is a reformatted duplicate of '{other_id}'.")
+        sys.exit("❌ Duplicate problems found; Neo4j was not modified.")
+
+    if args.compile_snapshot:
+        rows = build_bulk_rows(data_concepts, data_problems, data_solutions)
+        version = compile_snapshot(yaml_records(rows), args.compile_snapshot)
+        print(f"📦 Compiled snapshot {args.compile_snapshot} (version {version})")
+        return
+
+    kg = KnowledgeGraph(NEO4J_URI, NEO4J_USER, NEO4J_PASSWORD, data_concepts, data_problems, data_solutions)
+    kg.create_constraints()
+    if args.sync:
+        kg.sync_data(batch_size=args.batch_size)
+        print("🔄 Knowledge Graph synchronized with the YAML files!")
+    else:
+        # A full reload starts from an empty graph; refuse to silently drop written-back solutions
+        generated = kg.count_generated_solutions()
+        if generated and not args.drop_generated:
+            kg.close()
+            sys.exit(f"❌ Neo4j holds {generated} generated solutions that a full reload would delete. "
+                     "Use --sync to keep them, or --drop-generated to reload anyway.")
+        kg.clear_database()         # Clear previous data
+        if args.bulk:
+            kg.insert_data_bulk(batch_size=args.batch_size)
+        else:
+            kg.insert_data()              # Insert all data from YAML files
+        kg.bump_graph_version()
+        print("🚀 Knowledge Graph initialized with fresh data!")
+
+    # Optionally, stream the entire graph to disk
+    #kg.export_graph(ndjson_path="graph.ndjson")
+
+    kg.close()
 
-# Optionally, fetch and display the entire graph
-graph = kg.get_entire_graph()
-#print(json.dumps(graph, indent=2))
 
-kg.close()
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "common"))
+from fingerprint import problem_fingerprint
+from steps import split_steps
+
+# Checkpoints requested over HTTP are confined to this directory.
+BATCH_CHECKPOINT_DIR = os.getenv("BATCH_CHECKPOINT_DIR", os.path.join(os.path.dirname(__file__), "checkpoints"))
+
+
+class RateLimiter:
+    """Spaces out request starts to at most rate_per_minute (0 disables the limit)."""
+
+    def __init__(self, rate_per_minute: float):
+        self.interval = 60.0 / rate_per_minute if rate_per_minute else 0.0
+        self._next_start = 0.0
+        self._lock = asyncio.Lock()
+
+    async def wait(self):
+        if not self.interval:
+            return
+        async with self._lock:
+            now = time.monotonic()
+            delay = self._next_start - now
+            self._next_start = max(now, self._next_start) + self.interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+class Checkpoint:
+    """Append-only JSONL record of finished problem ids, so an interrupted batch can resume."""
+
+    def __init__(self, path):
+        self.path = path
+        self.done = set()
+        if path and os.path.exists(path):
+            with open(path, "r") as file:
+                for line in file:
+                    if line.strip():
+                        self.done.add(json.loads(line)["problem_id"])
+
+    def record(self, event):
+        self.done.add(event["problem_id"])
+        if self.path:
+            with open(self.path, "a") as file:
+                file.write(json.dumps(event) + "\n")
+
+
+def checkpoint_path(name):
+    """Maps a checkpoint name from a request to a file inside BATCH_CHECKPOINT_DIR."""
+    os.makedirs(BATCH_CHECKPOINT_DIR, exist_ok=True)
+    return os.path.join(BATCH_CHECKPOINT_DIR, os.path.basename(name) + ".jsonl")
+
+
+def batch_solution_item(problem, solution_text, annotator=None):
+    """Builds the solution_store item for one pre-solved problem; steps are tagged when an annotator is given."""
+    date = datetime.date.today().isoformat()
+    solution_id = f"{problem['id']}_solution_engine_batch_{date}"
+    steps = split_steps(solution_text)
+    if annotator:
+        for step in steps:
+            annotator.annotate_step(step)
+    return {
+        "problem": {
+            "id": problem["id"],
+            "text": problem["text"],
+            "difficulty": problem.get("difficulty"),
+            "fingerprint": problem_fingerprint(problem["text"]),
+        },
+        "solution": {
+            "id": solution_id,
+            "source": "solution_engine_batch",
+            "date": date,
+            "text": solution_text,
+            "steps": steps,
+        },
+    }
+
+
+async def presolve(problems, generate, store, concurrency=4, rate_per_minute=0, checkpoint=None, annotator=None,
+                   find_conflicts=None):
+    """
+    Solves every problem not yet in the checkpoint and stores the structured results.
+    generate(text) is an async iterator of text chunks; store(items) is a blocking KG write.
+    find_conflicts(problems), also blocking, returns the ids already used in the KG by a
+    problem with another fingerprint; those problems fail up front instead of at write time.
+    Yields one progress event per problem, then a summary with throughput.
+    """
+    checkpoint = checkpoint or Checkpoint(None)
+    limiter = RateLimiter(rate_per_minute)
+    semaphore = asyncio.Semaphore(concurrency)
+    events = asyncio.Queue()
+    counts = {"solved": 0, "failed": 0, "skipped": 0}
+
+    conflicts = set()
+    if find_conflicts:
+        pending = [
+            {"id": problem["id"], "fingerprint": problem_fingerprint(problem["text"])}
+            for problem in problems if problem["id"] not in checkpoint.done
+        ]
+        try:
+            conflicts = await asyncio.to_thread(find_conflicts, pending) if pending else set()
+        except Exception as e:
+            print(f"Warning: Could not check problem ids against the KG: {e}")
+
+    async def solve_one(problem):
+        if problem["id"] in checkpoint.done:
+            counts["skipped"] += 1
+            await events.put({"problem_id": problem["id"], "status": "skipped"})
+            return
+        if problem["id"] in conflicts:
+            counts["failed"] += 1
+            await events.put({
+                "problem_id": problem["id"],
+                "status": "failed",
+                "error": f"Problem id {problem['id']} is already used by a different problem in the KG",
+            })
+            return
+        async with semaphore:
+            await limiter.wait()
+            start = time.perf_counter()
+            try:
+                text = "".join([chunk async for chunk in generate(problem["text"])])
+                item = batch_solution_item(problem, text, annotator)
+                await asyncio.to_thread(store, [item])
+            except Exception as e:
+                counts["failed"] += 1
+                await events.put({"problem_id": problem["id"], "status": "failed", "error": str(e)})
+                return
+            event = {
+                "problem_id": problem["id"],
+                "status": "solved",
+                "steps": len(item["solution"]["steps"]),
+                "seconds": round(time.perf_counter() - start, 2),
+            }
+            # The solution is stored either way; a checkpoint that cannot be written only
+            # means the problem is solved again on resume.
+            try:
+                checkpoint.record(event)
+            except Exception as e:
+                event["error"] = f"Could not write the checkpoint: {e}"
+            counts["solved"] += 1
+            await events.put(event)
+
+    start = time.perf_counter()
+    tasks = [asyncio.create_task(solve_one(problem)) for problem in problems]
+    try:
+        for _ in tasks:
+            yield await events.get()
+    finally:
+        for task in tasks:
+            task.cancel()
+    elapsed = time.perf_counter() - start
+    yield {
+        "summary": dict(
+            counts,
+            seconds=round(elapsed, 2),
+            problems_per_minute=round(counts["solved"] / elapsed * 60, 2) if elapsed else 0.0,
+        )
+    }
+
+
+# --- Overnight pre-warm: python batch.py --concurrency 4 --rpm 60 --checkpoint presolve.jsonl ---
+async def main():
+    import yaml
+    from solution_engine import (
+        generate_answer, store_batch_solutions, find_conflicting_problems, close_kg_driver, get_annotator,
+    )
+
+    parser = argparse.ArgumentParser(description="Pre-solve problems.yaml (symbolically or with the LLM) and store the solutions in the KG.")
+    parser.add_argument("--problems", default=os.path.join(os.path.dirname(__file__), "..", "..", "data",
+                                                            "knowledge_graph", "problems.yaml"))
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--rpm", type=float, default=0, help="Maximum requests per minute (0 = unlimited)")
+    parser.add_argument("--checkpoint", default="presolve_checkpoint.jsonl")
+    args = parser.parse_args()
+
+    with open(args.problems, "r") as file:
+        problems = yaml.safe_load(file).get("problems", [])
+    try:
+        async for event in presolve(problems, generate_answer, store_batch_solutions, args.concurrency,
+                                    args.rpm, Checkpoint(args.checkpoint), get_annotator(),
+                                    find_conflicting_problems):
+            print(json.dumps(event))
+    finally:
+        close_kg_driver()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
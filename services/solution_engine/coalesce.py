@@ -0,0 +1,101 @@
+import asyncio
+
+
+class InFlightGeneration:
+    """
+    One upstream generation shared by every request for the same problem.
+    Chunks are kept for the lifetime of the generation so late joiners first replay
+    what was already produced and then follow the live stream.
+    """
+
+    def __init__(self):
+        self.chunks = []
+        self.done = False
+        self.error = None
+        self.subscribers = 0
+        self.task = None
+        self._changed = asyncio.Condition()
+
+    async def publish(self, chunk):
+        async with self._changed:
+            self.chunks.append(chunk)
+            self._changed.notify_all()
+
+    async def finish(self, error=None):
+        async with self._changed:
+            self.done = True
+            self.error = error
+            self._changed.notify_all()
+
+    async def subscribe(self):
+        """Yields every chunk of the generation from the beginning."""
+        index = 0
+        while True:
+            while index < len(self.chunks):
+                yield self.chunks[index]
+                index += 1
+            if self.done:
+                if self.error:
+                    raise self.error
+                return
+            async with self._changed:
+                await self._changed.wait_for(lambda: self.done or len(self.chunks) > index)
+
+
+class GenerationCoalescer:
+    """
+    Single-flight layer in front of the LLM: the first request for a key drives the
+    generation, identical concurrent requests subscribe to the same token stream.
+    The generation is cancelled once its last subscriber disconnects.
+    """
+
+    def __init__(self, generate):
+        self.generate = generate  # generate(*args) -> async iterator of text chunks
+        self._in_flight = {}
+        self.started = 0
+        self.joined = 0
+
+    async def _drive(self, key, flight, args):
+        try:
+            async for chunk in self.generate(*args):
+                await flight.publish(chunk)
+            await flight.finish()
+        except asyncio.CancelledError:
+            await flight.finish(RuntimeError("Generation cancelled"))
+            raise
+        except Exception as e:
+            await flight.finish(e)
+        finally:
+            if self._in_flight.get(key) is flight:
+                del self._in_flight[key]
+
+    async def stream(self, key, *args):
+        """Async iterator over the generation for key, starting or joining it."""
+        flight = self._in_flight.get(key)
+        if flight is None:
+            flight = InFlightGeneration()
+            self._in_flight[key] = flight
+            flight.task = asyncio.create_task(self._drive(key, flight, args))
+            self.started += 1
+        else:
+            self.joined += 1
+        flight.subscribers += 1
+        try:
+            async for chunk in flight.subscribe():
+                yield chunk
+        finally:
+            flight.subscribers -= 1
+            if flight.subscribers == 0 and not flight.done:
+                # Forget the flight now, not when the task winds down, so an identical
+                # request arriving meanwhile starts a new generation instead of joining
+                # the cancelled one.
+                if self._in_flight.get(key) is flight:
+                    del self._in_flight[key]
+                flight.task.cancel()
+
+    def stats(self):
+        return {
+            "in_flight": len(self._in_flight),
+            "generations_started": self.started,
+            "requests_joined": self.joined,
+        }
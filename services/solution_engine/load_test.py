@@ -0,0 +1,81 @@
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import time
+
+import httpx
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "..", "benchmarks"))
+from drivers import unique_problem
+
+# Load test for the streaming /solve endpoint: fires `requests` solves at each concurrency
+# level and reports time-to-first-chunk, total latency and aggregate throughput.
+# If the engine serializes generations, wall time grows linearly with concurrency.
+# Every request sends its own word problem, so none is coalesced with another, answered
+# by the symbolic solver or replayed from the completion cache; --problem sends one text
+# to all requests instead, which measures those shortcuts rather than streaming.
+#
+#   python load_test.py --url http://localhost:8000/solve --concurrency 1,8,32,128
+
+
+async def one_solve(client, url, problem):
+    start = time.perf_counter()
+    first_chunk_at = None
+    chunks = 0
+    async with client.stream("POST", url, json={"problem": problem}) as response:
+        response.raise_for_status()
+        async for _ in response.aiter_text():
+            if first_chunk_at is None:
+                first_chunk_at = time.perf_counter()
+            chunks += 1
+    end = time.perf_counter()
+    return (first_chunk_at or end) - start, end - start, chunks
+
+
+async def run_level(url, problems, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(timeout=httpx.Timeout(300.0), limits=limits) as client:
+        async def bounded(problem):
+            async with semaphore:
+                return await one_solve(client, url, problem)
+
+        start = time.perf_counter()
+        results = await asyncio.gather(*(bounded(problem) for problem in problems), return_exceptions=True)
+        wall = time.perf_counter() - start
+
+    ok = [result for result in results if not isinstance(result, Exception)]
+    errors = len(results) - len(ok)
+    if not ok:
+        print(f"concurrency {concurrency:>4}: all {errors} requests failed ({results[0]!r})")
+        return
+    ttft = sorted(result[0] * 1000 for result in ok)
+    total = sorted(result[1] * 1000 for result in ok)
+    chunks = sum(result[2] for result in ok)
+    print(
+        f"concurrency {concurrency:>4} | {len(ok) / wall:7.2f} solves/s | {chunks / wall:9.1f} chunks/s | "
+        f"TTFT p50 {statistics.median(ttft):8.1f}ms p95 {ttft[int(len(ttft) * 0.95) - 1]:8.1f}ms | "
+        f"total p50 {statistics.median(total):8.1f}ms | wall {wall:6.2f}s | errors {errors}"
+    )
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Concurrent streaming load test for the solution engine.")
+    parser.add_argument("--url", default="http://localhost:8000/solve")
+    parser.add_argument("--problem", help="Send this one problem with every request (default: a distinct problem each)")
+    parser.add_argument("--concurrency", default="1,8,32,128", help="Comma-separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=0, help="Requests per level (default: 2 x concurrency)")
+    args = parser.parse_args()
+    rng = random.Random()  # Unseeded: a rerun must not find its problems already cached
+    for level in (int(value) for value in args.concurrency.split(",")):
+        requests = args.requests or 2 * level
+        problems = [args.problem or unique_problem(rng) for _ in range(requests)]
+        await run_level(args.url, problems, level)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
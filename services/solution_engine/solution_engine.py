@@ -1,47 +1,211 @@
 import os
-from fastapi import FastAPI, HTTPException
+import sys
+import json
+import threading
+from contextlib import asynccontextmanager
+from typing import List, Optional
+from fastapi import FastAPI, HTTPException, Response
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import StreamingResponse
+from prometheus_client import Counter
 from pydantic import BaseModel
-from langchain_openai import OpenAI  # LangChain's OpenAI wrapper
-from langchain_core.prompts import PromptTemplate
-from langchain.chains import LLMChain
 
-app = FastAPI(title="Solution Engine API using Custom Model via OpenAI with streaming", version="0.1")
+from coalesce import GenerationCoalescer
+from batch import Checkpoint, checkpoint_path, presolve
+from symbolic import solve_symbolic, warm_up as warm_up_symbolic
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "common"))
+from fingerprint import problem_fingerprint
+from solution_store import conflicting_problem_ids, store_solutions
+from steps import StepParser
+from annotator import ConceptAnnotator, DEFAULT_CONCEPTS_DIR
+from completion_cache import CompletionCache
+from telemetry import UPSTREAM_ERRORS, TelemetryMiddleware, instrument_stream, metrics_response, span
+
+@asynccontextmanager
+async def lifespan(app):
+    """
+    Builds the LLM chain, the annotator and the symbolic solver and opens the completion
+    cache before serving; closes the KG driver and the cache on shutdown.
+    """
+    global ready
+    try:
+        await run_in_threadpool(get_completion_cache)
+        await run_in_threadpool(get_chain)
+        await run_in_threadpool(get_annotator)
+        await run_in_threadpool(warm_up_symbolic)
+        ready = True
+    except Exception as e:
+        print(f"Warning: Solution engine warm-up failed: {e}")
+    yield
+    close_kg_driver()
+    if completion_cache is not None:
+        completion_cache.close()
+
+app = FastAPI(title="Solution Engine API using Custom Model via OpenAI with streaming", version="0.1",
+              lifespan=lifespan)
+app.add_middleware(TelemetryMiddleware)
+
+# Set once the warm-up built the chain and the annotator; reported by /ready.
+ready = False
+
+# Problems answered by the symbolic solver, by problem kind; "fallback" went to the LLM.
+SYMBOLIC_SOLVES = Counter("symbolic_solver_total", "Problems by symbolic solver outcome", ["kind"])
 
 # Retrieve configuration from environment variables or set defaults.
 openai_api_key = os.getenv("OPENAI_API_KEY",)
 base_url = os.getenv("HF_BASE_URL", "https://ta9u2hpk4yo4jiio.us-east-1.aws.endpoints.huggingface.cloud/v1/")
 model_name = os.getenv("MODEL_NAME", "mav23/Qwen2.5-Math-7B-Instruct-GGUF")
+# The client's default temperature unless LLM_TEMPERATURE is set; only unsampled requests
+# (LLM_TEMPERATURE=0) are served from the completion cache.
+LLM_PARAMS = {"max_tokens": 1500}
+if os.getenv("LLM_TEMPERATURE"):
+    LLM_PARAMS["temperature"] = float(os.getenv("LLM_TEMPERATURE"))
+PROMPT_TEMPLATE = "Solve with clear and rich explanation for a student, that has a serious backlog. In the form of steps: Step1, Step2... The problem: {problem}"
 
-# Initialize the LLM using LangChain's OpenAI wrapper.
-# Here, we pass additional parameters (top_p, temperature, etc.) as desired.
-llm = OpenAI(
-    model=model_name,
-    api_key=openai_api_key,
-    base_url=base_url,
-    # temperature=None,
-    # top_p=None,
-    max_tokens=1500,
-    stream=True,
-    # seed=None,
-    # stop=None,
-    # frequency_penalty=None,
-    # presence_penalty=None
-)
-
-# Define a prompt template that instructs the model to generate a step-by-step solution.
-prompt_template = PromptTemplate(
-    input_variables=["problem"],
-    template="Solve with clear and rich explanation for a student, that has a serious backlog. In the form of steps: Step1, Step2... The problem: {problem}"
-)
-
-# Create a chain by combining the prompt template with the LLM.
-chain = prompt_template | llm
+# Neo4j connection used to store batch pre-solve results.
+NEO4J_URI = os.getenv("NEO4J_URI", "bolt://localhost:7687")
+NEO4J_USER = os.getenv("NEO4J_USER", "neo4j")
+NEO4J_PASSWORD = os.getenv("NEO4J_PASSWORD", "password")
+kg_driver = None
+
+# The LLM chain and the annotator are built on first use (or by the lifespan warm-up),
+# so importing this module does not load LangChain or the concept YAML files.
+llm = None
+chain = None
+annotator = None
+# Persistent cache of completed generations (None when LLM_CACHE_PATH is empty).
+completion_cache = None
+completion_cache_opened = False
+init_lock = threading.Lock()
+
+def get_chain():
+    """Returns the prompt | LLM chain, building it on first use."""
+    global llm, chain
+    with init_lock:
+        if chain is None:
+            from langchain_openai import OpenAI  # LangChain's OpenAI wrapper
+            from langchain_core.prompts import PromptTemplate
+
+            # Initialize the LLM using LangChain's OpenAI wrapper.
+            # Here, we pass additional parameters (top_p, temperature, etc.) as desired.
+            llm = OpenAI(
+                model=model_name,
+                api_key=openai_api_key,
+                base_url=base_url,
+                # top_p=None,
+                **LLM_PARAMS,
+                stream=True,
+                # seed=None,
+                # stop=None,
+                # frequency_penalty=None,
+                # presence_penalty=None
+            )
+
+            # Define a prompt template that instructs the model to generate a step-by-step solution.
+            prompt_template = PromptTemplate(input_variables=["problem"], template=PROMPT_TEMPLATE)
+
+            # Create a chain by combining the prompt template with the LLM.
+            chain = prompt_template | llm
+    return chain
+
+def get_annotator():
+    """Local concept tagger for generated steps, built from the KG's concept YAML files on first use."""
+    global annotator
+    with init_lock:
+        if annotator is None:
+            annotator = ConceptAnnotator.from_yaml_dir(os.getenv("CONCEPTS_DIR", DEFAULT_CONCEPTS_DIR))
+    return annotator
+
+def get_completion_cache():
+    """The completion cache, opened on first use."""
+    global completion_cache, completion_cache_opened
+    with init_lock:
+        if not completion_cache_opened:
+            completion_cache = CompletionCache.from_env()
+            completion_cache_opened = True
+    return completion_cache
+
+def generate_solution(problem: str):
+    """
+    Async token stream for one upstream generation, measured for TTFT and tokens/sec.
+    A problem answered before is replayed from the completion cache instead.
+    """
+    inputs = {"problem": problem}
+    generate = lambda: instrument_stream(get_chain().astream(inputs), "llm")
+    cache = get_completion_cache()
+    if cache is None:
+        return generate()
+    return cache.astream(model_name, PROMPT_TEMPLATE, LLM_PARAMS, inputs, generate)
+
+# Identical problems solved at the same time share one generation (keyed by fingerprint).
+coalescer = GenerationCoalescer(generate_solution)
+
+def generate_coalesced(problem: str):
+    """Token stream that joins an identical generation already in flight."""
+    return coalescer.stream(problem_fingerprint(problem), problem)
+
+def solve_locally(problem: str):
+    """Exact solution from the symbolic solver, or None when the problem needs the LLM."""
+    with span("symbolic"):
+        solution = solve_symbolic(problem)
+    SYMBOLIC_SOLVES.labels(solution["kind"] if solution else "fallback").inc()
+    return solution
+
+async def stream_steps(steps):
+    """Streams a ready-made solution one step at a time, in the format the LLM streams."""
+    for step in steps:
+        yield step["text"] + "\n\n"
+
+async def generate_answer(problem: str):
+    """Token stream for a problem: the symbolic solver when it can answer, the LLM otherwise."""
+    # SymPy takes a few milliseconds on an equation; keep it off the event loop.
+    solution = await run_in_threadpool(solve_locally, problem)
+    stream = stream_steps(solution["steps"]) if solution is not None else generate_coalesced(problem)
+    try:
+        async for chunk in stream:
+            yield chunk
+    finally:
+        await stream.aclose()
+
+def get_kg_driver():
+    """The Neo4j driver for batch write-back, created on first use."""
+    global kg_driver
+    if kg_driver is None:
+        from neo4j import GraphDatabase
+        kg_driver = GraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USER, NEO4J_PASSWORD))
+    return kg_driver
+
+def store_batch_solutions(items):
+    """Writes pre-solved problems to the KG in one transaction."""
+    with get_kg_driver().session() as session:
+        session.execute_write(store_solutions, items)
+
+def find_conflicting_problems(problems):
+    """Ids of batch problems ({"id", "fingerprint"}) already used in the KG by a different problem."""
+    with get_kg_driver().session() as session:
+        return session.execute_read(conflicting_problem_ids, problems)
+
+def close_kg_driver():
+    if kg_driver is not None:
+        kg_driver.close()
 
 # Pydantic model for input validation.
 class ProblemRequest(BaseModel):
     problem: str
 
+class BatchProblem(BaseModel):
+    id: str
+    text: str
+    difficulty: Optional[str] = None
+
+class BatchRequest(BaseModel):
+    problems: List[BatchProblem]
+    concurrency: int = 4
+    requests_per_minute: float = 0
+    # Name of a checkpoint file in BATCH_CHECKPOINT_DIR; reusing it resumes the batch.
+    checkpoint: Optional[str] = None
+
 # @app.post("/solve")
 # def solve_problem(req: ProblemRequest):
 #     """
@@ -63,25 +227,146 @@ class ProblemRequest(BaseModel):
 async def solve_problem(req: ProblemRequest):
     """
     Endpoint to solve a math problem with streaming.
-    The endpoint uses LangChain to format the prompt and invoke the OpenAI client in streaming mode.
+    The endpoint uses LangChain's native async streaming (astream), so waiting for tokens
+    never blocks the event loop and one worker can serve many generations at once.
+    Concurrent requests for the same problem join the generation already in flight,
+    replaying the tokens produced so far before following the live stream.
+    Problems the symbolic solver handles (equations, LCM/GCD, percentages, prime
+    factorization) are answered locally without calling the LLM.
     The tokens (or text chunks) are streamed back as they are generated.
     """
+    stream = generate_answer(req.problem)
     try:
-        # For streaming, we assume that the chain.invoke() method supports a stream parameter.
-        # Depending on your LangChain version, you may need to call llm.invoke() directly.
-        # Here, we'll try using chain.invoke with stream=True.
-        generator = chain.invoke({"problem": req.problem}, stream=True)
-
-        async def stream_generator():
-            # If the generator yields dictionaries with a 'token' or 'text' field, adjust accordingly.
-            for chunk in generator:
-                # Here, we assume chunk is a string; if it's a dict, extract the content.
-                yield chunk
-
-        return StreamingResponse(stream_generator(), media_type="text/plain")
+        # Wait for the first chunk before sending headers, so upstream failures still map to a 500.
+        first_chunk = await stream.__anext__()
+    except StopAsyncIteration:
+        first_chunk = ""
     except Exception as e:
+        UPSTREAM_ERRORS.labels("llm", type(e).__name__).inc()
+        await stream.aclose()
         raise HTTPException(status_code=500, detail=str(e))
 
+    async def stream_generator():
+        # When the client disconnects, Starlette cancels this generator; closing the
+        # stream in finally aborts the upstream LLM request once no other client shares it.
+        try:
+            yield first_chunk
+            async for chunk in stream:
+                yield chunk
+        finally:
+            await stream.aclose()
+
+    return StreamingResponse(stream_generator(), media_type="text/plain")
+
+
+@app.post("/solve/steps")
+async def solve_problem_steps(req: ProblemRequest):
+    """
+    Endpoint to solve a math problem with structured streaming.
+    Emits NDJSON events: {"type": "token", "text"} for every chunk, {"type": "step", ...}
+    as soon as a step is complete (step_number, step_explanation, math_transformation,
+    related_concepts from the local annotator),
+    and {"type": "done", "steps": [...]} when generation ends, so no second LLM call is
+    needed to structure the solution. Symbolically solved problems emit the same events,
+    with related_concepts set by the solver.
+    """
+    solution = await run_in_threadpool(solve_locally, req.problem)
+    if solution is not None:
+        async def solved_stream():
+            for step in solution["steps"]:
+                yield json.dumps({"type": "token", "text": step["text"] + "\n\n"}) + "\n"
+                yield json.dumps(dict(step, type="step")) + "\n"
+            yield json.dumps({"type": "done", "steps": solution["steps"]}) + "\n"
+
+        return StreamingResponse(solved_stream(), media_type="application/x-ndjson")
+
+    stream = generate_coalesced(req.problem)
+
+    async def ndjson_stream():
+        parser = StepParser()
+        try:
+            async for chunk in stream:
+                yield json.dumps({"type": "token", "text": chunk}) + "\n"
+                for step in parser.feed(chunk):
+                    get_annotator().annotate_step(step)
+                    yield json.dumps(dict(step, type="step")) + "\n"
+        except Exception as e:
+            yield json.dumps({"type": "error", "detail": str(e)}) + "\n"
+            return
+        finally:
+            await stream.aclose()
+        for step in parser.close():
+            get_annotator().annotate_step(step)
+            yield json.dumps(dict(step, type="step")) + "\n"
+        yield json.dumps({"type": "done", "steps": parser.steps}) + "\n"
+
+    return StreamingResponse(ndjson_stream(), media_type="application/x-ndjson")
+
+
+@app.post("/solve/batch")
+async def solve_batch(req: BatchRequest):
+    """
+    Endpoint to pre-solve a set of problems and store the structured solutions in the KG.
+    Runs at most `concurrency` generations at once, rate limited to `requests_per_minute`,
+    and streams one NDJSON progress event per problem followed by a throughput summary.
+    """
+    checkpoint = Checkpoint(checkpoint_path(req.checkpoint) if req.checkpoint else None)
+    events = presolve(
+        [problem.model_dump() for problem in req.problems],
+        generate_answer,
+        store_batch_solutions,
+        concurrency=max(1, req.concurrency),
+        rate_per_minute=req.requests_per_minute,
+        checkpoint=checkpoint,
+        annotator=get_annotator(),
+        find_conflicts=find_conflicting_problems,
+    )
+
+    async def ndjson_stream():
+        async for event in events:
+            yield json.dumps(event) + "\n"
+
+    return StreamingResponse(ndjson_stream(), media_type="application/x-ndjson")
+
+
+@app.get("/ready")
+def readiness(response: Response):
+    """
+    Readiness probe: 200 once the LLM chain and the annotator are built, 503 before.
+    """
+    if not ready:
+        response.status_code = 503
+    return {"ready": ready}
+
+
+@app.get("/metrics")
+def metrics():
+    """
+    Endpoint exposing Prometheus metrics: HTTP latency, LLM time to first token,
+    tokens/sec, open generations and upstream errors.
+    """
+    return metrics_response()
+
+
+@app.get("/stats/coalescing")
+def coalescing_stats():
+    """
+    Endpoint exposing how many generations were started and how many requests joined one.
+    """
+    return coalescer.stats()
+
+
+@app.get("/stats/cache")
+def cache_stats():
+    """
+    Endpoint exposing the completion cache size and its hits, misses, bypassed (sampled)
+    requests and evictions.
+    """
+    cache = get_completion_cache()
+    if cache is None:
+        return {"enabled": False}
+    return dict(cache.stats(), enabled=True)
+
 
 # To run the server locally, use:
 # uvicorn solution_engine:app --host 0.0.0.0 --port 8000 --reload
@@ -0,0 +1,529 @@
+import argparse
+import math
+import os
+import re
+import statistics
+import sys
+import time
+from decimal import Decimal
+from fractions import Fraction
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "common"))
+from steps import build_step
+
+# Deterministic solver for problem classes with an exact answer: LCM/GCD, prime
+# factorization, percentages and one-variable linear or quadratic equations. It answers in
+# milliseconds with steps in the solutions.yaml format; anything it does not recognize
+# (word problems, several unknowns, extra numbers in the text) is left to the LLM.
+
+# Larger integers are left to the LLM: factoring them could take seconds.
+MAX_INTEGER = 10**12
+MAX_EQUATION_LENGTH = 120
+MAX_NUMBERS = 6
+
+NUMBER = r"\d+(?:\.\d+)?"
+NUMBER_IN_TEXT = re.compile(r"(?<![\w.])\d+(?:\.\d+)?")
+PERCENT = r"(?:%|percent|per cent)"
+PERCENT_WORD = r"(?:percent|percentage|per cent|%)"
+OF_NUMBER = rf"of\s+(?:the\s+number\s+)?({NUMBER})"
+
+# LCM/GCD questions are only answered when they are nothing but "<opening> LCM of <integers>":
+# any other clause ("... and then double it", "for problem 2", "the sum of ...") goes to the LLM.
+QUESTION_OPENING = r"^(?:(?:please\s+)?(?:find|calculate|compute|determine|what\s+is|what's)\s+)?(?:the\s+)?"
+QUESTION_END = r"\s*[.?!]?$"
+INTEGER_LIST = r"\d+(?:(?:\s*,\s*|\s*,?\s*and\s+)\d+)+"
+LCM_NAME = r"(?:(?:least|lowest|smallest)\s+common\s+multiple(?:\s*\(lcm\))?|lcm)"
+GCD_NAME = r"(?:(?:greatest|highest|largest)\s+common\s+(?:divisor|factor)(?:\s*\((?:gcd|gcf|hcf)\))?|gcd|gcf|hcf)"
+
+
+def integer_list_question(name):
+    return re.compile(
+        rf"{QUESTION_OPENING}{name}\s*(?:of\s+(?:the\s+numbers\s+)?({INTEGER_LIST})"
+        rf"|\(\s*(\d+(?:\s*,\s*\d+)+)\s*\)){QUESTION_END}"
+    )
+
+
+LCM_QUESTION = integer_list_question(LCM_NAME)
+GCD_QUESTION = integer_list_question(GCD_NAME)
+FACTORIZATION_QUESTION = re.compile(r"\bprime\s+factori[sz]ation\b|\bprime\s+factors\b|\bfactori[sz]e\b")
+PERCENT_OF = re.compile(rf"({NUMBER})\s*{PERCENT}\s+{OF_NUMBER}")
+WHAT_PERCENT_OF = re.compile(rf"what\s+{PERCENT_WORD}\s+{OF_NUMBER}\s+is\s+({NUMBER})")
+IS_WHAT_PERCENT_OF = re.compile(rf"({NUMBER})\s+is\s+what\s+{PERCENT_WORD}\s+{OF_NUMBER}")
+DIGITS_PERCENT = re.compile(
+    rf"what\s+{PERCENT_WORD}\s+of\s+(?:the\s+number\s+)?(\d+)\s+is\s+(?:represented\s+by\s+|made\s+up\s+by\s+)?"
+    r"the\s+(sum|product)\s+of\s+its\s+digits"
+)
+SOLVE_QUESTION = re.compile(r"\b(?:solve|find|determine|calculate|compute)\b")
+# An equation: digits, operators and single-letter names around one "=".
+EQUATION = re.compile(
+    r"(?<![A-Za-z])((?:\d+(?:\.\d+)?|[a-z](?![A-Za-z])|[ \t+\-*/^()])+"
+    r"=(?:\d+(?:\.\d+)?|[a-z](?![A-Za-z])|[ \t+\-*/^()])+)"
+)
+# Only a few single-digit, unchained powers, so "9^9^9" cannot make SymPy build a huge integer.
+LARGE_POWER = re.compile(r"\^\s*(?:[^\d\s]|\d\s*[\d^])|\*\*")
+MAX_POWERS = 3
+
+UNICODE_OPERATORS = str.maketrans({"−": "-", "–": "-", "×": "*", "·": "*", "÷": "/", "²": "^2", "³": "^3"})
+
+
+# --- Formatting ---
+def format_factors(factors):
+    """LaTeX product of prime powers, e.g. {2: 2, 7: 1} -> "2^{2} \\times 7"."""
+    if not factors:
+        return "1"
+    return " \\times ".join(f"{p}^{{{e}}}" if e > 1 else str(p) for p, e in sorted(factors.items()))
+
+
+def format_number(value, latex=True):
+    """An exact number: an integer, a short decimal, or a fraction with its approximation."""
+    value = Fraction(value)
+    if value.denominator == 1:
+        return str(value.numerator)
+    denominator = value.denominator
+    for prime in (2, 5):
+        while denominator % prime == 0:
+            denominator //= prime
+    if denominator == 1 and value.denominator <= 10000:
+        return str(Decimal(value.numerator) / Decimal(value.denominator))
+    if not latex:
+        return f"{value.numerator}/{value.denominator} ≈ {float(value):.4g}"
+    sign = "-" if value < 0 else ""
+    return f"{sign}\\frac{{{abs(value.numerator)}}}{{{value.denominator}}} \\approx {float(value):.4g}"
+
+
+def numbers_in(text):
+    return NUMBER_IN_TEXT.findall(text)
+
+
+def uses_every_number(text, used):
+    """Guards against word problems: every number in the text must be one the pattern consumed."""
+    return sorted(numbers_in(text)) == sorted(used)
+
+
+def in_words(values):
+    """ "28, 42 and 70" """
+    values = [str(value) for value in values]
+    return ", ".join(values[:-1]) + " and " + values[-1]
+
+
+# --- Number theory ---
+def integer_arguments(question, text):
+    """
+    The integers listed right after "LCM of" / "GCD of" (or in LCM(a, b)), or None when the
+    text is not exactly such a question, or they are too many or out of range.
+    """
+    match = question.match(text)
+    if not match:
+        return None
+    values = numbers_in(match.group(1) or match.group(2))
+    if not 2 <= len(values) <= MAX_NUMBERS or not uses_every_number(text, values):
+        return None
+    integers = [int(value) for value in values]
+    if any(not 1 <= value <= MAX_INTEGER for value in integers):
+        return None
+    return integers
+
+
+def factorizations(integers):
+    from sympy import factorint
+    return [factorint(value) for value in integers]
+
+
+def factorization_step(integers, factors):
+    return (
+        "Find the prime factorization of each number.",
+        ", \\quad ".join(f"{value} = {format_factors(f)}" for value, f in zip(integers, factors)),
+        ["Prime Factorization"],
+    )
+
+
+def solve_lcm(text):
+    integers = integer_arguments(LCM_QUESTION, text)
+    if integers is None:
+        return None
+    factors = factorizations(integers)
+    highest = {}
+    for f in factors:
+        for prime, exponent in f.items():
+            highest[prime] = max(highest.get(prime, 0), exponent)
+    answer = math.lcm(*integers)
+    listed = ", ".join(map(str, integers))
+    return answer, [
+        factorization_step(integers, factors),
+        (
+            "For each prime factor, take the highest power present in any of the numbers.",
+            ", \\; ".join(format_factors({prime: exponent}) for prime, exponent in sorted(highest.items())) or "1",
+            ["Prime Factorization"],
+        ),
+        (
+            f"Multiply these highest powers together to obtain the LCM. The least common multiple of {in_words(integers)} is {answer}.",
+            f"\\operatorname{{LCM}}({listed}) = {format_factors(highest)} = {answer}",
+            ["Least Common Multiple"],
+        ),
+    ]
+
+
+def solve_gcd(text):
+    integers = integer_arguments(GCD_QUESTION, text)
+    if integers is None:
+        return None
+    factors = factorizations(integers)
+    common = {
+        prime: min(f.get(prime, 0) for f in factors)
+        for prime in set.intersection(*(set(f) for f in factors))
+    }
+    answer = math.gcd(*integers)
+    listed = ", ".join(map(str, integers))
+    if common:
+        second = (
+            "For each prime factor common to all the numbers, take the lowest power in which it appears.",
+            ", \\; ".join(format_factors({prime: exponent}) for prime, exponent in sorted(common.items())),
+            ["Prime Factorization"],
+        )
+    else:
+        second = (
+            "The numbers have no prime factor in common, so their only common divisor is 1.",
+            "",
+            ["Prime Factorization"],
+        )
+    return answer, [
+        factorization_step(integers, factors),
+        second,
+        (
+            f"Multiply the common prime powers to obtain the GCD. The greatest common divisor of {in_words(integers)} is {answer}.",
+            f"\\operatorname{{GCD}}({listed}) = {format_factors(common)} = {answer}",
+            ["Greatest Common Divisor"],
+        ),
+    ]
+
+
+def solve_prime_factorization(text):
+    if not FACTORIZATION_QUESTION.search(text):
+        return None
+    values = numbers_in(text)
+    if len(values) != 1 or "." in values[0] or not 2 <= int(values[0]) <= MAX_INTEGER:
+        return None
+    from sympy import factorint
+    number = int(values[0])
+    factors = factorint(number)
+    if factors == {number: 1}:
+        return f"{number}", [(
+            f"No prime up to the square root of {number} divides it, so {number} is prime and is its own "
+            f"prime factorization.",
+            f"\\sqrt{{{number}}} \\approx {math.sqrt(number):.2f}; \\quad {number} = {number}",
+            ["Prime Numbers", "Prime Factorization"],
+        )]
+    divisions = []
+    quotient = number
+    for prime, exponent in sorted(factors.items()):
+        for _ in range(exponent):
+            divisions.append(f"{quotient} \\div {prime} = {quotient // prime}")
+            quotient //= prime
+    answer = format_factors(factors)
+    plain = " × ".join(f"{p}^{e}" if e > 1 else str(p) for p, e in sorted(factors.items()))
+    return plain, [
+        (
+            f"Divide {number} by its smallest prime factor, and repeat with the quotient until it is 1.",
+            ", \\quad ".join(divisions),
+            ["Prime Numbers", "Division"],
+        ),
+        (
+            f"Collect the prime divisors as powers. The prime factorization of {number} is {plain}.",
+            f"{number} = {answer}",
+            ["Prime Factorization", "Exponentiation"],
+        ),
+    ]
+
+
+# --- Percentages ---
+def solve_percentage(text):
+    match = DIGITS_PERCENT.search(text)
+    if match and uses_every_number(text, [match.group(1)]):
+        digits = [int(d) for d in match.group(1)]
+        whole = int(match.group(1))
+        if whole == 0:
+            return None
+        if match.group(2) == "sum":
+            part, operation, concept = sum(digits), " + ", "Addition"
+        else:
+            part, operation, concept = math.prod(digits), " \\times ", "Multiplication"
+        answer = format_number(Fraction(part * 100, whole))
+        plain = format_number(Fraction(part * 100, whole), latex=False)
+        return f"{plain}%", [
+            (
+                f"Calculate the {match.group(2)} of the digits of {whole}.",
+                f"{operation.join(map(str, digits))} = {part}",
+                [concept],
+            ),
+            (
+                f"Divide the {match.group(2)} by {whole} and multiply by 100 to determine the percentage. "
+                f"The {match.group(2)} of the digits is {plain}% of {whole}.",
+                f"\\frac{{{part}}}{{{whole}}} \\times 100 = {answer}\\%",
+                ["Calculating Percentage of a Number", "Percentages"],
+            ),
+        ]
+
+    match = PERCENT_OF.search(text)
+    if match and uses_every_number(text, match.groups()):
+        rate, whole = match.groups()
+        answer = format_number(Fraction(rate) * Fraction(whole) / 100)
+        plain = format_number(Fraction(rate) * Fraction(whole) / 100, latex=False)
+        return plain, [
+            (
+                "Write the percentage as a fraction of 100.",
+                f"{rate}\\% = \\frac{{{rate}}}{{100}}",
+                ["Percentage as a Fraction"],
+            ),
+            (
+                f"Multiply the number by this fraction. {rate}% of {whole} is {plain}.",
+                f"\\frac{{{rate}}}{{100}} \\times {whole} = {answer}",
+                ["Calculating Percentage of a Number", "Multiplication"],
+            ),
+        ]
+
+    for pattern, order in ((WHAT_PERCENT_OF, (1, 0)), (IS_WHAT_PERCENT_OF, (0, 1))):
+        match = pattern.search(text)
+        if match and uses_every_number(text, match.groups()):
+            part, whole = (match.groups()[i] for i in order)
+            if Fraction(whole) == 0:
+                return None
+            answer = format_number(Fraction(part) * 100 / Fraction(whole))
+            plain = format_number(Fraction(part) * 100 / Fraction(whole), latex=False)
+            return f"{plain}%", [(
+                f"Divide the part by the whole and multiply by 100 to get the percentage. "
+                f"{part} is {plain}% of {whole}.",
+                f"\\frac{{{part}}}{{{whole}}} \\times 100 = {answer}\\%",
+                ["Percentages", "Calculating Percentage of a Number"],
+            )]
+    return None
+
+
+# --- Equations ---
+def parse_equation(source):
+    """(lhs, rhs, symbol) for a one-variable equation, or None."""
+    from sympy import Symbol
+    from sympy.parsing.sympy_parser import (
+        convert_xor, implicit_multiplication_application, parse_expr, standard_transformations,
+    )
+
+    names = sorted(set(re.findall(r"[a-z]", source)))
+    if len(names) != 1:
+        return None
+    symbol = Symbol(names[0])
+    transformations = standard_transformations + (implicit_multiplication_application, convert_xor)
+    left, right = source.split("=")
+    sides = [
+        parse_expr(side, local_dict={names[0]: symbol}, transformations=transformations, evaluate=True)
+        for side in (left, right)
+    ]
+    return sides[0], sides[1], symbol
+
+
+def solve_equation(text):
+    if not SOLVE_QUESTION.search(text.lower()):
+        return None
+    source = text.translate(UNICODE_OPERATORS)
+    matches = [m for m in EQUATION.finditer(source) if re.search(r"\d|[a-z]", m.group(1).split("=")[0])]
+    if len(matches) != 1:
+        return None
+    equation = matches[0].group(1).strip().rstrip(".").strip()
+    rest = source[:matches[0].start()] + source[matches[0].end():]
+    if (len(equation) > MAX_EQUATION_LENGTH or LARGE_POWER.search(equation)
+            or equation.count("^") > MAX_POWERS or numbers_in(rest)):
+        return None
+
+    from sympy import Poly, Rational, UnevaluatedExpr, expand, latex, nsimplify, sqrt
+
+    parsed = parse_equation(equation)
+    if parsed is None:
+        return None
+    lhs, rhs, x = parsed
+    poly = Poly(expand(nsimplify(lhs - rhs, rational=True)), x)
+    degree = poly.degree()
+    stated = f"{latex(lhs)} = {latex(rhs)}"
+    name = latex(x)
+
+    if degree <= 0:
+        if poly.is_zero:
+            return "every number", [(
+                f"Simplifying both sides gives the same expression, so the equation holds for every value of {name}.",
+                f"{stated} \\iff 0 = 0",
+                ["Identities", "Equations"],
+            )]
+        return "no solution", [(
+            f"The {name} terms cancel and what remains is false, so the equation has no solution.",
+            f"{stated} \\iff {latex(-poly.as_expr())} = 0",
+            ["Contradictions", "Equations"],
+        )]
+
+    if degree == 1:
+        a, b = poly.all_coeffs()
+        root = Rational(-b, a)
+        moved = f"{latex(a * x)} = {latex(-b)}"
+        steps = [(
+            f"Collect the terms with {name} on the left side and move the constants to the right side, "
+            f"changing their sign.",
+            f"{stated} \\implies {moved}",
+            ["Transposition", "Combining Like Terms"],
+        )]
+        if a != 1:
+            steps.append((
+                f"Divide both sides by {latex(a)} to isolate {name}.",
+                f"{name} = \\frac{{{latex(-b)}}}{{{latex(a)}}} = {latex(root)}",
+                ["Operations on Equations", "Division"],
+            ))
+        steps.append((
+            f"Substitute the value back into the original equation to check it. The solution is {name} = {latex(root)}.",
+            f"{latex(lhs.subs(x, UnevaluatedExpr(root)))} = {latex(rhs.subs(x, UnevaluatedExpr(root)))} "
+            f"\\implies {latex(lhs.subs(x, root))} = {latex(rhs.subs(x, root))}",
+            ["Linear Equations", "Solving Equations"],
+        ))
+        return f"{x} = {root}", steps
+
+    if degree == 2:
+        a, b, c = poly.all_coeffs()
+        discriminant = b * b - 4 * a * c
+        steps = [
+            (
+                f"Move every term to one side to write the equation in the standard form a{name}^2 + b{name} + c = 0.",
+                f"{stated} \\implies {latex(poly.as_expr())} = 0" if rhs != 0 or expand(lhs) != lhs else stated,
+                ["Transposition", "Combining Like Terms"],
+            ),
+            (
+                f"Compute the discriminant with a = {latex(a)}, b = {latex(b)}, c = {latex(c)}.",
+                f"D = b^2 - 4ac = {latex(b * b)} - {latex(4 * a * c)} = {latex(discriminant)}",
+                ["Square (Exponentiation)", "Order of Operations"],
+            ),
+        ]
+        if discriminant < 0:
+            steps.append((
+                "The discriminant is negative, so the equation has no real solution.",
+                "D < 0",
+                ["Equations"],
+            ))
+            return "no real solution", steps
+        roots = sorted({(-b + sign * sqrt(discriminant)) / (2 * a) for sign in (1, -1)}, key=lambda r: float(r))
+        listed = ", ".join(f"{name} = {latex(root)}" for root in roots)
+        steps.append((
+            f"Apply the quadratic formula. The solutions are {listed}." if len(roots) > 1 else
+            f"The discriminant is zero, so the equation has one double solution, {listed}.",
+            f"{name} = \\frac{{-b \\pm \\sqrt{{D}}}}{{2a}} = \\frac{{{latex(-b)} \\pm \\sqrt{{{latex(discriminant)}}}}}"
+            f"{{{latex(2 * a)}}} \\implies {listed}",
+            ["Square Roots", "Solving Equations"],
+        ))
+        return ", ".join(f"{x} = {root}" for root in roots), steps
+    return None
+
+
+# Order matters: an LCM question also mentions prime factors.
+SOLVERS = [
+    ("lcm", solve_lcm),
+    ("gcd", solve_gcd),
+    ("prime_factorization", solve_prime_factorization),
+    ("percentage", solve_percentage),
+    ("equation", solve_equation),
+]
+
+
+def render_step(step_number, explanation, transformation):
+    """Markdown of one step in the engine's streamed format; StepParser reads it back unchanged."""
+    heading = f"### Step {step_number}: "
+    body = explanation + "\n" + (f"\\[ {transformation} \\]\n" if transformation else "")
+    return heading, body
+
+
+def solve_symbolic(problem: str):
+    """
+    Solves the problem exactly when it belongs to a supported class.
+    Returns {"kind", "answer", "steps"} with steps in the solutions.yaml format (plus their
+    markdown as "text", as StepParser would produce), or None to fall back to the LLM.
+    """
+    text = " ".join(problem.split())
+    lowered = text.lower()
+    for kind, solver in SOLVERS:
+        try:
+            result = solver(text if kind == "equation" else lowered)
+        except Exception:
+            # Anything SymPy cannot parse or solve goes to the LLM instead.
+            result = None
+        if result is None:
+            continue
+        answer, raw_steps = result
+        steps = []
+        for number, (explanation, transformation, concepts) in enumerate(raw_steps, start=1):
+            heading, body = render_step(number, explanation, transformation)
+            step = build_step(number, body, heading)
+            step["related_concepts"] = list(concepts)
+            steps.append(step)
+        return {"kind": kind, "answer": str(answer), "steps": steps}
+    return None
+
+
+def solution_markdown(solution):
+    """The whole solution as the streamed markdown text."""
+    return "\n\n".join(step["text"] for step in solution["steps"]) + "\n"
+
+
+def warm_up():
+    """Imports SymPy and runs one solve of each kind, so the first request does not pay for it."""
+    for problem in ("Find the LCM of 4 and 6.", "Solve 2x+3=7"):
+        solve_symbolic(problem)
+
+
+# --- Coverage and latency report: python symbolic.py [--problems problems.yaml] ---
+SAMPLE_PROBLEMS = [
+    "Solve 2x+3=7",
+    "Solve for x: 3(x - 2) = 2x + 5",
+    "Solve the equation x^2 - 5x + 6 = 0.",
+    "Find the least common multiple (LCM) of 12, 18 and 30.",
+    "What is the greatest common divisor of 84 and 126?",
+    "gcd(84, 126)",
+    # Other numbers or clauses around the LCM/GCD: the LLM answers these.
+    "Find the LCM of 3 and 5 for problem 2.",
+    "Calculate the LCM of 4 and 6 and then double it.",
+    "Find the sum of the LCM of 4 and 6 and the GCD of 4 and 6.",
+    "Find the prime factorization of 360.",
+    "What is 15% of 80?",
+    "12 is what percent of 80?",
+    "What percentage of the number 375 is represented by the sum of its digits?",
+    "A train leaves at 3 pm travelling 60 km/h; when does it meet a second train leaving at 4 pm at 80 km/h?",
+    "Prove that the square root of 2 is irrational.",
+]
+
+
+def report(problems, rounds=20):
+    start = time.perf_counter()
+    warm_up()
+    print(f"warm-up (SymPy import) {(time.perf_counter() - start) * 1000:.0f}ms")
+
+    latencies = {}
+    solved = 0
+    for problem in problems:
+        timings = []
+        for _ in range(rounds):
+            start = time.perf_counter()
+            solution = solve_symbolic(problem)
+            timings.append((time.perf_counter() - start) * 1000)
+        kind = solution["kind"] if solution else "fallback"
+        solved += solution is not None
+        latencies.setdefault(kind, []).extend(timings)
+        answer = solution["answer"] if solution else "-> LLM"
+        print(f"  {kind:<20} {statistics.median(timings):7.2f}ms  {problem[:60]:<60} {answer}")
+
+    print(f"coverage {solved}/{len(problems)} ({solved / len(problems):.0%})")
+    for kind, timings in sorted(latencies.items()):
+        timings.sort()
+        print(f"  {kind:<20} p50 {statistics.median(timings):.2f}ms  p99 {timings[int(len(timings) * 0.99) - 1]:.2f}ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Report symbolic solver coverage and latency.")
+    parser.add_argument("--problems", help="problems.yaml to measure instead of the built-in samples")
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+    problems = SAMPLE_PROBLEMS
+    if args.problems:
+        import yaml
+        with open(args.problems, "r") as file:
+            problems = [problem["text"] for problem in yaml.safe_load(file).get("problems", [])]
+    report(problems, args.rounds)
@@ -2,18 +2,30 @@ import streamlit as st
 from langchain_core.messages import HumanMessage, AIMessage
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
-from langchain_openai import ChatOpenAI
 from dotenv import load_dotenv
 
 from pydantic import BaseModel
 from typing import Dict
 
 import os
-import time
+import sys
 import json
-from openai import OpenAI  # OpenAI client for transformation step
+import logging
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "common"))
+from steps import StepParser
+from rendering import ThrottledRenderer
+from context import ConversationContext, count_tokens, select_solution_steps
+from completion_cache import CompletionCache
 
 load_dotenv()
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("math_tutor.ui")
+
+# Prompt token budgets for the conversation context of each chain.
+MATH_CONTEXT_TOKENS = int(os.getenv("MATH_CONTEXT_TOKENS", "1500"))
+FOLLOWUP_CONTEXT_TOKENS = int(os.getenv("FOLLOWUP_CONTEXT_TOKENS", "1500"))
+FOLLOWUP_STEPS_TOKENS = int(os.getenv("FOLLOWUP_STEPS_TOKENS", "1500"))
 
 # Set up API keys
 openai_api_key = os.getenv("OPENAI_API_KEY")
@@ -22,19 +34,39 @@ hf_math_key = os.getenv("HF_MATH_KEY")
 # Model setup for the math solution
 base_url = os.getenv("HF_BASE_URL", "https://ta9u2hpk4yo4jiio.us-east-1.aws.endpoints.huggingface.cloud/v1/")
 math_model_name = os.getenv("MODEL_NAME", "mav23/Qwen2.5-Math-7B-Instruct-GGUF")
-math_llm = ChatOpenAI(
-    model=math_model_name,
-    max_completion_tokens=1000,
-    api_key=hf_math_key,
-    base_url=base_url,
-)
+followup_model_name = "gpt-4o-mini"
+# The client's default temperature unless LLM_TEMPERATURE is set; only unsampled requests
+# (LLM_TEMPERATURE=0) are served from the completion cache.
+LLM_PARAMS = {"max_completion_tokens": 1000}
+if os.getenv("LLM_TEMPERATURE"):
+    LLM_PARAMS["temperature"] = float(os.getenv("LLM_TEMPERATURE"))
+
+# Streamlit reruns this script on every interaction; caching the clients keeps one instance
+# (and one HTTP connection pool) per process instead of rebuilding them on each rerun.
+@st.cache_resource
+def get_math_llm():
+    from langchain_openai import ChatOpenAI
+    return ChatOpenAI(
+        model=math_model_name,
+        **LLM_PARAMS,
+        api_key=hf_math_key,
+        base_url=base_url,
+    )
 
 # Model setup for follow-up chat (using gpt-4o-mini)
-followup_llm = ChatOpenAI(
-    model="gpt-4o-mini",
-    max_completion_tokens=1000,
-    api_key=openai_api_key,
-)
+@st.cache_resource
+def get_followup_llm():
+    from langchain_openai import ChatOpenAI
+    return ChatOpenAI(
+        model=followup_model_name,
+        **LLM_PARAMS,
+        api_key=openai_api_key,
+    )
+
+# Completed answers persist across reruns and restarts (None when LLM_CACHE_PATH is empty).
+@st.cache_resource
+def get_completion_cache():
+    return CompletionCache.from_env()
 
 # Initialize session state variables
 if "math_chat_history" not in st.session_state:
@@ -45,6 +77,11 @@ if "math_solution_markdown" not in st.session_state:
     st.session_state.math_solution_markdown = ""
 if "math_solution_json" not in st.session_state:
     st.session_state.math_solution_json = ""
+# Budgeted history (recent turns verbatim, older turns in a cached summary) per chain.
+if "math_context" not in st.session_state:
+    st.session_state.math_context = ConversationContext(budget_tokens=MATH_CONTEXT_TOKENS)
+if "followup_context" not in st.session_state:
+    st.session_state.followup_context = ConversationContext(budget_tokens=FOLLOWUP_CONTEXT_TOKENS)
 
 st.set_page_config(page_title="Math Tutor", page_icon="👨‍🏫")
 st.title("Math Tutor")
@@ -58,13 +95,13 @@ st.sidebar.markdown(
     **Math Tutor** is a three-part application:
     
     1. **Solve Math Problem:** Enter a math problem to get a step-by-step explanation (in markdown).
-    2. **Transform to JSON:** Convert the markdown solution into a structured JSON format.
+    2. **Solution Breakdown:** The steps are split out of the stream as they arrive.
     3. **Follow-up Chat:** Ask follow-up questions based on the structured solution.
     """
 )
 st.sidebar.markdown(f"**Math Model:** {math_model_name}")
-st.sidebar.markdown("**Transformation & Follow-Up Model:** gpt-4o-mini")
-st.sidebar.markdown("**Max Tokens:** Math: 1000, Transform: 150, Follow-up: 1000")
+st.sidebar.markdown(f"**Follow-Up Model:** {followup_model_name}")
+st.sidebar.markdown("**Max Tokens:** Math: 1000, Follow-up: 1000")
 
 #############################################
 # Utility functions
@@ -78,6 +115,18 @@ def process_text(text: str) -> str:
                 .replace(r"\[", "$$")
                 .replace(r"\]", "$$"))
 
+def log_prompt_tokens(chain_name, prompt, inputs):
+    """Logs the size of the prompt actually sent to the model."""
+    tokens = count_tokens(prompt.format(**inputs))
+    logger.info("%s prompt: %d tokens", chain_name, tokens)
+
+def stream_cached(model, template, chain, inputs):
+    """Streams the chain's output, replaying it from the completion cache if this exact prompt was answered."""
+    cache = get_completion_cache()
+    if cache is None:
+        return chain.stream(inputs)
+    return cache.stream(model, template, LLM_PARAMS, inputs, lambda: chain.stream(inputs))
+
 def get_math_response(query, chat_history):
     """Return a streaming generator of tokens for the math solution in markdown format."""
     template = r"""
@@ -88,11 +137,14 @@ def get_math_response(query, chat_history):
     Problem: {user_question}
     """
     prompt = ChatPromptTemplate.from_template(template)
-    chain = prompt | math_llm | StrOutputParser()
-    return chain.stream({
-        "chat_history": chat_history,
+    chain = prompt | get_math_llm() | StrOutputParser()
+    # The current question is passed separately, so it is left out of the history.
+    inputs = {
+        "chat_history": st.session_state.math_context.render(chat_history[:-1]),
         "user_question": query
-    })
+    }
+    log_prompt_tokens("math", prompt, inputs)
+    return stream_cached(math_model_name, template, chain, inputs)
 
 #############################################
 # Pane 1: Math Problem Solver (Markdown Output)
@@ -103,99 +155,40 @@ with st.expander("Enter Math Problem", expanded=True):
     if st.button("Solve Math Problem"):
         st.session_state.math_chat_history.append(HumanMessage(math_query))
         math_placeholder = st.empty()
-        response_text = ""
-        token_buffer = ""
+        # Repaint on a time/size budget; delimiters are converted chunk by chunk.
+        renderer = ThrottledRenderer(math_placeholder)
+        # Split the solution into steps while it streams; no second LLM call is needed.
+        step_parser = StepParser()
         # Stream tokens from the math solution.
         for token in get_math_response(math_query, st.session_state.math_chat_history):
-            token_buffer += token
-            # Flush buffered tokens when a period is encountered.
-            if "." in token_buffer:
-                response_text += token_buffer
-                processed = process_text(response_text)
-                math_placeholder.markdown(processed)
-                token_buffer = ""
-                time.sleep(0.05)
-        if token_buffer:
-            response_text += token_buffer
-            processed = process_text(response_text)
-            math_placeholder.markdown(processed)
-        # Save the markdown solution.
+            step_parser.feed(token)
+            renderer.write(token)
+        processed = renderer.finish()
+        step_parser.close()
+        # Save the markdown solution and its steps.
         st.session_state.math_solution_markdown = processed
+        st.session_state.math_solution_json = {
+            "steps": {f"step{step['step_number']}": process_text(step["text"]) for step in step_parser.steps}
+        }
         st.session_state.math_chat_history.append(AIMessage(processed))
 
 #############################################
-# Pane 2: Transform Markdown to JSON
+# Pane 2: Solution Breakdown (steps parsed from the stream)
 #############################################
-st.header("Transform Math Solution to JSON")
-if not st.session_state.math_solution_markdown:
-    st.info("Please solve a math problem first before converting to JSON.")
+st.header("Solution Breakdown")
+if not st.session_state.math_solution_json:
+    st.info("Please solve a math problem first to see its steps.")
 else:
-    st.markdown("**Markdown Solution:**")
-    st.markdown(st.session_state.math_solution_markdown)
-    if st.button("Convert to JSON"):
-        client = OpenAI(api_key=openai_api_key)
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {
-                    "role": "system",
-                    "content": (
-                        "You are a conversion assistant. Convert the following markdown-formatted math solution into a JSON object by copying the content of each step exactly as it appears, preserving all formatting (including LaTeX delimiters). "
-                        "The JSON should have the structure:\n\n"
-                        "{\n"
-                        '  "steps": {\n'
-                        '      "step1": "<exact copy of step1>",\n'
-                        '      "step2": "<exact copy of step2>",\n'
-                        "      ...\n"
-                        "  }\n"
-                        "}\n\n"
-                        "Do not alter or change any content; simply copy the steps as-is."
-                    )
-                },   
-                {
-                    "role": "user",
-                    "content": st.session_state.math_solution_markdown
-                }
-            ],
-            response_format={
-                "type": "json_schema",
-                "json_schema": {
-                    "name": "math_solution_schema",
-                    "schema": {
-                        "type": "object",
-                        "properties": {
-                            "steps": {
-                                "description": "Step-by-step explanation",
-                                "type": "object",
-                                "additionalProperties": {"type": "string"}
-                            }
-                        },
-                        "required": ["steps"],
-                        "additionalProperties": False
-                    }
-                }
-            }
-        )
-        try:
-            json_output = response.choices[0].message.content
-            parsed = json.loads(json_output)
-            final_json = json.dumps(parsed, indent=2)
-            st.session_state.math_solution_json = parsed
-
-            # Display each step using st.markdown in separate blocks.
-            st.markdown("### Solution Breakdown:")
-            for step, explanation in parsed["steps"].items():
-                with st.expander(f"{step}", expanded=True):
-                    st.markdown(explanation)
-        except Exception as e:
-            st.error(f"Error converting to JSON: {e}")
+    for step, explanation in st.session_state.math_solution_json["steps"].items():
+        with st.expander(f"{step}", expanded=True):
+            st.markdown(explanation)
 
 #############################################
 # Pane 3: Follow-Up Chat with Context (Using gpt-4o-mini)
 #############################################
 st.header("Follow-up Chat")
 if not st.session_state.math_solution_json:
-    st.info("Please convert a math solution to JSON first before asking follow-up questions.")
+    st.info("Please solve a math problem first before asking follow-up questions.")
 else:
     for message in st.session_state.followup_chat_history:
         if isinstance(message, HumanMessage):
@@ -222,27 +215,24 @@ else:
         {user_question}
         """
         prompt = ChatPromptTemplate.from_template(followup_template)
-        chain = prompt | followup_llm | StrOutputParser()
+        chain = prompt | get_followup_llm() | StrOutputParser()
+        # Only the steps the question refers to, and a budgeted history without the current question.
+        steps = select_solution_steps(
+            followup_query, st.session_state.math_solution_json["steps"], FOLLOWUP_STEPS_TOKENS
+        )
         context = {
-            "math_solution_json": json.dumps(st.session_state.math_solution_json),
-            "chat_history": "\n".join([msg.content for msg in st.session_state.followup_chat_history]),
+            "math_solution_json": json.dumps({"steps": steps}),
+            "chat_history": st.session_state.followup_context.render(st.session_state.followup_chat_history[:-1]),
             "user_question": followup_query,
         }
+        log_prompt_tokens("follow-up", prompt, context)
 
         with st.chat_message("AI"):
             followup_placeholder = st.empty()
-            response_text = ""
-            token_buffer = ""
-            for token in chain.stream(context):
-                token_buffer += token
-                if "." in token_buffer:
-                    response_text += token_buffer
-                    processed = process_text(response_text)
-                    followup_placeholder.markdown(processed)
-                    token_buffer = ""
-                    time.sleep(0.05)
-            if token_buffer:
-                response_text += token_buffer
-                processed = process_text(response_text)
-                followup_placeholder.markdown(processed)
-            st.session_state.followup_chat_history.append(AIMessage(response_text))
+            renderer = ThrottledRenderer(followup_placeholder)
+            tokens = []
+            for token in stream_cached(followup_model_name, followup_template, chain, context):
+                tokens.append(token)
+                renderer.write(token)
+            renderer.finish()
+            st.session_state.followup_chat_history.append(AIMessage("".join(tokens)))
@@ -0,0 +1,126 @@
+import re
+
+try:
+    import tiktoken
+    _encoding = tiktoken.get_encoding("cl100k_base")
+except Exception:  # tiktoken is optional and downloads its encoding on first use; fall back
+    _encoding = None  # to the usual ~4 chars per token estimate when it is missing or offline
+
+
+def count_tokens(text: str) -> int:
+    if _encoding is not None:
+        return len(_encoding.encode(text))
+    return len(text) // 4 + 1
+
+
+def truncate_tokens(text: str, max_tokens: int) -> str:
+    """Start of a text cut to about max_tokens tokens."""
+    if count_tokens(text) <= max_tokens:
+        return text
+    if _encoding is not None:
+        return _encoding.decode(_encoding.encode(text)[:max(max_tokens - 1, 0)]) + "…"
+    return text[:max(max_tokens - 1, 0) * 4] + "…"
+
+
+def role_of(message) -> str:
+    return "User" if getattr(message, "type", "") == "human" else "Tutor"
+
+
+def brief(text: str, max_chars: int) -> str:
+    """First sentence of a message, cut to max_chars, for the running summary."""
+    text = " ".join(text.split())
+    sentence = re.split(r"(?<=[.?!])\s", text, maxsplit=1)[0]
+    return sentence if len(sentence) <= max_chars else sentence[:max_chars - 1] + "…"
+
+
+SUMMARY_HEADER = "Summary of earlier conversation:\n"
+RECENT_HEADER = "Recent messages:\n"
+
+
+class ConversationContext:
+    """
+    Token-budgeted chat history for one chain.
+    The most recent turns are kept verbatim; older turns are collapsed into a running
+    summary that is cached, so each turn is summarized once no matter how long the session.
+    """
+
+    def __init__(self, budget_tokens=1500, recent_turns=4, summary_chars_per_turn=160):
+        self.budget_tokens = budget_tokens
+        self.recent_turns = recent_turns
+        self.summary_chars_per_turn = summary_chars_per_turn
+        self._summary_lines = []
+        self._summarized = 0  # Number of leading messages already folded into the summary
+
+    def _fold(self, messages, upto):
+        for message in messages[self._summarized:upto]:
+            self._summary_lines.append(f"- {role_of(message)}: {brief(message.content, self.summary_chars_per_turn)}")
+        self._summarized = max(self._summarized, upto)
+
+    def render(self, messages) -> str:
+        """History text for the prompt, within budget_tokens."""
+        self._fold(messages, max(0, len(messages) - self.recent_turns))
+        recent = [f"{role_of(message)}: {message.content}" for message in messages[self._summarized:]]
+
+        # Fold recent turns too (oldest first) until the verbatim part fits half the budget.
+        while len(recent) > 1 and count_tokens("\n".join(recent)) > self.budget_tokens // 2:
+            self._fold(messages, self._summarized + 1)
+            recent.pop(0)
+        # A single turn longer than that is cut rather than allowed past the budget.
+        if recent:
+            recent[-1] = truncate_tokens(recent[-1], self.budget_tokens // 2)
+
+        parts = []
+        if recent:
+            parts.append(RECENT_HEADER + "\n".join(recent))
+        summary_lines = list(self._summary_lines)
+        # The headers and separator count against the budget too.
+        remaining = self.budget_tokens - count_tokens("\n\n".join(parts + [SUMMARY_HEADER]))
+        while summary_lines and count_tokens("\n".join(summary_lines)) > remaining:
+            summary_lines.pop(0)  # The oldest summary lines go first
+        if summary_lines:
+            parts.insert(0, SUMMARY_HEADER + "\n".join(summary_lines))
+        return "\n\n".join(parts)
+
+
+ORDINALS = {
+    "first": 1, "second": 2, "third": 3, "fourth": 4, "fifth": 5,
+    "sixth": 6, "seventh": 7, "eighth": 8, "ninth": 9, "tenth": 10,
+}
+STEP_REFERENCE = re.compile(r"\bsteps?\s*(\d+(?:\s*(?:,|and|&|-|to)\s*\d+)*)", re.IGNORECASE)
+ORDINAL_REFERENCE = re.compile(r"\b(first|second|third|fourth|fifth|sixth|seventh|eighth|ninth|tenth|last)\s+step",
+                               re.IGNORECASE)
+
+
+def referenced_steps(question: str, step_count: int):
+    """Step numbers a question refers to ("step 2", "steps 2-4", "the last step"), in order."""
+    numbers = set()
+    for match in STEP_REFERENCE.finditer(question):
+        values = [int(value) for value in re.findall(r"\d+", match.group(1))]
+        if re.search(r"-|to", match.group(1)) and len(values) == 2:
+            # Clamp before expanding: "steps 1 to 30000000" must not build a huge range.
+            numbers.update(range(max(values[0], 1), min(values[1], step_count) + 1))
+        else:
+            numbers.update(values)
+    for match in ORDINAL_REFERENCE.finditer(question):
+        word = match.group(1).lower()
+        numbers.add(step_count if word == "last" else ORDINALS[word])
+    return sorted(number for number in numbers if 1 <= number <= step_count)
+
+
+def select_solution_steps(question: str, steps: dict, budget_tokens=1500) -> dict:
+    """
+    The solution steps worth sending with a follow-up question: only the referenced ones
+    when the question names any, otherwise every step that fits the token budget.
+    """
+    keys = list(steps)
+    wanted = referenced_steps(question, len(keys))
+    if wanted:
+        return {keys[number - 1]: steps[keys[number - 1]] for number in wanted}
+    selected = {}
+    used = 0
+    for key in keys:
+        used += count_tokens(steps[key])
+        if used > budget_tokens:
+            break
+        selected[key] = steps[key]
+    return selected
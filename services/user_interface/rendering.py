@@ -0,0 +1,172 @@
+import argparse
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+# LaTeX delimiters Streamlit's markdown does not understand, and their replacements.
+DELIMITERS = {"(": "$", ")": "$", "[": "$$", "]": "$$"}
+
+
+class LatexDelimiterConverter:
+    r"""
+    Streaming version of process_text: converts \(...\) to $...$ and \[...\] to $$...$$
+    one chunk at a time. A trailing backslash is held back until the next chunk,
+    so delimiters split across chunks are still converted.
+    """
+
+    def __init__(self):
+        self._carry = ""
+
+    def feed(self, chunk: str) -> str:
+        text = self._carry + chunk
+        self._carry = ""
+        out = []
+        i = 0
+        end = len(text)
+        while i < end:
+            char = text[i]
+            if char == "\\":
+                if i + 1 == end:
+                    self._carry = char
+                    break
+                replacement = DELIMITERS.get(text[i + 1])
+                if replacement:
+                    out.append(replacement)
+                    i += 2
+                    continue
+                # Keep escaped pairs such as "\\" together so the second backslash is not re-read.
+                out.append(text[i:i + 2])
+                i += 2
+                continue
+            next_backslash = text.find("\\", i)
+            if next_backslash == -1:
+                next_backslash = end
+            out.append(text[i:next_backslash])
+            i = next_backslash
+        return "".join(out)
+
+    def flush(self) -> str:
+        carry, self._carry = self._carry, ""
+        return carry
+
+
+class ThrottledRenderer:
+    """
+    Renders a token stream into a Streamlit placeholder.
+    Delimiters are converted once per chunk (never over the whole text again) and the
+    placeholder is repainted at most every min_interval seconds, or sooner once
+    max_pending_chars have accumulated; the first content is painted immediately.
+    """
+
+    def __init__(self, placeholder, min_interval=0.1, max_pending_chars=400):
+        self.placeholder = placeholder
+        self.min_interval = min_interval
+        self.max_pending_chars = max_pending_chars
+        self._converter = LatexDelimiterConverter()
+        self._parts = []
+        self._pending_chars = 0
+        self._last_paint = None
+        self._started = time.perf_counter()
+        self.time_to_first_paint = None
+        self.render_seconds = 0.0
+        self.paints = 0
+
+    @property
+    def text(self) -> str:
+        return "".join(self._parts)
+
+    def _paint(self):
+        start = time.perf_counter()
+        self.placeholder.markdown(self.text)
+        now = time.perf_counter()
+        self.render_seconds += now - start
+        self.paints += 1
+        self._pending_chars = 0
+        self._last_paint = now
+        if self.time_to_first_paint is None:
+            self.time_to_first_paint = now - self._started
+
+    def write(self, chunk: str):
+        converted = self._converter.feed(chunk)
+        if not converted:
+            return
+        self._parts.append(converted)
+        self._pending_chars += len(converted)
+        if (self._last_paint is None
+                or self._pending_chars >= self.max_pending_chars
+                or time.perf_counter() - self._last_paint >= self.min_interval):
+            self._paint()
+
+    def finish(self) -> str:
+        """Paints the final text and returns it."""
+        self._parts.append(self._converter.flush())
+        self._paint()
+        logger.info(
+            "Rendered %d chars: first paint %.1fms, %d paints, %.1fms rendering, %.1fms total",
+            len(self.text), (self.time_to_first_paint or 0) * 1000, self.paints,
+            self.render_seconds * 1000, (time.perf_counter() - self._started) * 1000,
+        )
+        return self.text
+
+
+# --- Benchmark: python rendering.py --chars 20000 ---
+class CostlyPlaceholder:
+    """Stand-in for st.empty() whose markdown() cost grows with the text length."""
+
+    def __init__(self, seconds_per_kchar):
+        self.seconds_per_kchar = seconds_per_kchar
+
+    def markdown(self, text):
+        time.sleep(len(text) / 1000 * self.seconds_per_kchar)
+
+
+def previous_render(tokens, placeholder):
+    """The former loop: flush on '.', reprocess the whole text, sleep 50ms."""
+    def process_text(text):
+        return text.replace(r"\(", "$").replace(r"\)", "$").replace(r"\[", "$$").replace(r"\]", "$$")
+
+    start = time.perf_counter()
+    first_paint = None
+    response_text = ""
+    token_buffer = ""
+    for token in tokens:
+        token_buffer += token
+        if "." in token_buffer:
+            response_text += token_buffer
+            placeholder.markdown(process_text(response_text))
+            first_paint = first_paint or time.perf_counter() - start
+            token_buffer = ""
+            time.sleep(0.05)
+    response_text += token_buffer
+    placeholder.markdown(process_text(response_text))
+    return first_paint or time.perf_counter() - start, time.perf_counter() - start
+
+
+def throttled_render(tokens, placeholder):
+    start = time.perf_counter()
+    renderer = ThrottledRenderer(placeholder)
+    for token in tokens:
+        renderer.write(token)
+    renderer.finish()
+    return renderer.time_to_first_paint, time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the former and throttled rendering loops.")
+    parser.add_argument("--chars", type=int, default=20000, help="Length of the simulated solution")
+    parser.add_argument("--markdown-ms-per-kchar", type=float, default=0.5)
+    args = parser.parse_args()
+
+    # A long solution: prose sentences followed by a long display-math block with no periods.
+    sentence = r"Step 1: We expand \(x^2\) and simplify the expression. "
+    math_block = r"\[ " + " + ".join(f"a_{{{i}}} x^{{{i}}}" for i in range(200)) + r" \] "
+    text = ""
+    while len(text) < args.chars:
+        text += sentence * 5 + math_block
+    tokens = [text[i:i + 4] for i in range(0, len(text), 4)]  # ~4 chars per token
+    placeholder = CostlyPlaceholder(args.markdown_ms_per_kchar / 1000)
+
+    for name, render in (("previous", previous_render), ("throttled", throttled_render)):
+        first_paint, total = render(tokens, placeholder)
+        print(f"{name:>9}: first paint {first_paint * 1000:8.1f}ms, total {total * 1000:9.1f}ms")
@@ -0,0 +1,8 @@
+import os
+import sys
+
+# The services are flat script directories rather than packages; put them on the path the
+# way the services do for services/common.
+SERVICES_DIR = os.path.join(os.path.dirname(__file__), "..", "services")
+for service in ("common", "api_gateway", "solution_engine", "user_interface"):
+    sys.path.append(os.path.join(SERVICES_DIR, service))
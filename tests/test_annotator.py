@@ -0,0 +1,76 @@
+import pytest
+
+from annotator import AhoCorasick, ConceptAnnotator, stem, stems
+
+CONCEPTS = [
+    {"name": "Addition"},
+    {"name": "Division"},
+    {"name": "Divisibility"},
+    {"name": "Divisibility by 9"},
+    {"name": "Multiplication"},
+    {"name": "Exponentiation"},
+    {"name": "Transposition"},
+    {"name": "Least Common Multiple", "description": "The smallest multiple of two numbers, the LCM."},
+]
+
+
+@pytest.fixture(scope="module")
+def annotator():
+    return ConceptAnnotator(CONCEPTS)
+
+
+@pytest.mark.parametrize("word, expected", [
+    ("division", "divide"),
+    ("dividing", "divide"),
+    ("divided", "divide"),
+    ("divisibility", "divisible"),
+    ("multiplication", "multiply"),
+    ("factorization", "factorize"),
+    ("fractions", "fraction"),
+    ("classes", "class"),
+    ("times", "times"),
+])
+def test_stem(word, expected):
+    assert stem(word) == expected
+
+
+def test_stems_keep_percent_signs():
+    assert stems("Dividing 50% of it") == ("divide", "50", "%", "of", "it")
+
+
+def test_aho_corasick_finds_overlapping_patterns():
+    matcher = AhoCorasick([(("a", "b"), "ab"), (("b", "c"), "bc"), (("a", "b", "c", "d"), "abcd")])
+    assert sorted(matcher.find_all(("a", "b", "c", "d"))) == [(0, 2, "ab"), (0, 4, "abcd"), (1, 3, "bc")]
+
+
+def test_inflected_forms_match(annotator):
+    assert annotator.annotate("Dividing 12 by 3 gives 4.") == ["Division"]
+    assert annotator.annotate("Multiplying both numbers") == ["Multiplication"]
+
+
+def test_words_only_match_whole(annotator):
+    # "add" must not match inside "address", nor "divide" inside "divisibility".
+    assert annotator.annotate("Send it to this address.") == []
+    assert "Division" not in annotator.annotate("Check the divisibility of the number.")
+
+
+def test_longest_match_wins(annotator):
+    assert annotator.annotate("The number is divisible by 9.") == ["Divisibility by 9"]
+
+
+def test_acronyms_and_notation(annotator):
+    assert annotator.annotate("Compute the LCM of 4 and 6") == ["Least Common Multiple"]
+    assert annotator.annotate("x^2 = 9") == ["Exponentiation"]
+    assert annotator.annotate("The area is 12 cm²") == []
+
+
+def test_annotate_step_keeps_existing_concepts(annotator):
+    step = {"step_explanation": "Add 3 to both sides.", "math_transformation": "x = 4", "related_concepts": []}
+    assert annotator.annotate_step(step)["related_concepts"] == ["Addition", "Transposition"]
+    step = {"step_explanation": "Add 3 to both sides.", "related_concepts": ["Equations"]}
+    assert annotator.annotate_step(step)["related_concepts"] == ["Equations"]
+
+
+def test_concepts_from_the_repository_load():
+    annotator = ConceptAnnotator.from_yaml_dir()
+    assert annotator.annotate("Find the least common multiple of 4 and 6") == ["Least Common Multiple"]
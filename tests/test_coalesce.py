@@ -0,0 +1,77 @@
+import asyncio
+
+from coalesce import GenerationCoalescer
+
+
+def fake_generation(calls, chunks=("a", "b", "c"), delay=0.01):
+    async def generate(problem):
+        calls.append(problem)
+        for chunk in chunks:
+            await asyncio.sleep(delay)
+            yield chunk
+    return generate
+
+
+async def collect(stream):
+    return [chunk async for chunk in stream]
+
+
+def test_concurrent_requests_share_one_generation():
+    async def scenario():
+        calls = []
+        coalescer = GenerationCoalescer(fake_generation(calls))
+        results = await asyncio.gather(*(collect(coalescer.stream("key", "problem")) for _ in range(5)))
+        return calls, coalescer, results
+
+    calls, coalescer, results = asyncio.run(scenario())
+    assert calls == ["problem"]
+    assert results == [["a", "b", "c"]] * 5
+    assert coalescer.stats() == {"in_flight": 0, "generations_started": 1, "requests_joined": 4}
+
+
+def test_late_joiner_replays_earlier_chunks():
+    async def scenario():
+        calls = []
+        coalescer = GenerationCoalescer(fake_generation(calls))
+        first = asyncio.create_task(collect(coalescer.stream("key", "problem")))
+        await asyncio.sleep(0.025)  # Two chunks produced
+        second = await collect(coalescer.stream("key", "problem"))
+        return calls, await first, second
+
+    calls, first, second = asyncio.run(scenario())
+    assert calls == ["problem"]
+    assert first == second == ["a", "b", "c"]
+
+
+def test_request_after_cancellation_starts_a_new_generation():
+    async def scenario():
+        calls = []
+        coalescer = GenerationCoalescer(fake_generation(calls, delay=0.05))
+        stream = coalescer.stream("key", "problem")
+        assert await stream.__anext__() == "a"
+        await stream.aclose()  # Last subscriber gone: the generation is cancelled
+        # Arrives before the cancelled task has wound down; must not join it.
+        result = await collect(coalescer.stream("key", "problem"))
+        return calls, coalescer, result
+
+    calls, coalescer, result = asyncio.run(scenario())
+    assert result == ["a", "b", "c"]
+    assert calls == ["problem", "problem"]
+    assert coalescer.stats()["generations_started"] == 2
+    assert coalescer.stats()["requests_joined"] == 0
+
+
+def test_generation_error_reaches_every_subscriber():
+    async def failing(problem):
+        yield "a"
+        await asyncio.sleep(0.01)
+        raise ValueError("upstream failed")
+
+    async def scenario():
+        coalescer = GenerationCoalescer(failing)
+        return await asyncio.gather(
+            *(collect(coalescer.stream("key", "problem")) for _ in range(2)), return_exceptions=True
+        )
+
+    results = asyncio.run(scenario())
+    assert all(isinstance(result, ValueError) for result in results)
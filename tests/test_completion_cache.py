@@ -0,0 +1,102 @@
+import asyncio
+import time
+
+import pytest
+
+from completion_cache import CompletionCache, completion_key, is_sampled
+
+UNSAMPLED = {"temperature": 0}
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = CompletionCache(str(tmp_path / "completions.sqlite3"))
+    yield cache
+    cache.close()
+
+
+def counting_generator(calls, chunks=("Step 1", "Step 2")):
+    def generate():
+        calls.append(1)
+        yield from chunks
+    return generate
+
+
+def test_is_sampled():
+    assert is_sampled({})
+    assert is_sampled({"temperature": 0.7})
+    assert not is_sampled(UNSAMPLED)
+
+
+def test_completion_key_depends_on_every_input():
+    key = completion_key("model", "template", UNSAMPLED, {"problem": "x"})
+    assert key == completion_key("model", "template", UNSAMPLED, {"problem": "x"})
+    assert key != completion_key("other", "template", UNSAMPLED, {"problem": "x"})
+    assert key != completion_key("model", "template v2", UNSAMPLED, {"problem": "x"})
+    assert key != completion_key("model", "template", {"temperature": 0.5}, {"problem": "x"})
+    assert key != completion_key("model", "template", UNSAMPLED, {"problem": "y"})
+
+
+def test_get_and_put(cache):
+    assert cache.get("key") is None
+    cache.put("key", "model", [(0.0, "a"), (0.5, "b")])
+    assert cache.get("key") == [(0.0, "a"), (0.5, "b")]
+    stats = cache.stats()
+    assert (stats["entries"], stats["hits"], stats["misses"], stats["stored"]) == (1, 1, 1, 1)
+
+
+def test_stream_replays_unsampled_completions(cache):
+    calls = []
+    generate = counting_generator(calls)
+    first = list(cache.stream("model", "template", UNSAMPLED, {"problem": "x"}, generate))
+    second = list(cache.stream("model", "template", UNSAMPLED, {"problem": "x"}, generate))
+    assert first == second == ["Step 1", "Step 2"]
+    assert len(calls) == 1
+
+
+@pytest.mark.parametrize("params", [{}, {"temperature": 1.0}])
+def test_sampled_requests_bypass_the_cache(cache, params):
+    calls = []
+    generate = counting_generator(calls)
+    for _ in range(2):
+        assert list(cache.stream("model", "template", params, {"problem": "x"}, generate)) == ["Step 1", "Step 2"]
+    assert len(calls) == 2
+    assert cache.stats()["bypassed"] == 2
+    assert cache.stats()["entries"] == 0
+
+
+def test_astream_does_not_store_a_failed_stream(cache):
+    async def failing():
+        yield "Step 1"
+        raise RuntimeError("upstream failed")
+
+    async def scenario():
+        with pytest.raises(RuntimeError):
+            async for _ in cache.astream("model", "template", UNSAMPLED, {"problem": "x"}, failing):
+                pass
+
+    asyncio.run(scenario())
+    assert cache.stats()["entries"] == 0
+
+
+def test_expired_entries_are_misses(tmp_path):
+    cache = CompletionCache(str(tmp_path / "completions.sqlite3"), max_age_seconds=0.01)
+    cache.put("key", "model", [(0.0, "a")])
+    time.sleep(0.02)
+    assert cache.get("key") is None
+    assert cache.stats()["entries"] == 0
+    cache.close()
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    chunks = [(0.0, "x" * 100)]
+    cache = CompletionCache(str(tmp_path / "completions.sqlite3"), max_bytes=250)
+    for key in ("old", "used"):
+        cache.put(key, "model", chunks)
+        time.sleep(0.01)  # Distinct last_used timestamps
+    cache.get("used")
+    cache.put("new", "model", chunks)
+    assert cache.get("old") is None
+    assert cache.get("used") is not None
+    assert cache.get("new") is not None
+    cache.close()
@@ -0,0 +1,48 @@
+import time
+from types import SimpleNamespace
+
+from context import ConversationContext, count_tokens, referenced_steps, select_solution_steps
+
+
+def message(kind, content):
+    return SimpleNamespace(type=kind, content=content)
+
+
+def test_referenced_steps():
+    assert referenced_steps("Why is step 2 true?", 5) == [2]
+    assert referenced_steps("Explain steps 2-4", 5) == [2, 3, 4]
+    assert referenced_steps("steps 1, 3 and 5", 5) == [1, 3, 5]
+    assert referenced_steps("What about the last step?", 5) == [5]
+    assert referenced_steps("And the second step?", 5) == [2]
+    assert referenced_steps("What about step 9?", 5) == []
+
+
+def test_huge_step_range_is_clamped_without_expanding():
+    start = time.perf_counter()
+    assert referenced_steps("Explain steps 1 to 30000000", 4) == [1, 2, 3, 4]
+    assert referenced_steps("steps 3 to 2", 4) == []
+    assert time.perf_counter() - start < 0.1
+
+
+def test_select_solution_steps():
+    steps = {f"Step {n}": f"explanation {n}" for n in range(1, 4)}
+    assert select_solution_steps("Why step 3?", steps) == {"Step 3": "explanation 3"}
+    assert select_solution_steps("I don't get it", steps) == steps
+
+
+def test_render_stays_within_budget():
+    context = ConversationContext(budget_tokens=200, recent_turns=4)
+    messages = []
+    for turn in range(50):
+        messages.append(message("human", f"Question {turn}. " + "word " * 40))
+        messages.append(message("ai", f"Answer {turn}. " + "word " * 40))
+        assert count_tokens(context.render(messages)) <= 200
+    rendered = context.render(messages)
+    assert "Summary of earlier conversation:" in rendered
+    assert "Answer 49." in rendered
+
+
+def test_single_long_turn_is_truncated():
+    context = ConversationContext(budget_tokens=100)
+    rendered = context.render([message("human", "word " * 5000)])
+    assert count_tokens(rendered) <= 100
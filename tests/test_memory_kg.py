@@ -0,0 +1,71 @@
+import pytest
+
+import memory_kg
+from fingerprint import problem_fingerprint
+from graph_export import node_record, relationship_record
+from snapshot import compile_snapshot
+
+PROBLEM_TEXT = "Solve 2x+3=7"
+
+
+@pytest.fixture
+def graph(tmp_path, monkeypatch):
+    records = [
+        node_record("Problem", "P1", {
+            "id": "P1", "text": PROBLEM_TEXT, "difficulty": "easy",
+            "fingerprint": problem_fingerprint(PROBLEM_TEXT), "content_hash": "problem-hash",
+        }),
+        node_record("Solution", "S1", {
+            "id": "S1", "problem_id": "P1", "source": "textbook", "date": "2024-01-01", "content_hash": "solution-hash",
+        }),
+        relationship_record("HAS_SOLUTION", "P1", "S1"),
+    ]
+    for number, (explanation, transformation) in enumerate([("Subtract 3.", "2x = 4"), ("Divide by 2.", "x = 2")], 1):
+        records.append(node_record("Step", f"S1-{number}", {
+            "id": f"S1-{number}", "step_number": number, "step_explanation": explanation,
+            "math_transformation": transformation, "content_hash": f"step-hash-{number}",
+        }))
+        records.append(relationship_record("HAS_STEP", "S1", f"S1-{number}"))
+    path = str(tmp_path / "graph.snapshot")
+    compile_snapshot(records, path)
+    monkeypatch.setattr(memory_kg, "KG_SNAPSHOT_PATH", path)
+    monkeypatch.setattr(memory_kg, "snapshot", None)
+    monkeypatch.setattr(memory_kg, "snapshot_stat", None)
+    monkeypatch.setattr(memory_kg, "generated_solutions", {})
+    monkeypatch.setattr(memory_kg, "generated_problems", {})
+    return path
+
+
+def test_solutions_do_not_expose_loader_bookkeeping(graph):
+    solution = memory_kg.get_solution_from_kg(PROBLEM_TEXT)
+    assert solution == {"id": "S1", "problem_id": "P1", "source": "textbook", "date": "2024-01-01"}
+
+
+def test_solution_by_problem_id_has_ordered_steps(graph):
+    solution = memory_kg.get_solution_by_problem_id("P1")
+    assert "content_hash" not in solution
+    assert solution["steps"] == [
+        {"step_number": 1, "step_explanation": "Subtract 3.", "math_transformation": "2x = 4"},
+        {"step_number": 2, "step_explanation": "Divide by 2.", "math_transformation": "x = 2"},
+    ]
+
+
+def test_generated_solutions_are_returned_without_bookkeeping(graph):
+    text = "Solve 5x=10"
+    memory_kg.store_solution_in_kg(
+        {"id": "G1", "text": text, "difficulty": "unknown"},
+        {"id": "GS1", "source": "engine", "date": "2024-01-02", "text": "x = 2",
+         "steps": [{"step_number": 1, "step_explanation": "Divide by 5.", "math_transformation": "x = 2"}]},
+    )
+    assert memory_kg.get_solution_from_kg(text) == {
+        "id": "GS1", "problem_id": "G1", "source": "engine", "date": "2024-01-02", "text": "x = 2",
+    }
+    assert "generated" not in memory_kg.get_solution_by_problem_id("G1")
+
+
+def test_neo4j_backend_filters_solution_properties_the_same_way():
+    pytest.importorskip("neo4j")
+    import kg
+    node = {"id": "S1", "problem_id": "P1", "source": "textbook", "date": "2024-01-01", "content_hash": "h"}
+    assert kg._public_solution(node) == memory_kg._public_solution(node)
+    assert kg.SOLUTION_FIELDS == memory_kg.SOLUTION_FIELDS
@@ -0,0 +1,81 @@
+import asyncio
+
+from solution_writer import SolutionWriter
+
+
+def run_writer(items, store_batch, on_stored=None, **kwargs):
+    async def scenario():
+        writer = SolutionWriter(store_batch, on_stored=on_stored, flush_interval=0.01, **kwargs)
+        writer.start()
+        for item in items:
+            writer.submit(item)
+        await asyncio.sleep(0.05)
+        await writer.stop()
+        return writer
+    return asyncio.run(scenario())
+
+
+def test_items_are_written_in_batches():
+    batches = []
+    writer = run_writer(range(7), batches.append, batch_size=3)
+    assert sorted(item for batch in batches for item in batch) == list(range(7))
+    assert all(len(batch) <= 3 for batch in batches)
+    assert writer.stats()["written"] == 7
+
+
+def test_failing_on_stored_does_not_stop_the_writer():
+    stored, registered = [], []
+
+    def on_stored(batch):
+        registered.append(batch)
+        raise RuntimeError("filter update failed")
+
+    async def scenario():
+        writer = SolutionWriter(stored.append, on_stored=on_stored, flush_interval=0.01)
+        writer.start()
+        writer.submit("first")
+        await asyncio.sleep(0.05)
+        writer.submit("second")  # Submitted after the callback failed
+        await asyncio.sleep(0.05)
+        await writer.stop()
+        return writer
+
+    writer = asyncio.run(scenario())
+    assert stored == [["first"], ["second"]]
+    assert registered == [["first"], ["second"]]
+    assert writer.stats()["written"] == 2
+    assert writer.stats()["failed"] == 0
+
+
+def test_failing_store_counts_the_batch_and_keeps_going():
+    stored = []
+
+    def store_batch(batch):
+        if "bad" in batch:
+            raise ValueError("constraint violated")
+        stored.append(batch)
+
+    async def scenario():
+        writer = SolutionWriter(store_batch, flush_interval=0.01)
+        writer.start()
+        writer.submit("bad")
+        await asyncio.sleep(0.05)
+        writer.submit("good")
+        await writer.stop()
+        return writer
+
+    writer = asyncio.run(scenario())
+    assert stored == [["good"]]
+    assert writer.stats()["failed"] == 1
+    assert writer.stats()["written"] == 1
+
+
+def test_full_queue_drops_items():
+    async def scenario():
+        writer = SolutionWriter(lambda batch: None, max_queue=2)
+        accepted = [writer.submit(item) for item in range(3)]
+        return writer, accepted
+
+    writer, accepted = asyncio.run(scenario())
+    assert accepted == [True, True, False]
+    assert writer.stats()["dropped"] == 1
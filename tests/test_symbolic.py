@@ -0,0 +1,40 @@
+import pytest
+
+from symbolic import solve_symbolic
+
+
+@pytest.mark.parametrize("problem, kind, answer", [
+    ("Find the LCM of 4 and 6.", "lcm", "12"),
+    ("Find the least common multiple (LCM) of 12, 18 and 30.", "lcm", "180"),
+    ("What is the greatest common divisor of 84 and 126?", "gcd", "42"),
+    ("gcd(84, 126)", "gcd", "42"),
+    ("Find the prime factorization of 360.", "prime_factorization", "2^3 × 3^2 × 5"),
+    ("What is 15% of 80?", "percentage", "12"),
+    ("Solve 2x+3=7", "equation", "x = 2"),
+])
+def test_supported_problems_are_solved(problem, kind, answer):
+    solution = solve_symbolic(problem)
+    assert solution["kind"] == kind
+    assert solution["answer"] == answer
+    assert [step["step_number"] for step in solution["steps"]] == list(range(1, len(solution["steps"]) + 1))
+
+
+@pytest.mark.parametrize("problem", [
+    # Other numbers or clauses around the LCM/GCD must go to the LLM, not be answered as a bare LCM.
+    "Find the LCM of 3 and 5 for problem 2.",
+    "Calculate the LCM of 4 and 6 and then double it.",
+    "Find the sum of the LCM of 4 and 6 and the GCD of 4 and 6.",
+    "What is the GCD of 12 and 18 divided by 3?",
+    "Find the LCM of 4.",
+])
+def test_lcm_gcd_with_extra_clauses_fall_back(problem):
+    assert solve_symbolic(problem) is None
+
+
+@pytest.mark.parametrize("problem", [
+    "A train leaves at 3 pm travelling 60 km/h; when does it meet a second train leaving at 4 pm at 80 km/h?",
+    "Solve x^9^9^9 = 2",
+    "Solve x + y = 3",
+])
+def test_unsupported_problems_fall_back(problem):
+    assert solve_symbolic(problem) is None